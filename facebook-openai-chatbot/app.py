@@ -1,11 +1,20 @@
 import os
 import json
+import time
+import atexit
 from flask import Flask, request, Response
 from dotenv import load_dotenv
 from openai_helper import OpenAIHelper
 from facebook_handler import FacebookHandler
-from sheets_handler import GoogleSheetsHandler
+from storage import get_storage
 from conversation_manager import ConversationManager
+from event_dispatcher import EventDispatcher
+from dedupe_store import create_dedupe_store, event_key
+from profile_cache import create_profile_cache
+from intent_router import create_intent_router
+
+# Measure how long the app takes to become ready to serve
+startup_started = time.time()
 
 # Load environment variables
 load_dotenv()
@@ -21,8 +30,17 @@ app = Flask(__name__)
 # Initialize helpers
 openai_helper = OpenAIHelper()
 facebook_handler = FacebookHandler()
-sheets_handler = GoogleSheetsHandler()
-conversation_manager = ConversationManager()
+storage = get_storage()
+conversation_manager = ConversationManager(storage)
+dedupe_store = create_dedupe_store()
+profile_cache = create_profile_cache(facebook_handler.get_user_profile)
+intent_router = create_intent_router()
+
+# Process webhook events on a background worker pool instead of in the request
+ASYNC_WEBHOOKS = os.getenv("WEBHOOK_ASYNC", "false").lower() == "true"
+
+# Stream OpenAI responses to Messenger chunk by chunk as they are generated
+STREAM_RESPONSES = os.getenv("OPENAI_STREAMING", "false").lower() == "true"
 
 # Welcome message for new conversations
 WELCOME_MESSAGE = "Welcome to Swift Showings! 🎉 We make finding your next home easier and more affordable—without extra fees or hassles."
@@ -59,34 +77,81 @@ def webhook():
     Handle webhook callbacks from Facebook
     """
     # Get the request body
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict):
+        return Response(status=400)
+    
+    # Senders whose lane was full; their events are left for Facebook to redeliver
+    refused_senders = set()
     
-    if data["object"] == "page":
-        for entry in data["entry"]:
+    if data.get("object") == "page":
+        for entry in data.get("entry", []):
             # Iterate over webhook events
             for event in entry.get("messaging", []):
-                # Get the sender's ID
                 sender_id = event.get("sender", {}).get("id")
+                if not sender_id:
+                    continue
                 
-                if sender_id:
-                    # Get user info
-                    user_info = facebook_handler.get_user_profile(sender_id)
-                    user_name = f"{user_info.get('first_name', '')} {user_info.get('last_name', '')}"
-                    
-                    # Handle different event types
-                    if event.get("message"):
-                        # Check if this is a quick reply
-                        if event.get("message").get("quick_reply"):
-                            handle_quick_reply(sender_id, user_name, event["message"]["quick_reply"]["payload"])
-                        # Regular text message
-                        elif event.get("message").get("text"):
-                            handle_message(sender_id, user_name, event["message"]["text"])
-                    # Postback (button click)
-                    elif event.get("postback"):
-                        handle_postback(sender_id, user_name, event["postback"]["payload"])
+                # Drop redeliveries before any external call is made
+                # (the key is forgotten again if processing fails)
+                key = event_key(event)
+                if key and dedupe_store.seen(key):
+                    continue
+                
+                if not ASYNC_WEBHOOKS:
+                    process_new_event(event)
+                    continue
+                
+                # Hand the event to the worker pool and acknowledge right away. If the
+                # sender's lane is full, processing here would run it ahead of their
+                # queued events, so it (and their later events) is redelivered instead
+                if sender_id in refused_senders or not event_dispatcher.dispatch(event):
+                    refused_senders.add(sender_id)
+                    if key:
+                        dedupe_store.forget(key)
     
+    if refused_senders:
+        return Response(status=503)
     return "EVENT_RECEIVED"
 
+def process_event(event):
+    """
+    Process a single messaging event from a webhook callback
+    """
+    # Get the sender's ID
+    sender_id = event.get("sender", {}).get("id")
+    
+    if sender_id:
+        # Get user info
+        user_info = profile_cache.get(sender_id)
+        user_name = f"{user_info.get('first_name', '')} {user_info.get('last_name', '')}"
+        
+        # Handle different event types
+        if event.get("message"):
+            # Check if this is a quick reply
+            if event.get("message").get("quick_reply"):
+                handle_quick_reply(sender_id, user_name, event["message"]["quick_reply"]["payload"])
+            # Regular text message
+            elif event.get("message").get("text"):
+                handle_message(sender_id, user_name, event["message"]["text"])
+        # Postback (button click)
+        elif event.get("postback"):
+            handle_postback(sender_id, user_name, event["postback"]["payload"])
+
+def process_new_event(event):
+    """
+    Process an event that passed the dedupe check
+    If processing fails its key is forgotten, so Facebook's redelivery is handled
+    """
+    try:
+        process_event(event)
+    except Exception:
+        key = event_key(event)
+        if key:
+            dedupe_store.forget(key)
+        raise
+
 def handle_message(sender_id, user_name, message_text):
     """
     Handle incoming text messages
@@ -94,6 +159,12 @@ def handle_message(sender_id, user_name, message_text):
     # Check if user is in an active conversation flow
     flow_response = conversation_manager.process_message(sender_id, user_name, message_text)
     
+    if not flow_response and intent_router:
+        # Start a flow straight from free text when the intent is clear
+        intent = intent_router.route(message_text)
+        if intent:
+            flow_response = conversation_manager.start_intent_flow(sender_id, user_name, intent.flow, intent.answers)
+    
     if flow_response:
         # User is in an active flow - handle with conversation manager
         response_text, quick_replies = flow_response
@@ -105,8 +176,8 @@ def handle_message(sender_id, user_name, message_text):
             facebook_handler.send_text_message(sender_id, response_text)
         
         # Log the conversation
-        thread_id = openai_helper.get_or_create_conversation(sender_id)
-        sheets_handler.save_conversation(
+        thread_id = openai_helper.get_session_id(sender_id)
+        storage.save_conversation(
             sender_id,
             user_name,
             message_text,
@@ -116,17 +187,11 @@ def handle_message(sender_id, user_name, message_text):
         )
     else:
         # User is not in an active flow - use OpenAI
-        response = openai_helper.process_message(sender_id, message_text)
-        
-        # Get the response text, preferring facebook-specific content if available
-        response_text = response.get("facebook_content", response.get("text"))
-        
-        # Send response
-        facebook_handler.send_text_message(sender_id, response_text)
+        response_text = reply_with_openai(sender_id, message_text)
         
         # Log the conversation
-        thread_id = openai_helper.get_or_create_conversation(sender_id)
-        sheets_handler.save_conversation(
+        thread_id = openai_helper.get_session_id(sender_id)
+        storage.save_conversation(
             sender_id,
             user_name,
             message_text,
@@ -135,11 +200,40 @@ def handle_message(sender_id, user_name, message_text):
             thread_id
         )
 
+def reply_with_openai(sender_id, message_text):
+    """
+    Answer a message with OpenAI and send the reply
+    Returns the full response text for logging
+    """
+    if STREAM_RESPONSES:
+        # Send each chunk as soon as it's ready, showing the typing indicator in between
+        def send_chunk(chunk):
+            facebook_handler.send_text_message(sender_id, chunk)
+            facebook_handler.send_typing_indicator(sender_id)
+        
+        facebook_handler.send_typing_indicator(sender_id)
+        response = openai_helper.stream_message(sender_id, message_text, send_chunk)
+        facebook_handler.send_typing_indicator(sender_id, False)
+    else:
+        response = openai_helper.process_message(sender_id, message_text)
+    
+    # Get the response text, preferring facebook-specific content if available
+    response_text = response.get("facebook_content", response.get("text"))
+    
+    # Send response unless it was already streamed
+    if response.get("quick_replies"):
+        # Fallback reply when OpenAI couldn't answer in time
+        facebook_handler.send_quick_replies(sender_id, response_text, response["quick_replies"])
+    elif not response.get("streamed"):
+        facebook_handler.send_text_message(sender_id, response_text)
+    
+    return response_text
+
 def handle_quick_reply(sender_id, user_name, payload):
     """
     Handle quick replies from the user
     """
-    thread_id = openai_helper.get_or_create_conversation(sender_id)
+    thread_id = openai_helper.get_session_id(sender_id)
     
     if payload == "FIND_HOME":
         # Start the Find Home flow
@@ -147,7 +241,7 @@ def handle_quick_reply(sender_id, user_name, payload):
         facebook_handler.send_quick_replies(sender_id, response_text, quick_replies)
         
         # Log the conversation
-        sheets_handler.save_conversation(
+        storage.save_conversation(
             sender_id,
             user_name,
             "Quick Reply: Find Home",
@@ -161,7 +255,7 @@ def handle_quick_reply(sender_id, user_name, payload):
         facebook_handler.send_quick_replies(sender_id, response_text, quick_replies)
         
         # Log the conversation
-        sheets_handler.save_conversation(
+        storage.save_conversation(
             sender_id,
             user_name,
             "Quick Reply: Get Help",
@@ -175,7 +269,7 @@ def handle_quick_reply(sender_id, user_name, payload):
         facebook_handler.send_quick_replies(sender_id, response_text, quick_replies)
         
         # Log the conversation
-        sheets_handler.save_conversation(
+        storage.save_conversation(
             sender_id,
             user_name,
             "Quick Reply: Save Money",
@@ -188,7 +282,7 @@ def handle_quick_reply(sender_id, user_name, payload):
         facebook_handler.send_text_message(sender_id, response_text)
         
         # Log the conversation
-        sheets_handler.save_conversation(
+        storage.save_conversation(
             sender_id,
             user_name,
             "Quick Reply: Learn More",
@@ -212,7 +306,7 @@ def handle_quick_reply(sender_id, user_name, payload):
                 facebook_handler.send_text_message(sender_id, response_text)
             
             # Log the conversation
-            sheets_handler.save_conversation(
+            storage.save_conversation(
                 sender_id,
                 user_name,
                 f"Selected: {payload}",
@@ -233,7 +327,7 @@ def handle_quick_reply(sender_id, user_name, payload):
                 facebook_handler.send_text_message(sender_id, response_text)
             
             # Log the conversation
-            sheets_handler.save_conversation(
+            storage.save_conversation(
                 sender_id,
                 user_name,
                 f"Quick Reply: {payload}",
@@ -243,13 +337,10 @@ def handle_quick_reply(sender_id, user_name, payload):
             )
         else:
             # Not part of a flow, use OpenAI
-            response = openai_helper.process_message(sender_id, payload)
-            response_text = response.get("facebook_content", response.get("text"))
-            
-            facebook_handler.send_text_message(sender_id, response_text)
+            response_text = reply_with_openai(sender_id, payload)
             
             # Log the conversation
-            sheets_handler.save_conversation(
+            storage.save_conversation(
                 sender_id,
                 user_name,
                 f"Quick Reply: {payload}",
@@ -271,8 +362,8 @@ def handle_postback(sender_id, user_name, payload):
         )
         
         # Log the conversation
-        thread_id = openai_helper.get_or_create_conversation(sender_id)
-        sheets_handler.save_conversation(
+        thread_id = openai_helper.get_session_id(sender_id)
+        storage.save_conversation(
             sender_id,
             user_name,
             "Get Started",
@@ -284,6 +375,15 @@ def handle_postback(sender_id, user_name, payload):
         # Treat other postbacks like quick replies
         handle_quick_reply(sender_id, user_name, payload)
 
+# Background workers for webhook events (used when WEBHOOK_ASYNC=true)
+# atexit runs handlers in reverse, so queued events drain before pending sends
+if facebook_handler.send_queue:
+    atexit.register(facebook_handler.send_queue.stop)
+event_dispatcher = EventDispatcher(process_new_event)
+atexit.register(event_dispatcher.stop)
+
+print(f"Swift Showings app initialized in {time.time() - startup_started:.2f}s")
+
 @app.route("/setup", methods=["GET"])
 def setup():
     """
@@ -292,5 +392,33 @@ def setup():
     result = facebook_handler.setup_messenger_profile()
     return {"success": result}
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Route to expose runtime metrics
+    """
+    stats = {
+        "webhook_lanes": event_dispatcher.lane_depths(),
+        "dedupe": dedupe_store.stats(),
+        "profile_cache": profile_cache.stats(),
+        "graph_api": facebook_handler.transport.stats(),
+        "openai_conversations": openai_helper.conversations.stats(),
+        "openai_tiers": openai_helper.tier_stats(),
+        "flow_states": conversation_manager.state_store.stats()
+    }
+    if intent_router:
+        stats["intent_router"] = intent_router.stats()
+    if openai_helper.response_cache:
+        stats["openai_cache"] = openai_helper.response_cache.stats()
+    if openai_helper.similar_cache:
+        stats["openai_similar_cache"] = openai_helper.similar_cache.stats()
+    if storage.write_buffer:
+        stats["sheets_writes"] = storage.write_buffer.stats()
+    if storage.quota:
+        stats["sheets_quota"] = storage.quota.stats()
+    if facebook_handler.send_queue:
+        stats["send_queue"] = facebook_handler.send_queue.stats()
+    return stats
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
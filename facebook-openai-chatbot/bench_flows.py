@@ -0,0 +1,116 @@
+import os
+import time
+from dotenv import load_dotenv
+from conversation_manager import ConversationManager
+from flows import FlowEngine
+
+# Load environment variables
+load_dotenv()
+
+# How many messages to route per measurement
+BENCH_MESSAGES = int(os.getenv("BENCH_MESSAGES", "200000"))
+
+FLOW_NAMES = list(FlowEngine().flow_ids)
+
+def legacy_route(current_flow):
+    """The if/elif dispatch chain process_message used before flows were compiled"""
+    if current_flow == "find_home_buy":
+        return 0
+    elif current_flow == "find_home_rent":
+        return 1
+    elif current_flow == "find_home":
+        return 2
+    elif current_flow == "get_help":
+        return 3
+    elif current_flow == "help_real_estate":
+        return 4
+    elif current_flow == "help_maintenance":
+        return 5
+    elif current_flow == "help_legal":
+        return 6
+    elif current_flow == "help_other":
+        return 7
+    elif current_flow == "save_money":
+        return 8
+    elif current_flow == "savings_mortgage":
+        return 9
+    elif current_flow == "savings_utility":
+        return 10
+    elif current_flow == "savings_insurance":
+        return 11
+    elif current_flow == "savings_tax":
+        return 12
+    return None
+
+def compiled_route(engine, current_flow, step):
+    """Routing through the compiled tables: flow ID lookup, then step index"""
+    flow_id = engine.flow_ids.get(current_flow)
+    if flow_id is None:
+        return None
+    return engine.tables[flow_id][step]
+
+def time_per_call(func, count):
+    start = time.perf_counter()
+    func(count)
+    return (time.perf_counter() - start) / count * 1e9
+
+class NullStorage:
+    """Storage that discards rows, so only routing and flow logic are timed"""
+    def save_home_preferences(self, row_data):
+        return True
+
+    def save_help_request(self, row_data):
+        return True
+
+    def save_money_request(self, row_data):
+        return True
+
+def bench_routing():
+    """Compare the cost of finding the handler for each flow"""
+    engine = FlowEngine()
+    print(f"\n{'Flow':<20}{'if/elif ns':>12}{'tables ns':>12}")
+    print("=" * 44)
+    for name in FLOW_NAMES:
+        def legacy(count, name=name):
+            for _ in range(count):
+                legacy_route(name)
+
+        def compiled(count, name=name):
+            for _ in range(count):
+                compiled_route(engine, name, 1)
+
+        print(f"{name:<20}{time_per_call(legacy, BENCH_MESSAGES):>12.1f}{time_per_call(compiled, BENCH_MESSAGES):>12.1f}")
+
+def bench_conversations():
+    """Time complete flows through ConversationManager.process_message"""
+    os.environ["STATE_BACKEND"] = "memory"
+    manager = ConversationManager(NullStorage())
+    scripts = {
+        "Find Home > Buy": ("start_find_home_flow", ["Buy", "House", "$200k-$300k", "Austin, TX", "Yes, I'm pre-approved"]),
+        "Get Help > Legal > Other": ("start_get_help_flow", ["Legal Help", "Other", "Boundary dispute", "Yes, connect me"]),
+        "Save Money > Insurance": ("start_save_money_flow", ["Home Insurance Discounts", "Shopping Around", "No thanks"])
+    }
+    rounds = max(1, BENCH_MESSAGES // 100)
+
+    print(f"\n{'Conversation':<28}{'us per message':>16}")
+    print("=" * 44)
+    for label, (start, messages) in scripts.items():
+        def run(count, start=start, messages=messages):
+            for i in range(count):
+                user_id = f"bench-{i}"
+                getattr(manager, start)(user_id)
+                for message in messages:
+                    manager.process_message(user_id, "Benchmark User", message)
+
+        per_message = time_per_call(run, rounds) / (len(messages) + 1) / 1000
+        print(f"{label:<28}{per_message:>16.2f}")
+
+def main():
+    print("Swift Showings Flow Routing Benchmark")
+    print("=====================================")
+    print(f"Routes {BENCH_MESSAGES} messages per flow. Set BENCH_MESSAGES to change the workload.")
+    bench_routing()
+    bench_conversations()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import time
+from dotenv import load_dotenv
+from metrics import LatencyStats
+from storage import SQLiteStorage
+
+# Load environment variables
+load_dotenv()
+
+# How many conversation rows to write and how many history lookups to run
+BENCH_ROWS = int(os.getenv("BENCH_ROWS", "200"))
+BENCH_LOOKUPS = int(os.getenv("BENCH_LOOKUPS", "50"))
+BENCH_USERS = 20
+
+def run_benchmark(name, storage):
+    """Time save_conversation and get_conversation_history against a backend"""
+    print(f"\nBenchmarking {name}...")
+    writes = LatencyStats(window=BENCH_ROWS)
+    lookups = LatencyStats(window=BENCH_LOOKUPS)
+
+    for i in range(BENCH_ROWS):
+        start = time.time()
+        storage.save_conversation(
+            f"bench-{i % BENCH_USERS}", "Benchmark User",
+            f"Benchmark message {i}", "Benchmark response", "benchmark"
+        )
+        writes.record(time.time() - start)
+
+    # Make sure buffered rows are actually in place before reading them back
+    start = time.time()
+    storage.flush()
+    flush_seconds = time.time() - start
+
+    for i in range(BENCH_LOOKUPS):
+        start = time.time()
+        storage.get_conversation_history(f"bench-{i % BENCH_USERS}", limit=10)
+        lookups.record(time.time() - start)
+
+    return {"write": writes.snapshot(), "flush_ms": round(flush_seconds * 1000, 1), "lookup": lookups.snapshot()}
+
+def print_results(results):
+    print("\n" + "=" * 70)
+    print(f"{'Backend':<16}{'Operation':<12}{'avg ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    print("=" * 70)
+    for name, result in results.items():
+        for operation in ("write", "lookup"):
+            stats = result[operation]
+            print(f"{name:<16}{operation:<12}{stats['avg_ms']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['max_ms']:>10}")
+        print(f"{name:<16}{'flush':<12}{result['flush_ms']:>10}")
+    print("=" * 70)
+
+def main():
+    print("Swift Showings Storage Benchmark")
+    print("================================")
+    print(f"Writes {BENCH_ROWS} conversation rows across {BENCH_USERS} users, then runs {BENCH_LOOKUPS} history lookups.")
+    print("Set BENCH_ROWS and BENCH_LOOKUPS to change the workload.")
+
+    results = {}
+
+    # Local SQLite backend, without the Sheets mirror, on a throwaway database
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results["sqlite"] = run_benchmark("SQLite", SQLiteStorage(os.path.join(tmp_dir, "bench.db")))
+
+    # Google Sheets backend, as configured by the SHEETS_* environment variables
+    answer = input(f"\nAlso benchmark Google Sheets? This appends {BENCH_ROWS} rows to your Conversations worksheet (y/n): ")
+    if answer.strip().lower() == "y":
+        try:
+            from sheets_handler import GoogleSheetsHandler
+            results["google_sheets"] = run_benchmark("Google Sheets", GoogleSheetsHandler())
+        except Exception as e:
+            print(f"Google Sheets benchmark failed: {e}")
+
+    print_results(results)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nBenchmark cancelled.")
+        sys.exit(1)
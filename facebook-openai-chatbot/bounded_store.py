@@ -0,0 +1,142 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+def approx_sizeof(obj, seen=None):
+    """Roughly estimate the memory used by an object and everything it references"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_sizeof(k, seen) + approx_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(approx_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += approx_sizeof(obj.__dict__, seen)
+    return size
+
+class BoundedStore:
+    """
+    Dict-like per-user store with a max-entries LRU bound and idle expiry
+
+    Reads and writes count as activity. Entries idle for longer than idle_ttl
+    are removed by a background sweeper thread (and lazily on access).
+    """
+    def __init__(self, max_entries=5000, idle_ttl=86400, sweep_interval=60):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.entries = OrderedDict()  # key -> (value, last_activity), least recent first
+        self.evictions = 0
+        self.expirations = 0
+        self._sweeper = None
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get_live(key) is not None
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._get_live(key)
+            if entry is None:
+                raise KeyError(key)
+            self._touch(key, entry[0])
+            return entry[0]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._touch(key, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        self._start_sweeper()
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self.entries[key]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def get_or_create(self, key, factory):
+        """Get the value for a key, creating it with factory() if it is missing or expired"""
+        with self._lock:
+            entry = self._get_live(key)
+            if entry is not None:
+                self._touch(key, entry[0])
+                return entry[0]
+            value = factory()
+            self[key] = value
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            return entry[0] if entry else default
+
+    def sweep(self):
+        """Remove every entry that has been idle for longer than idle_ttl"""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            # Entries are kept in activity order, so idle ones are at the front
+            while self.entries:
+                key, (value, last_activity) = next(iter(self.entries.items()))
+                if last_activity > cutoff:
+                    break
+                self.entries.popitem(last=False)
+                self.expirations += 1
+
+    def stats(self):
+        """Get gauges for the entry count and approximate memory use"""
+        with self._lock:
+            values = [value for value, _ in self.entries.values()]
+            stats = {
+                "entries": len(values),
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+        stats["approx_bytes"] = sum(approx_sizeof(value) for value in values)
+        return stats
+
+    def _get_live(self, key):
+        """Get an entry unless it has expired (caller holds the lock)"""
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= time.time() - self.idle_ttl:
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def _touch(self, key, value):
+        """Store a value and mark it as most recently active (caller holds the lock)"""
+        self.entries[key] = (value, time.time())
+        self.entries.move_to_end(key)
+
+    def _start_sweeper(self):
+        # Started lazily so the thread is created after gunicorn forks
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._run_sweeper, name="store-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _run_sweeper(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping idle entries: {e}")
@@ -0,0 +1,62 @@
+import bisect
+import threading
+
+class ConversationIndex:
+    """
+    Local index from user ID to the rows of the Conversations worksheet
+
+    Each sync reads only the Timestamp and User ID columns of rows appended
+    since the previous sync, so a per-user lookup costs roughly the size of
+    that user's history instead of a scan of the whole sheet. Timestamps are
+    stored as "%Y-%m-%d %H:%M:%S" strings, which sort chronologically as-is.
+    """
+    def __init__(self):
+        self.rows_by_user = {}  # user_id -> sorted list of (timestamp, row_number)
+        self.last_row = 1  # last worksheet row indexed (row 1 is the header)
+        self.last_entry = None  # (timestamp, user_id) of last_row, to detect edits
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget everything (e.g. the worksheet was replaced or reordered)"""
+        with self._lock:
+            self.rows_by_user = {}
+            self.last_row = 1
+            self.last_entry = None
+
+    def sync(self, worksheet):
+        """Index rows appended to the worksheet since the last sync"""
+        with self._lock:
+            # Re-read the last indexed row too, to notice if the sheet was edited underneath us
+            start = self.last_row if self.last_entry else self.last_row + 1
+            values = worksheet.get_values(f"A{start}:B")
+
+            if self.last_entry:
+                if not values or tuple(self._pad(values[0])) != self.last_entry:
+                    self.rows_by_user = {}
+                    self.last_row = 1
+                    self.last_entry = None
+                    start = 2
+                    values = worksheet.get_values(f"A{start}:B")
+                else:
+                    values = values[1:]
+                    start += 1
+
+            for offset, row in enumerate(values):
+                timestamp, user_id = self._pad(row)
+                if not user_id:
+                    continue
+                row_number = start + offset
+                bisect.insort(self.rows_by_user.setdefault(user_id, []), (timestamp, row_number))
+                self.last_row = row_number
+                self.last_entry = (timestamp, user_id)
+            return len(values)
+
+    def latest_rows(self, user_id, limit):
+        """Get the row numbers of a user's newest rows, newest first"""
+        with self._lock:
+            entries = self.rows_by_user.get(str(user_id), [])
+            return [row_number for _, row_number in reversed(entries[-limit:])]
+
+    def _pad(self, row):
+        row = list(row) + ["", ""]
+        return row[0], str(row[1])
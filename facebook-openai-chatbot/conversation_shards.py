@@ -0,0 +1,81 @@
+import threading
+import time
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def monthly_shard(base_title, when=None):
+    """
+    Get the shard a timestamp (seconds, default now) belongs to
+    Returns (title, start, end), e.g. ("Conversations 2026-10", "2026-10-01 00:00:00", "2026-11-01 00:00:00")
+    """
+    moment = time.localtime(when)
+    year, month = moment.tm_year, moment.tm_mon
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (
+        f"{base_title} {year:04d}-{month:02d}",
+        f"{year:04d}-{month:02d}-01 00:00:00",
+        f"{next_year:04d}-{next_month:02d}-01 00:00:00"
+    )
+
+def shard_range(title):
+    """Get the (start, end) a monthly shard title like "Conversations 2026-10" covers"""
+    year, month = (int(part) for part in title.rsplit(" ", 1)[1].split("-"))
+    return monthly_shard("", time.mktime((year, month, 1, 0, 0, 0, 0, 0, -1)))[1:]
+
+def is_shard_of(title, base_title):
+    """Check whether a worksheet title is a monthly shard of base_title"""
+    prefix = base_title + " "
+    if not title.startswith(prefix):
+        return False
+    suffix = title[len(prefix):]
+    return len(suffix) == 7 and suffix[4] == "-" and suffix[:4].isdigit() and suffix[5:].isdigit()
+
+class ShardCatalog:
+    """
+    Records which worksheet holds the rows for which time range
+
+    Entries map a worksheet title to its (start, end) timestamps, both in
+    "%Y-%m-%d %H:%M:%S" form so they compare as strings. An empty start means
+    the worksheet holds everything before its end (the original, unsharded
+    worksheet).
+    """
+    def __init__(self):
+        self.entries = {}  # worksheet title -> (start, end)
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def __contains__(self, title):
+        with self._lock:
+            return title in self.entries
+
+    def load(self, rows):
+        """Replace the entries with (title, start, end) rows read from the catalog worksheet"""
+        with self._lock:
+            self.entries = {}
+            for row in rows:
+                row = [str(value) for value in row] + ["", "", ""]
+                if row[0]:
+                    self.entries[row[0]] = (row[1], row[2])
+            self.loaded = True
+
+    def add(self, title, start, end):
+        with self._lock:
+            self.entries[title] = (start, end)
+
+    def reset(self):
+        """Forget the entries so they are read again on next use"""
+        with self._lock:
+            self.entries = {}
+            self.loaded = False
+
+    def shards(self, since=None):
+        """
+        Get the titles of the shards holding rows newer than `since`, newest first
+        Without `since`, every shard is returned
+        """
+        with self._lock:
+            entries = sorted(self.entries.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            title for title, (start, end) in entries
+            if since is None or not end or end > since
+        ]
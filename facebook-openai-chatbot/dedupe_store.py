@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def event_key(event):
+    """
+    Build the idempotency key for a webhook messaging event
+    Messages are keyed on their mid, postbacks on sender + timestamp
+    Returns None for events that can't be identified
+    """
+    sender_id = event.get("sender", {}).get("id")
+    message = event.get("message")
+
+    if message and message.get("mid"):
+        return f"mid:{message['mid']}"
+    if event.get("postback") and event.get("timestamp"):
+        return f"postback:{sender_id}:{event['timestamp']}"
+    return None
+
+class DedupeStore:
+    """
+    Bounded in-process set of recently seen event keys with TTL eviction
+    """
+    def __init__(self, ttl=3600, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> expiry time, oldest first
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def seen(self, key):
+        """
+        Record a key and report whether it was already seen within the TTL
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if key in self.entries:
+                self.duplicates += 1
+                return True
+            self.entries[key] = now + self.ttl
+            return False
+
+    def forget(self, key):
+        """Drop a key so a redelivery of its event is processed again"""
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        """Get the entry and duplicate counts"""
+        with self._lock:
+            return {"entries": len(self.entries), "duplicates": self.duplicates}
+
+    def _evict(self, now):
+        # Entries are inserted in expiry order, so expired ones are at the front
+        while self.entries:
+            key, expires_at = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) < self.max_entries:
+                break
+            self.entries.popitem(last=False)
+
+class SQLiteDedupeStore:
+    """
+    Dedupe store backed by a SQLite file so every gunicorn worker shares it
+    """
+    def __init__(self, db_path, ttl=3600, max_entries=10000, purge_interval=60):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self.duplicates = 0
+        self._last_purge = 0
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen_events (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS seen_events_expiry ON seen_events (expires_at)")
+        conn.commit()
+
+    def _connect(self):
+        """Get this thread's connection to the database"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def seen(self, key):
+        """
+        Record a key and report whether any worker already saw it within the TTL
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            # Expired keys can be claimed again
+            conn.execute(
+                "DELETE FROM seen_events WHERE key = ? AND expires_at <= ?",
+                (key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO seen_events (key, expires_at) VALUES (?, ?)",
+                (key, now + self.ttl)
+            )
+            duplicate = cursor.rowcount == 0
+
+        if duplicate:
+            self.duplicates += 1
+        if now - self._last_purge > self.purge_interval:
+            self._purge(now)
+        return duplicate
+
+    def forget(self, key):
+        """Drop a key so a redelivery of its event is processed again"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM seen_events WHERE key = ?", (key,))
+
+    def stats(self):
+        """Get the entry and duplicate counts"""
+        count = self._connect().execute("SELECT COUNT(*) FROM seen_events").fetchone()[0]
+        return {"entries": count, "duplicates": self.duplicates}
+
+    def _purge(self, now):
+        """Remove expired keys and keep the table within max_entries"""
+        self._last_purge = now
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM seen_events WHERE expires_at <= ?", (now,))
+            conn.execute("""
+                DELETE FROM seen_events WHERE key IN (
+                    SELECT key FROM seen_events ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+def create_dedupe_store():
+    """Create the dedupe store selected by the DEDUPE_* environment variables"""
+    backend = os.getenv("DEDUPE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("DEDUPE_TTL", "3600"))
+    max_entries = int(os.getenv("DEDUPE_MAX_ENTRIES", "10000"))
+
+    if backend == "sqlite":
+        db_path = os.getenv("DEDUPE_DB_PATH", "webhook_dedupe.db")
+        return SQLiteDedupeStore(db_path, ttl=ttl, max_entries=max_entries)
+    return DedupeStore(ttl=ttl, max_entries=max_entries)
@@ -0,0 +1,95 @@
+import csv
+import os
+import time
+from dotenv import load_dotenv
+from response_cache import normalize_message
+from similarity_cache import SimilarityCache
+
+# Load environment variables
+load_dotenv()
+
+# Logged questions: a CSV export of the Conversations worksheet (Message and
+# Thread ID columns), or any CSV with a "question" column. An optional "group"
+# column marks questions that should get the same answer, to measure precision.
+EVAL_FILE = os.getenv("SIMILARITY_EVAL_FILE", "conversations.csv")
+THRESHOLDS = [float(value) for value in os.getenv("SIMILARITY_EVAL_THRESHOLDS", "0.6,0.7,0.8,0.9").split(",")]
+SAMPLE_MATCHES = int(os.getenv("SIMILARITY_EVAL_SAMPLES", "10"))
+
+def load_questions(path):
+    """Get (question, group) pairs in log order, keeping only each session's first message"""
+    questions = []
+    seen_threads = set()
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            question = row.get("question") or row.get("Message")
+            if not question:
+                continue
+            thread_id = row.get("Thread ID")
+            if thread_id:
+                if thread_id in seen_threads:
+                    continue
+                seen_threads.add(thread_id)
+            questions.append((question, row.get("group") or None))
+    return questions
+
+def replay(questions, threshold):
+    """
+    Answer the questions in order through a SimilarityCache, as the app would
+    A hit is "correct" if it matched a question from the same group
+    """
+    cache = SimilarityCache(threshold=threshold, max_entries=max(1, len(questions)))
+    hits = exact_hits = correct = labelled = 0
+    matches = []
+    start = time.perf_counter()
+    for question, group in questions:
+        found = cache.match(question)
+        if found is None:
+            cache.put(question, group, 0)  # the group stands in for the answer
+            continue
+        score, matched_question, matched_group, _ = found
+        hits += 1
+        if normalize_message(question) == normalize_message(matched_question):
+            exact_hits += 1
+        elif len(matches) < SAMPLE_MATCHES:
+            matches.append((score, question, matched_question))
+        if group is not None and matched_group is not None:
+            labelled += 1
+            correct += group == matched_group
+    elapsed = time.perf_counter() - start
+    return {
+        "hits": hits,
+        "exact_hits": exact_hits,
+        "correct": correct,
+        "labelled": labelled,
+        "us_per_question": elapsed / max(1, len(questions)) * 1e6,
+        "matches": matches
+    }
+
+def main():
+    print("Swift Showings Similarity Cache Evaluation")
+    print("==========================================")
+    if not os.path.exists(EVAL_FILE):
+        print(f"No questions found at {EVAL_FILE}. Set SIMILARITY_EVAL_FILE to a CSV export of the Conversations worksheet.")
+        return
+
+    questions = load_questions(EVAL_FILE)
+    print(f"Replaying {len(questions)} first messages from {EVAL_FILE}")
+    print(f"\n{'Threshold':>10}{'Hit rate':>10}{'Exact':>8}{'Near':>8}{'Precision':>11}{'us/question':>13}")
+    print("=" * 60)
+    results = {}
+    for threshold in THRESHOLDS:
+        result = results[threshold] = replay(questions, threshold)
+        hit_rate = result["hits"] / len(questions) if questions else 0
+        precision = f"{result['correct'] / result['labelled']:.3f}" if result["labelled"] else "n/a"
+        print(f"{threshold:>10.2f}{hit_rate:>10.3f}{result['exact_hits']:>8}{result['hits'] - result['exact_hits']:>8}{precision:>11}{result['us_per_question']:>13.0f}")
+
+    # Near matches to check by eye, at the lowest threshold tried
+    lowest = min(THRESHOLDS)
+    if results[lowest]["matches"]:
+        print(f"\nSample near matches at threshold {lowest}:")
+        for score, question, matched_question in results[lowest]["matches"]:
+            print(f"  {score:.2f}  {question!r} -> {matched_question!r}")
+    print("\nPrecision needs a \"group\" column. Set OPENAI_SIMILAR_THRESHOLD to the threshold you choose.")
+
+if __name__ == "__main__":
+    main()
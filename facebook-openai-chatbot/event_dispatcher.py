@@ -0,0 +1,104 @@
+import os
+import queue
+import threading
+import time
+import zlib
+
+class EventDispatcher:
+    """
+    Background worker pool for webhook messaging events.
+
+    The webhook puts each event on an in-process queue and returns right away;
+    worker threads run the handler so slow OpenAI / Graph / Sheets calls never
+    hold up the response to Facebook.
+
+    Events are sharded by sender ID onto serial lanes, each with its own queue
+    and worker thread: one user's events are processed strictly in order while
+    different users are processed in parallel.
+    """
+    def __init__(self, handler, num_workers=None, max_queue_size=None, put_timeout=None):
+        self.handler = handler
+        self.num_workers = num_workers or int(os.getenv("WEBHOOK_WORKERS", "4"))
+        max_queue_size = max_queue_size or int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+        # Seconds to wait for room on a full lane before refusing an event
+        self.put_timeout = float(os.getenv("WEBHOOK_QUEUE_WAIT", "1")) if put_timeout is None else put_timeout
+        self.lanes = [queue.Queue(maxsize=max_queue_size) for _ in range(self.num_workers)]
+        self.workers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start one worker thread per lane (safe to call more than once)"""
+        with self._lock:
+            if self.workers:
+                return self
+            for i, lane in enumerate(self.lanes):
+                worker = threading.Thread(
+                    target=self._run_worker,
+                    args=(lane,),
+                    name=f"webhook-lane-{i}",
+                    daemon=True
+                )
+                worker.start()
+                self.workers.append(worker)
+        return self
+
+    def lane_for(self, sender_id):
+        """Get the lane index for a sender (stable across processes)"""
+        return zlib.crc32(str(sender_id).encode("utf-8")) % len(self.lanes)
+
+    def dispatch(self, event):
+        """
+        Queue an event on its sender's lane for background processing
+        Returns False if the lane stays full for put_timeout seconds. The
+        caller must not process the event itself, which would run it ahead
+        of the sender's queued events; it should have Facebook redeliver it.
+        """
+        # Workers are started lazily so they are created after gunicorn forks
+        if not self.workers:
+            self.start()
+
+        sender_id = event.get("sender", {}).get("id")
+        try:
+            self.lanes[self.lane_for(sender_id)].put(event, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            print(f"Webhook lane for sender {sender_id} is full, refusing event")
+            return False
+
+    def stop(self, timeout=10):
+        """
+        Let the workers drain their lanes and exit, waiting at most `timeout`
+        seconds in all; events still queued after that are abandoned
+        """
+        with self._lock:
+            workers, self.workers = self.workers, []
+        if not workers:
+            return
+        deadline = time.time() + timeout
+        for i, lane in enumerate(self.lanes):
+            try:
+                lane.put(None, timeout=max(0, deadline - time.time()))
+            except queue.Full:
+                print(f"Webhook lane {i} is still full at shutdown, abandoning {lane.qsize()} events")
+        for worker in workers:
+            worker.join(max(0, deadline - time.time()))
+
+    def pending(self):
+        """Number of events waiting to be processed across all lanes"""
+        return sum(self.lane_depths())
+
+    def lane_depths(self):
+        """Queue depth of each lane, useful for spotting hot users"""
+        return [lane.qsize() for lane in self.lanes]
+
+    def _run_worker(self, lane):
+        while True:
+            event = lane.get()
+            try:
+                if event is None:
+                    return
+                self.handler(event)
+            except Exception as e:
+                print(f"Error processing webhook event: {e}")
+            finally:
+                lane.task_done()
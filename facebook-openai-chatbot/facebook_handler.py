@@ -2,6 +2,8 @@ import os
 import json
 import requests
 from dotenv import load_dotenv
+from graph_transport import get_default_transport
+from send_queue import get_default_send_queue
 
 # Load environment variables
 load_dotenv()
@@ -10,38 +12,62 @@ load_dotenv()
 FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv("FACEBOOK_PAGE_ACCESS_TOKEN")
 
 class FacebookHandler:
-    def __init__(self):
+    def __init__(self, transport=None, send_queue=None):
         self.page_access_token = FACEBOOK_PAGE_ACCESS_TOKEN
         self.api_version = "v17.0"  # Using a recent API version
         self.base_url = f"https://graph.facebook.com/{self.api_version}"
+        # Shared pooled session with timeouts and retries
+        self.transport = transport or get_default_transport()
+        # Rate-limited outbound queue for the Send API (None sends directly)
+        self.send_queue = send_queue or get_default_send_queue()
     
-    def send_text_message(self, recipient_id, message_text):
-        """Send a text message to a recipient"""
-        endpoint = f"{self.base_url}/me/messages"
+    def _post(self, endpoint, data, label):
+        """POST a JSON payload to the Graph API and return the decoded response"""
         params = {"access_token": self.page_access_token}
         headers = {"Content-Type": "application/json"}
         
+        try:
+            response = self.transport.post(
+                endpoint,
+                label=label,
+                params=params,
+                headers=headers,
+                data=json.dumps(data)
+            )
+            result = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            result = {"error": {"message": str(e)}}
+        
+        if "error" in result:
+            print(f"Error calling Graph API ({label}): {result['error']}")
+        return result
+    
+    def _send(self, recipient_id, data, label):
+        """Send a Send API payload, through the outbound queue when it is enabled"""
+        endpoint = f"{self.base_url}/me/messages"
+        
+        if self.send_queue:
+            queued = self.send_queue.enqueue(
+                self.page_access_token,
+                recipient_id,
+                lambda: self._post(endpoint, data, label)
+            )
+            return {"queued": queued}
+        
+        return self._post(endpoint, data, label)
+    
+    def send_text_message(self, recipient_id, message_text):
+        """Send a text message to a recipient"""
         data = {
             "recipient": {"id": recipient_id},
             "messaging_type": "RESPONSE",
             "message": {"text": message_text}
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._send(recipient_id, data, "send_text_message")
     
     def send_quick_replies(self, recipient_id, message_text, quick_replies):
         """Send a message with quick reply buttons"""
-        endpoint = f"{self.base_url}/me/messages"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         # Format the quick replies
         formatted_quick_replies = []
         for reply in quick_replies:
@@ -60,21 +86,10 @@ class FacebookHandler:
             }
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._send(recipient_id, data, "send_quick_replies")
     
     def send_image_message(self, recipient_id, image_url):
         """Send an image message to a recipient"""
-        endpoint = f"{self.base_url}/me/messages"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         data = {
             "recipient": {"id": recipient_id},
             "messaging_type": "RESPONSE",
@@ -89,21 +104,10 @@ class FacebookHandler:
             }
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._send(recipient_id, data, "send_image_message")
     
     def send_button_template(self, recipient_id, text, buttons):
         """Send a button template message to a recipient"""
-        endpoint = f"{self.base_url}/me/messages"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         data = {
             "recipient": {"id": recipient_id},
             "messaging_type": "RESPONSE",
@@ -119,14 +123,7 @@ class FacebookHandler:
             }
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._send(recipient_id, data, "send_button_template")
     
     def get_user_profile(self, user_id):
         """Get user profile information"""
@@ -136,56 +133,45 @@ class FacebookHandler:
             "fields": "first_name,last_name,profile_pic"
         }
         
-        response = requests.get(endpoint, params=params)
-        return response.json()
+        try:
+            response = self.transport.get(endpoint, label="get_user_profile", params=params)
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error calling Graph API (get_user_profile): {e}")
+            return {"error": {"message": str(e)}}
     
     def mark_seen(self, recipient_id):
         """Mark message as seen"""
-        endpoint = f"{self.base_url}/me/messages"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         data = {
             "recipient": {"id": recipient_id},
             "sender_action": "mark_seen"
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
+        return self._send(recipient_id, data, "mark_seen")
+    
+    def send_typing_indicator(self, recipient_id, typing=True):
+        """Turn the typing indicator on or off"""
+        data = {
+            "recipient": {"id": recipient_id},
+            "sender_action": "typing_on" if typing else "typing_off"
+        }
         
-        return response.json()
+        return self._send(recipient_id, data, "send_typing_indicator")
         
     def setup_get_started_button(self):
         """Set up the Get Started button"""
         endpoint = f"{self.base_url}/me/messenger_profile"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         data = {
             "get_started": {
                 "payload": "GET_STARTED"
             }
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._post(endpoint, data, "setup_get_started_button")
         
     def setup_greeting_text(self):
         """Set up the greeting text shown on the welcome screen"""
         endpoint = f"{self.base_url}/me/messenger_profile"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         data = {
             "greeting": [
                 {
@@ -195,21 +181,11 @@ class FacebookHandler:
             ]
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._post(endpoint, data, "setup_greeting_text")
         
     def setup_persistent_menu(self):
         """Set up the persistent menu"""
         endpoint = f"{self.base_url}/me/messenger_profile"
-        params = {"access_token": self.page_access_token}
-        headers = {"Content-Type": "application/json"}
-        
         data = {
             "persistent_menu": [
                 {
@@ -241,14 +217,7 @@ class FacebookHandler:
             ]
         }
         
-        response = requests.post(
-            endpoint,
-            params=params,
-            headers=headers,
-            data=json.dumps(data)
-        )
-        
-        return response.json()
+        return self._post(endpoint, data, "setup_persistent_menu")
     
     def send_welcome_message(self, recipient_id):
         """Send the welcome message with quick replies"""
@@ -0,0 +1,561 @@
+"""
+Declarative conversation flows
+
+Each flow is a list of steps, numbered from 1 like ConversationState steps.
+A step handles one incoming message (the first step of a flow runs with no
+message when the flow is entered) and may:
+
+- "store": save the message as an answer under this key
+- "reply" / "replies": respond and move to the next step ("stay": True keeps
+  the step, e.g. to re-ask after an invalid choice)
+- "goto": enter another flow, running its first step
+- "finish": save the answers to the flow's "sink" worksheet, reset the
+  state and respond with "reply"
+- "switch": pick a nested step by the message or a stored answer
+  ("match" is "exact", "lower" or "prefix"; "default" is used otherwise)
+
+A flow can be entered with answers the user already gave (e.g. a budget
+found by the intent router); a step that stores a pre-filled answer runs
+with it straight away instead of waiting for the user, so its question is
+skipped. Finishing steps always wait for the user.
+
+A "reply" is either text or {"by": ..., "cases": {...}, "default": ...} to
+pick the text the same way a switch does. Finishing replies are formatted
+with the answers, e.g. "{location}".
+
+FlowEngine compiles the definitions at startup into integer-indexed tables,
+so routing a message is a dict lookup for the flow, a list index for the
+step and a tuple index for the operation.
+"""
+
+FLOW_DEFINITIONS = {
+    # Find Home
+    "find_home": {
+        "steps": [
+            {"reply": "Great! Are you looking to buy or rent?", "replies": ["Buy", "Rent"]},
+            {
+                "switch": "message", "match": "lower",
+                "cases": {"buy": {"goto": "find_home_buy"}, "rent": {"goto": "find_home_rent"}},
+                "default": {"reply": "Please choose Buy or Rent to continue.", "replies": ["Buy", "Rent"], "stay": True}
+            }
+        ]
+    },
+    "find_home_buy": {
+        "sink": {"worksheet": "Home Preferences", "type": "buy"},
+        "steps": [
+            {"reply": "What type of home are you interested in?",
+             "replies": ["House", "Condo", "Apartment", "Townhome", "Other"]},
+            {"store": "home_type", "reply": "What is your budget range?",
+             "replies": ["$100k-$200k", "$200k-$300k", "$300k-$400k", "$400k-$500k", "$500k+"]},
+            {"store": "budget", "reply": "What location are you considering? Please type the city and state."},
+            {"store": "location", "reply": "Do you have financing or need assistance?",
+             "replies": ["Yes, I'm pre-approved", "No, I need financing help"]},
+            {"store": "financing", "finish": True,
+             "reply": "Thank you! We've recorded your preferences for a {home_type} in {location} within budget {budget}.\n\nOur team will review available properties and get back to you soon. Is there anything specific you're looking for in your new home?"}
+        ]
+    },
+    "find_home_rent": {
+        "sink": {"worksheet": "Home Preferences", "type": "rent"},
+        "steps": [
+            {"reply": "What kind of property are you looking for?",
+             "replies": ["Apartment", "House", "Townhome", "Other"]},
+            {"store": "property_type", "reply": "What's your monthly budget?",
+             "replies": ["$500-$1000", "$1000-$1500", "$1500-$2000", "$2000-$2500", "$2500+"]},
+            {"store": "budget", "reply": "What area are you interested in? Please type the city and state."},
+            {"store": "location", "reply": "Do you need a roommate-finding service?", "replies": ["Yes", "No"]},
+            {"store": "roommate_service", "finish": True,
+             "reply": "Thank you! We've recorded your preferences for a {property_type} to rent in {location} within a monthly budget of {budget}.\n\nOur rental specialists will review available properties and get back to you soon. Is there anything specific you're looking for in your new home?"}
+        ]
+    },
+
+    # Get Help
+    "get_help": {
+        "steps": [
+            {"reply": "How can we assist you today?",
+             "replies": ["Real Estate Questions", "Maintenance & Repairs", "Legal Help", "Other"]},
+            {
+                "store": "help_category", "switch": "message",
+                "cases": {
+                    "Real Estate Questions": {"goto": "help_real_estate"},
+                    "Maintenance & Repairs": {"goto": "help_maintenance"},
+                    "Legal Help": {"goto": "help_legal"},
+                    "Other": {"goto": "help_other"}
+                },
+                "default": {"reply": "Please select one of the following help categories:",
+                            "replies": ["Real Estate Questions", "Maintenance & Repairs", "Legal Help", "Other"],
+                            "stay": True}
+            }
+        ]
+    },
+    "help_real_estate": {
+        "sink": {"worksheet": "Help Requests"},
+        "steps": [
+            {"reply": "What's your question about?", "replies": ["Buying", "Selling", "Renting", "Financing"]},
+            {
+                "store": "real_estate_topic",
+                "reply": {
+                    "by": "real_estate_topic",
+                    "cases": {
+                        "Buying": "Buying a home is a major decision. Swift Showings can help you navigate the process without the high fees of traditional agents. Some key things to consider are your budget, location preferences, and financing options. Would you like to speak with one of our home buying experts?",
+                        "Selling": "Swift Showings can help you sell your home with lower fees than traditional agents. We provide professional photos, listing services, and connect you directly with interested buyers. Would you like to speak with one of our home selling experts?",
+                        "Renting": "Finding the right rental property can be challenging. Swift Showings can help you find apartments, houses, or townhomes that match your budget and preferences. We also offer roommate-finding services if needed. Would you like to speak with one of our rental specialists?",
+                        "Financing": "Financing a home purchase involves understanding mortgage options, interest rates, and qualification requirements. Swift Showings partners with several lenders who can help you explore your options. Would you like to speak with one of our financing partners?"
+                    },
+                    "default": "We'd be happy to answer your real estate questions. Would you like to speak with one of our experts?"
+                },
+                "replies": ["Yes, connect me", "No thanks"]
+            },
+            {
+                "store": "wants_connection", "finish": True,
+                "reply": {
+                    "by": "message",
+                    "cases": {"Yes, connect me": "Great! One of our experts will reach out to you shortly via Messenger. Is there anything specific you'd like them to prepare for your conversation?"},
+                    "default": "No problem! If you have any other questions about real estate, feel free to ask anytime. Is there something else I can help you with today?"
+                }
+            }
+        ]
+    },
+    "help_maintenance": {
+        "sink": {"worksheet": "Help Requests"},
+        "steps": [
+            {"reply": "Are you looking for DIY solutions or a professional service?", "replies": ["DIY", "Professional"]},
+            {
+                "store": "maintenance_preference", "switch": "message",
+                "cases": {
+                    "DIY": {"reply": "What type of maintenance issue are you trying to address?",
+                            "replies": ["Plumbing", "Electrical", "HVAC", "Structural", "Other"]}
+                },
+                "default": {"reply": "What type of professional service do you need?",
+                            "replies": ["Plumber", "Electrician", "HVAC Technician", "Contractor", "Other"]}
+            },
+            {
+                "store": "maintenance_issue", "switch": "maintenance_preference",
+                "cases": {
+                    "DIY": {
+                        "reply": {
+                            "by": "maintenance_issue",
+                            "cases": {
+                                "Plumbing": "For common plumbing issues, we recommend checking for leaks at pipe connections, ensuring proper water pressure, and using plungers for simple clogs. Would you like us to send you our DIY plumbing troubleshooting guide?",
+                                "Electrical": "For electrical issues, always prioritize safety. Check if the issue is isolated to one circuit by examining your breaker panel. For simple fixture issues, ensure the power is OFF before attempting any work. Would you like us to send you our DIY electrical safety guide?",
+                                "HVAC": "For HVAC maintenance, regularly replace filters, ensure vents are unblocked, and check thermostat settings. Simple issues can often be resolved by cleaning components and ensuring proper airflow. Would you like us to send you our HVAC maintenance checklist?",
+                                "Structural": "For minor structural issues like small cracks or loose fixtures, monitoring the problem is important. Document with photos to track any changes. Would you like us to send you our guide for identifying serious vs. minor structural concerns?",
+                                "Other": "We have various DIY guides for home maintenance and repairs. What specific issue are you trying to address?"
+                            },
+                            "default": "We have various DIY guides that might help. Would you like us to send you some resources?"
+                        },
+                        "replies": ["Yes, send guide", "No thanks"]
+                    }
+                },
+                "default": {
+                    "reply": {
+                        "by": "maintenance_issue",
+                        "cases": {
+                            "Plumber": "We work with licensed plumbers who can handle everything from leaks to installations. Our network of professionals offers competitive rates and quality service. Would you like us to recommend a plumber in your area?",
+                            "Electrician": "Our network includes certified electricians who can handle repairs, installations, and inspections. They offer competitive rates and reliable service. Would you like us to recommend an electrician in your area?",
+                            "HVAC Technician": "We partner with HVAC specialists who can handle maintenance, repairs, and installations for heating and cooling systems. Would you like us to recommend an HVAC technician in your area?",
+                            "Contractor": "Our contractor network includes professionals for renovations, repairs, and custom work. They offer fair pricing and quality craftsmanship. Would you like us to recommend a contractor in your area?",
+                            "Other": "We have a wide network of home service professionals. What specific type of service provider do you need?"
+                        },
+                        "default": "We can recommend qualified professionals for your needs. Would you like us to connect you with a service provider?"
+                    },
+                    "replies": ["Yes, recommend", "No thanks"]
+                }
+            },
+            {
+                "store": "wants_resources", "switch": "message", "match": "prefix",
+                "cases": {
+                    "Yes": {
+                        "finish": True,
+                        "reply": {
+                            "by": "maintenance_preference",
+                            "cases": {"DIY": "We'll send you the relevant DIY guide via Messenger shortly. If you find you need professional help after trying the DIY approach, just let us know. Is there anything else you need help with today?"},
+                            "default": "We'll have one of our service partners contact you soon to provide a quote and schedule service. Is there anything specific about your maintenance needs that we should share with them?"
+                        }
+                    }
+                },
+                "default": {"finish": True, "reply": "No problem! If you need maintenance or repair assistance in the future, we're here to help. Is there something else I can assist you with today?"}
+            }
+        ]
+    },
+    "help_legal": {
+        "sink": {"worksheet": "Help Requests"},
+        "steps": [
+            {"reply": "Do you need help with contracts, tenant rights, or something else?",
+             "replies": ["Contracts", "Tenant Rights", "Other"]},
+            {
+                "store": "legal_topic", "switch": "legal_topic",
+                "cases": {
+                    "Contracts": {
+                        "reply": "Real estate contracts can be complex legal documents. While we can provide general information, specific legal advice should come from a qualified attorney. We can offer general guidance on standard contract terms and what to look for. Would you like us to connect you with a real estate attorney?",
+                        "replies": ["Yes, connect me", "Just general info"]
+                    },
+                    "Tenant Rights": {
+                        "reply": "Tenant rights vary by location, but generally cover issues like security deposits, maintenance responsibilities, privacy, and eviction procedures. We can provide general information, but specific legal advice requires an attorney. Would you like us to connect you with a tenant rights specialist?",
+                        "replies": ["Yes, connect me", "Just general info"]
+                    },
+                    # Free text: the next step asks what the concern is
+                    "Other": {"reply": "Legal matters in real estate can cover many areas. To provide the most helpful guidance, could you tell us more about your specific legal concern?"}
+                },
+                "default": {
+                    "reply": "For specific legal advice, we recommend consulting with a qualified attorney. Would you like us to connect you with a real estate legal specialist?",
+                    "replies": ["Yes, connect me", "Just general info"]
+                }
+            },
+            {
+                "switch": "legal_topic",
+                "cases": {
+                    "Other": {
+                        "store": "specific_legal_concern",
+                        "reply": "Thank you for explaining your concern. While we can provide general information, specific legal advice should come from a qualified attorney. Would you like us to connect you with a legal specialist who can help with this matter?",
+                        "replies": ["Yes, connect me", "Just general info"]
+                    }
+                },
+                "default": {"store": "wants_legal_referral", "finish": True, "reply": "legal_referral"}
+            },
+            # Only reached on the "Other" path
+            {"store": "wants_legal_referral", "finish": True, "reply": "legal_referral"}
+        ],
+        "replies": {
+            "legal_referral": {
+                "by": "message",
+                "cases": {"Yes, connect me": "We'll have a legal specialist contact you soon via Messenger. They can provide more specific guidance based on your situation and location. Is there anything else about your legal concern that we should share with them?"},
+                "default": "We understand. For general information, it's important to know that real estate legal matters are governed by both state and local laws. We recommend researching the specific regulations for your location or consulting free legal resources available through housing authorities. Is there something specific you'd like to understand better?"
+            }
+        }
+    },
+    "help_other": {
+        "sink": {"worksheet": "Help Requests"},
+        "steps": [
+            {"reply": "Please type your question or describe what you need help with, and we'll connect you with a live agent who can assist you."},
+            {"store": "other_question", "finish": True,
+             "reply": "Thank you for your question. We've recorded it and will have a live agent follow up with you as soon as possible, usually within 1 business day. Is there anything else you'd like to add to your request?"}
+        ]
+    },
+
+    # Save Money
+    "save_money": {
+        "steps": [
+            {"reply": "What type of savings are you looking for?",
+             "replies": ["Lower Mortgage Payments", "Reduce Utility Bills", "Home Insurance Discounts", "Tax Benefits"]},
+            {
+                "store": "savings_category", "switch": "message",
+                "cases": {
+                    "Lower Mortgage Payments": {"goto": "savings_mortgage"},
+                    "Reduce Utility Bills": {"goto": "savings_utility"},
+                    "Home Insurance Discounts": {"goto": "savings_insurance"},
+                    "Tax Benefits": {"goto": "savings_tax"}
+                },
+                "default": {"reply": "Please select one of the following savings categories:",
+                            "replies": ["Lower Mortgage Payments", "Reduce Utility Bills", "Home Insurance Discounts", "Tax Benefits"],
+                            "stay": True}
+            }
+        ]
+    },
+    "savings_mortgage": {
+        "sink": {"worksheet": "Money Requests"},
+        "steps": [
+            {"reply": "Are you refinancing or looking for a new loan?", "replies": ["Refinance", "New Loan"]},
+            {
+                "store": "mortgage_type",
+                "reply": {
+                    "by": "message",
+                    "cases": {
+                        "Refinance": "Refinancing can be a great way to lower your monthly payments. Our recommended lenders for refinancing include:\n\n"
+                                     "• SwiftRate Mortgage: Specializing in quick refinancing with competitive rates\n"
+                                     "• HomeSaver Loans: Offering no-fee refinancing options\n"
+                                     "• EasyFi: Digital-first refinancing with streamlined approval process\n\n"
+                                     "Would you like to connect with a mortgage expert to discuss your refinancing options?"
+                    },
+                    "default": "Finding the right mortgage for a new home is crucial. Our recommended lenders include:\n\n"
+                               "• FirstTime Mortgage: Specializing in first-time homebuyer programs\n"
+                               "• ValueRate Home Loans: Offering competitive rates with flexible terms\n"
+                               "• SwiftApproval: Known for their quick pre-approval process\n\n"
+                               "Would you like to connect with a mortgage expert to discuss your options?"
+                },
+                "replies": ["Yes, connect me", "No thanks"]
+            },
+            {
+                "store": "wants_mortgage_expert", "finish": True,
+                "reply": {
+                    "by": "message",
+                    "cases": {"Yes, connect me": "Great! One of our mortgage specialists will reach out to you shortly. They'll help you explore the best options to lower your payments. Is there anything specific about your mortgage situation they should know?"},
+                    "default": "No problem! If you decide you'd like to speak with a mortgage expert in the future, just let us know. In the meantime, our blog has some great articles on finding the best mortgage rates. Is there anything else I can help you with today?"
+                }
+            }
+        ]
+    },
+    "savings_utility": {
+        "sink": {"worksheet": "Money Requests"},
+        "steps": [
+            {"reply": "Are you interested in smart home solutions or energy-efficient appliances?",
+             "replies": ["Smart Home", "Appliances", "Both"]},
+            {
+                "store": "utility_preference",
+                "reply": {
+                    "by": "message",
+                    "cases": {
+                        "Smart Home": "Smart home solutions can significantly reduce your utility bills. Some effective options include:\n\n"
+                                      "• Smart thermostats: Save 10-15% on heating and cooling costs\n"
+                                      "• Smart lighting: Reduce electricity usage by automatically turning off when not needed\n"
+                                      "• Smart plugs: Control energy usage of electronics and appliances\n"
+                                      "• Smart water controllers: Reduce water waste and lower water bills\n\n"
+                                      "Many utility companies offer rebates for installing these devices. Would you like us to send you our guide on smart home energy savings?",
+                        "Appliances": "Energy-efficient appliances can dramatically reduce your utility bills. Look for ENERGY STAR certified:\n\n"
+                                      "• Refrigerators: Can save $300+ over their lifetime\n"
+                                      "• Washing machines: Use 25% less energy and 33% less water\n"
+                                      "• HVAC systems: Can reduce energy usage by up to 20%\n"
+                                      "• Water heaters: Tankless options can save up to 30% on water heating\n\n"
+                                      "Many states offer rebates or tax incentives for energy-efficient upgrades. Would you like us to send you information about rebate programs in your area?"
+                    },
+                    "default": "Combining smart home technology with energy-efficient appliances creates the biggest impact on utility bills.\n\n"
+                               "Smart home solutions:\n"
+                               "• Smart thermostats: Save 10-15% on heating and cooling\n"
+                               "• Smart lighting and plugs: Reduce electricity waste\n\n"
+                               "Energy-efficient appliances:\n"
+                               "• ENERGY STAR certified appliances use significantly less energy\n"
+                               "• Modern HVAC systems paired with smart controls maximize savings\n\n"
+                               "Would you like us to send you our comprehensive guide on reducing utility bills?"
+                },
+                "replies": ["Yes, send guide", "No thanks"]
+            },
+            {
+                "store": "wants_utility_guide", "finish": True,
+                "reply": {
+                    "by": "message",
+                    "cases": {"Yes, send guide": "Great! We'll send you our guide on reducing utility bills via Messenger. It includes links to current rebate programs and tax incentives for energy-efficient upgrades. Is there anything specific about your home's energy usage you're concerned about?"},
+                    "default": "No problem! If you'd like information about reducing utility bills in the future, just let us know. Is there anything else I can help you with today?"
+                }
+            }
+        ]
+    },
+    "savings_insurance": {
+        "sink": {"worksheet": "Money Requests"},
+        "steps": [
+            {"reply": "Do you currently have home insurance?", "replies": ["Yes", "No", "Shopping Around"]},
+            {
+                "store": "has_insurance",
+                "reply": {
+                    "by": "message",
+                    "cases": {
+                        "Yes": "Many homeowners don't realize they qualify for discounts on their existing policy. Common discounts include:\n\n"
+                               "• Multi-policy (bundling with auto insurance): 5-25% savings\n"
+                               "• Home security systems: 5-20% savings\n"
+                               "• Impact-resistant roofing: 5-10% savings\n"
+                               "• New home/renovation discounts: 10-15% savings\n"
+                               "• Claims-free discount: 5-20% for no claims history\n\n"
+                               "Would you like us to connect you with an insurance advisor who can review your current policy for potential savings?",
+                        "No": "When shopping for home insurance, it's important to compare offers from multiple providers. Some top-rated insurers for cost-effective coverage include:\n\n"
+                              "• HomeGuard Insurance: Known for competitive rates and good customer service\n"
+                              "• ValueSafe: Offers specialized packages for new homeowners\n"
+                              "• SecureHome: Provides substantial discounts for home security features\n\n"
+                              "Would you like us to connect you with an insurance advisor who can help you find the best rates?"
+                    },
+                    "default": "Smart move! Shopping around regularly can save you hundreds on home insurance. When comparing policies, consider these factors:\n\n"
+                               "• Coverage limits: Make sure they match your home's actual replacement value\n"
+                               "• Deductibles: Higher deductibles mean lower premiums\n"
+                               "• Discount opportunities: Security systems, bundling, etc.\n"
+                               "• Customer service ratings: Check independent reviews\n\n"
+                               "Would you like us to connect you with an insurance advisor who can help you compare options?"
+                },
+                "replies": ["Yes, connect me", "No thanks"]
+            },
+            {
+                "store": "wants_insurance_advisor", "finish": True,
+                "reply": {
+                    "by": "message",
+                    "cases": {"Yes, connect me": "Great! One of our insurance partners will reach out to you soon to help you explore the best options for your situation. They can provide a free review of your current policy or help you find new coverage with maximum discounts. Is there anything specific about your home or insurance needs they should know?"},
+                    "default": "No problem! If you'd like help with home insurance in the future, just let us know. We also have a helpful guide on our website that outlines the most overlooked insurance discounts. Is there anything else I can help you with today?"
+                }
+            }
+        ]
+    },
+    "savings_tax": {
+        "sink": {"worksheet": "Money Requests"},
+        "steps": [
+            {
+                "reply": "Homeownership comes with several valuable tax benefits. The most common include:\n\n"
+                         "• Mortgage interest deduction: Interest paid on up to $750,000 of mortgage debt\n"
+                         "• Property tax deduction: Up to $10,000 in state and local taxes\n"
+                         "• Home office deduction: If you work from home\n"
+                         "• Energy efficiency credits: For qualifying improvements\n"
+                         "• Capital gains exclusion: When selling your primary residence\n\n"
+                         "Tax laws change frequently and benefits vary based on your situation. Would you like to connect with a tax consultant who specializes in real estate?",
+                "replies": ["Yes, connect me", "No thanks"]
+            },
+            {
+                "store": "wants_tax_consultant", "finish": True,
+                "reply": {
+                    "by": "message",
+                    "cases": {"Yes, connect me": "Great! One of our tax consultant partners will reach out to you soon. They can provide personalized advice on maximizing your homeowner tax benefits. Is there anything specific about your tax situation they should know?"},
+                    "default": "No problem! If you'd like more information about homeowner tax benefits in the future, just let us know. Our blog also has seasonal tax tips that you might find helpful. Is there anything else I can help you with today?"
+                }
+            }
+        ]
+    }
+}
+
+# Operation codes of compiled steps
+OP_REPLY, OP_GOTO, OP_FINISH, OP_SWITCH = range(4)
+
+# How a switch compares its value with the case keys
+MATCH_EXACT, MATCH_LOWER, MATCH_PREFIX = range(3)
+MATCH_MODES = {"exact": MATCH_EXACT, "lower": MATCH_LOWER, "prefix": MATCH_PREFIX}
+
+class Answers(dict):
+    """Answers for formatting finishing replies; missing answers read as "None" like dict.get did"""
+    def __missing__(self, key):
+        return "None"
+
+class FlowEngine:
+    """
+    Runs conversation flows compiled from FLOW_DEFINITIONS
+
+    Compiled steps are tuples: (op, store_key, ...). Flows are numbered in
+    definition order; `tables[flow_id][step]` is the step to run (index 0
+    is unused so steps keep their 1-based numbers).
+    """
+    def __init__(self, definitions=FLOW_DEFINITIONS):
+        self.flow_ids = {name: flow_id for flow_id, name in enumerate(definitions)}
+        self.flow_names = list(definitions)
+        self.sinks = [definition.get("sink") for definition in definitions.values()]
+        self.tables = [self._compile_flow(definition) for definition in definitions.values()]
+        self._ops = (self._run_reply, self._run_goto, self._run_finish, self._run_switch)
+
+    def run(self, flow_name, state, message, on_finish):
+        """
+        Handle a message for a flow at the state's current step
+        `on_finish(sink, data)` saves a finished flow's answers
+        Returns (response_text, quick_replies or None), or None if the step doesn't exist
+        """
+        flow_id = self.flow_ids.get(flow_name)
+        if flow_id is None:
+            return None
+        return self._run_step(flow_id, state.get_step(), state, message, on_finish)
+
+    def enter(self, flow_name, state, on_finish, answers=None):
+        """Start a flow from its first step, skipping the questions `answers` already cover"""
+        state.set_flow(flow_name, 1)
+        state.clear_prefilled()
+        if answers:
+            state.prefill(answers)
+        return self.run(flow_name, state, None, on_finish)
+
+    def _run_step(self, flow_id, step, state, message, on_finish):
+        table = self.tables[flow_id]
+        if not isinstance(step, int) or not 0 < step < len(table):
+            return None
+        node = table[step]
+        return self._ops[node[0]](flow_id, node, state, message, on_finish)
+
+    def _run_node(self, flow_id, node, state, message, on_finish):
+        return self._ops[node[0]](flow_id, node, state, message, on_finish)
+
+    def _run_reply(self, flow_id, node, state, message, on_finish):
+        _, store_key, text, replies, stay = node
+        if store_key:
+            state.store_answer(store_key, message)
+        if not stay:
+            state.next_step()
+            skipped = self._skip_prefilled(flow_id, state, on_finish)
+            if skipped:
+                return skipped
+        return (self._pick_text(text, state, message), replies)
+
+    def _skip_prefilled(self, flow_id, state, on_finish):
+        """Run the next step with its pre-filled answer, if it has one"""
+        table = self.tables[flow_id]
+        step = state.get_step()
+        if not 0 < step < len(table):
+            return None
+        node = table[step]
+        if node[0] == OP_FINISH or not node[1]:
+            return None
+        answer = state.take_prefilled(node[1])
+        if answer is None:
+            return None
+        return self._run_node(flow_id, node, state, answer, on_finish)
+
+    def _run_goto(self, flow_id, node, state, message, on_finish):
+        _, store_key, target = node
+        if store_key:
+            state.store_answer(store_key, message)
+        state.set_flow(self.flow_names[target], 1)
+        return self._run_step(target, 1, state, None, on_finish)
+
+    def _run_finish(self, flow_id, node, state, message, on_finish):
+        _, store_key, text = node
+        if store_key:
+            state.store_answer(store_key, message)
+
+        # Save the answers, then reset the flow for next time
+        all_data = state.get_all_data()
+        on_finish(self.sinks[flow_id], all_data)
+        state.reset()
+
+        return (self._pick_text(text, state, message, all_data).format_map(Answers(all_data)), None)
+
+    def _run_switch(self, flow_id, node, state, message, on_finish):
+        _, store_key, source, match, cases, default = node
+        if store_key:
+            state.store_answer(store_key, message)
+        return self._run_node(flow_id, self._pick(source, match, cases, default, state, message), state, message, on_finish)
+
+    def _pick_text(self, text, state, message, data=None):
+        if isinstance(text, str):
+            return text
+        source, match, cases, default = text
+        return self._pick(source, match, cases, default, state, message, data)
+
+    def _pick(self, source, match, cases, default, state, message, data=None):
+        """Choose the case matching the message or a stored answer"""
+        if source == "message":
+            value = message
+        elif data is not None:
+            value = data.get(source)
+        else:
+            value = state.get_answer(source)
+
+        if match == MATCH_PREFIX:
+            value = value or ""
+            for prefix, case in cases:
+                if value.startswith(prefix):
+                    return case
+            return default
+        if match == MATCH_LOWER:
+            value = (value or "").lower()
+        return cases.get(value, default)
+
+    def _compile_flow(self, definition):
+        named_replies = definition.get("replies", {})
+        return [None] + [self._compile_node(step, named_replies) for step in definition["steps"]]
+
+    def _compile_node(self, node, named_replies):
+        store_key = node.get("store")
+        if "switch" in node:
+            source, match, cases = self._compile_cases(node, lambda case: self._compile_node(case, named_replies))
+            return (OP_SWITCH, store_key, source, match, cases, self._compile_node(node["default"], named_replies))
+        if "goto" in node:
+            return (OP_GOTO, store_key, self.flow_ids[node["goto"]])
+
+        text = self._compile_text(node.get("reply"), named_replies)
+        if node.get("finish"):
+            return (OP_FINISH, store_key, text)
+        return (OP_REPLY, store_key, text, node.get("replies"), bool(node.get("stay")))
+
+    def _compile_text(self, text, named_replies):
+        if isinstance(text, str):
+            text = named_replies.get(text, text)
+        if text is None or isinstance(text, str):
+            return text
+        source, match, cases = self._compile_cases(dict(text, switch=text["by"]), lambda case: case)
+        return (source, match, cases, text["default"])
+
+    def _compile_cases(self, node, compile_case):
+        """Compile a switch's cases into a dict (or a list of pairs for prefix matching)"""
+        match = MATCH_MODES[node.get("match", "exact")]
+        cases = {key: compile_case(case) for key, case in node["cases"].items()}
+        if match == MATCH_PREFIX:
+            cases = list(cases.items())
+        elif match == MATCH_LOWER:
+            cases = {key.lower(): case for key, case in cases.items()}
+        return node["switch"], match, cases
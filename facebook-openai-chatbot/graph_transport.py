@@ -0,0 +1,114 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import LatencyStats
+
+# HTTP statuses worth retrying: throttling and server-side errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class GraphTransport:
+    """
+    Pooled keep-alive HTTP session for Graph API calls
+
+    Every call gets connect/read timeouts, is retried with jittered exponential
+    backoff on connection errors, 429 and 5xx responses, and has its latency
+    recorded under a label (usually the calling FacebookHandler method).
+    """
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, max_retries=3, backoff=0.5):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.latency = {}  # label -> LatencyStats
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, label="get", **kwargs):
+        return self.request("GET", url, label=label, **kwargs)
+
+    def post(self, url, label="post", **kwargs):
+        return self.request("POST", url, label=label, **kwargs)
+
+    def request(self, method, url, label="request", **kwargs):
+        """
+        Send a request, retrying transient failures
+        Raises the last requests exception once the retries are used up
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+
+        while True:
+            start = time.time()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # A read timeout on a POST may already have been delivered, so don't resend it
+                if method != "GET" and isinstance(e, requests.exceptions.ReadTimeout):
+                    self._record(label, start, failed=True)
+                    raise
+                if attempt >= self.max_retries:
+                    self._record(label, start, failed=True)
+                    raise
+                response = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self._record(label, start)
+                    return response
+
+            self._record(label, start)
+            self._sleep_before_retry(attempt, response)
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+
+    def stats(self):
+        """Get per-label latency plus retry and failure counts"""
+        with self._lock:
+            latency = dict(self.latency)
+            stats = {"retries": self.retries, "failures": self.failures}
+        stats["latency"] = {label: recorder.snapshot() for label, recorder in latency.items()}
+        return stats
+
+    def _sleep_before_retry(self, attempt, response):
+        """Back off exponentially with full jitter, honoring Retry-After"""
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+        time.sleep(delay)
+
+    def _record(self, label, start, failed=False):
+        with self._lock:
+            recorder = self.latency.get(label)
+            if recorder is None:
+                recorder = self.latency[label] = LatencyStats()
+            if failed:
+                self.failures += 1
+        recorder.record(time.time() - start)
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+def get_default_transport():
+    """Get the process-wide transport configured by the GRAPH_* environment variables"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = GraphTransport(
+                pool_size=int(os.getenv("GRAPH_POOL_SIZE", "10")),
+                connect_timeout=float(os.getenv("GRAPH_CONNECT_TIMEOUT", "3.05")),
+                read_timeout=float(os.getenv("GRAPH_READ_TIMEOUT", "10")),
+                max_retries=int(os.getenv("GRAPH_MAX_RETRIES", "3")),
+                backoff=float(os.getenv("GRAPH_BACKOFF", "0.5"))
+            )
+        return _default_transport
@@ -0,0 +1,356 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import namedtuple
+
+# Intents the router can start, in priority order (earlier wins a tie it can't resolve)
+#   flow: the flow to enter
+#   parent: a more general intent to fall back to when siblings tie
+#   answers: answers implied by the intent, stored as if the user had chosen them
+#   slots: extracted slot -> answer keys it fills
+#   patterns: (regex, weight) pairs, matched case-insensitively. A weight of 1.0
+#     is enough on its own; 0.5 marks a word too common to route by itself
+#     ("fix", "tax"), which needs a second signal such as a context term
+INTENT_DEFINITIONS = {
+    "find_home_buy": {
+        "flow": "find_home_buy",
+        "parent": "find_home",
+        "slots": {"home_type": ["home_type"], "budget": ["budget"], "city": ["location"]},
+        "patterns": [
+            (r"\b(buy|buying|purchase|purchasing)\b.{0,40}\b(home|house|condo|townho(me|use)|property|place)", 1.0),
+            (r"\b(looking|want|wanting|planning|ready|hoping) to (buy|purchase)\b", 1.0),
+            (r"\b(homes?|houses?|condos?|townho(mes?|uses?)|propert(y|ies))\b.{0,20}\bfor sale\b", 1.0),
+            (r"\bfirst[- ]time (home ?)?buyer", 1.0)
+        ]
+    },
+    "find_home_rent": {
+        "flow": "find_home_rent",
+        "parent": "find_home",
+        "slots": {"home_type": ["property_type"], "budget": ["budget"], "city": ["location"]},
+        "patterns": [
+            (r"\b(rent|renting|lease|leasing)\b.{0,40}\b(home|house|condo|townho(me|use)|apartment|place|room|studio)", 1.0),
+            (r"\b(looking|want|wanting|planning|need) to (rent|lease)\b", 1.0),
+            (r"\b(apartments?|houses?|homes?|rooms?|condos?|studios?|places?)\b.{0,20}\bfor rent\b", 1.0),
+            (r"\brentals?\b", 0.5)
+        ]
+    },
+    "find_home": {
+        "flow": "find_home",
+        "slots": {"home_type": ["home_type", "property_type"], "budget": ["budget"], "city": ["location"]},
+        "patterns": [
+            (r"\b(find|finding|looking for|search(ing)? for)\b.{0,20}\b(home|house|place to live|apartment|condo|townhome)\b", 1.0),
+            (r"\b(need|want) (a |an )?(new )?(home|house|place to live|apartment|condo|townhome)\b", 1.0),
+            (r"\b(moving|relocating) to\b", 0.5)
+        ]
+    },
+    "help_real_estate_selling": {
+        "flow": "help_real_estate",
+        "parent": "get_help",
+        "answers": {"help_category": "Real Estate Questions", "real_estate_topic": "Selling"},
+        "patterns": [
+            (r"\b(sell|selling|list|listing)\b.{0,20}\b(my |our )?(home|house|condo|townho(me|use)|property|place)\b", 1.0)
+        ]
+    },
+    "help_maintenance": {
+        "flow": "help_maintenance",
+        "parent": "get_help",
+        "answers": {"help_category": "Maintenance & Repairs"},
+        "patterns": [
+            (r"\b(plumber|plumbing|electrician|handyman|hvac (repair|tech)|maintenance request)\b", 1.0),
+            (r"\b(repair|repairs|fix|fixing|broken|leak|leaks|leaking|leaky|clogged|maintenance|not working)\b", 0.5),
+            (r"\b(sink|toilet|faucet|pipes?|drain|shower|roof|ceiling|furnace|heater|heating|hvac|a/?c|air condition(er|ing)|"
+             r"dishwasher|washer|dryer|fridge|refrigerator|stove|oven|appliances?|outlets?|wiring|electrical|mold)\b", 0.5)
+        ]
+    },
+    "help_legal": {
+        "flow": "help_legal",
+        "parent": "get_help",
+        "answers": {"help_category": "Legal Help"},
+        "patterns": [
+            (r"\b(lawyer|attorney|legal|evict(ed|ion)?|sue|suing|lawsuit)\b", 1.0),
+            (r"\b(tenant rights|lease agreement|security deposit|landlord dispute|contract dispute)\b", 1.0)
+        ]
+    },
+    "get_help": {
+        "flow": "get_help",
+        "patterns": [
+            (r"\b(need help|help me|can you help|i have a question)\b", 0.5),
+            (r"\b(talk|speak|chat) (to|with) (a |an )?(agent|human|person|expert|someone)\b", 1.0)
+        ]
+    },
+    "savings_mortgage": {
+        "flow": "savings_mortgage",
+        "parent": "save_money",
+        "answers": {"savings_category": "Lower Mortgage Payments"},
+        "patterns": [
+            (r"\b(refinanc\w*|refi|pre-?approv\w*)\b", 1.0),
+            (r"\b(mortgage|home loan|lender)s?\b", 0.5),
+            (r"\b(interest rates?|rates?|monthly payments?|payments?)\b", 0.5)
+        ]
+    },
+    "savings_utility": {
+        "flow": "savings_utility",
+        "parent": "save_money",
+        "answers": {"savings_category": "Reduce Utility Bills"},
+        "patterns": [
+            (r"\b(utility|utilities|energy|electric|power|water|gas) (bill|bills|costs?)\b", 1.0),
+            (r"\b(energy efficien\w*|solar panels?|smart thermostat|insulation)\b", 1.0)
+        ]
+    },
+    "savings_insurance": {
+        "flow": "savings_insurance",
+        "parent": "save_money",
+        "answers": {"savings_category": "Home Insurance Discounts"},
+        "patterns": [
+            # Only insurance for a home: "car insurance" is not this flow
+            (r"\b(home ?owners?'?s?|home|house|property|condo) insurance\b", 1.0),
+            (r"\binsurance\b.{0,20}\b(home|house|condo|townho(me|use)|property)\b", 1.0)
+        ]
+    },
+    "savings_tax": {
+        "flow": "savings_tax",
+        "parent": "save_money",
+        "answers": {"savings_category": "Tax Benefits"},
+        "patterns": [
+            (r"\b(tax (breaks?|credits?|benefits?)|deductions?|deductible|write[- ]offs?)\b", 1.0),
+            (r"\b(tax|taxes)\b", 0.5),
+            (r"\b(save|saving|savings|lower|reduce|cut|deduct)\b.{0,20}\btax", 0.5)
+        ]
+    },
+    "save_money": {
+        "flow": "save_money",
+        "patterns": [
+            (r"\b(save|saving|cut|lower|reduce)\b.{0,15}\b(money|costs?|bills?|expenses?)\b", 1.0)
+        ]
+    }
+}
+
+# Slot extraction (city patterns are case-sensitive: a place name is capitalized)
+HOME_TYPE_PATTERN = re.compile(r"\b(house|condo|apartment|townhome|townhouse)s?\b", re.IGNORECASE)
+HOME_TYPES = {"house": "House", "condo": "Condo", "apartment": "Apartment", "townhome": "Townhome", "townhouse": "Townhome"}
+MONEY = r"\$\s?\d[\d,]*(?:\.\d+)?\s?[kKmM]?\b|\b\d[\d,]*(?:\.\d+)?\s?[kK]\b"
+BUDGET_PATTERN = re.compile(
+    rf"(?:{MONEY})(?:\s*(?:-|to)\s*(?:{MONEY}|\d[\d,]*\b))?(?:\s*(?:/\s?mo(?:nth)?\b|per month|a month))?"
+)
+# Capitalized words that follow "in"/"to" without being places ("want to Buy", "in March")
+NOT_PLACES = (
+    "Buy|Rent|Sell|Lease|Find|Get|Save|Help|Move|Talk|Speak|See|Ask|Know|Be|Have|Do|Make|"
+    "The|A|An|My|Our|Your|This|That|I|Swift|"
+    "January|February|March|April|May|June|July|August|September|October|November|December|"
+    "Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday"
+)
+PLACE = rf"(?!(?:{NOT_PLACES})\b)[A-Z][a-zA-Z.'-]+(?:\s+[A-Z][a-zA-Z.'-]+){{0,3}}"
+CITY_PATTERNS = [
+    re.compile(rf"\b({PLACE},\s*[A-Z]{{2}})\b"),
+    re.compile(rf"\b(?:in|near|around|to)\s+({PLACE})")
+]
+
+# General questions ("what is a mortgage?") need two signals before a flow starts
+QUESTION_PATTERN = re.compile(r"^\s*(what|why|how|when|who|which|is|are|does|do|can you explain|explain|tell me about)\b", re.IGNORECASE)
+
+Intent = namedtuple("Intent", ["name", "flow", "answers", "score", "source"])
+
+def tokenize(text):
+    """Lowercase word unigrams and bigrams, the features of LinearIntentModel"""
+    words = re.findall(r"[a-z0-9$']+", text.lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+def extract_slots(text):
+    """Pull the home type, budget and city out of free text"""
+    slots = {}
+    match = HOME_TYPE_PATTERN.search(text)
+    if match:
+        slots["home_type"] = HOME_TYPES[match.group(1).lower()]
+    match = BUDGET_PATTERN.search(text)
+    if match:
+        slots["budget"] = match.group(0).strip()
+    for pattern in CITY_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            slots["city"] = match.group(1)
+            break
+    return slots
+
+class LinearIntentModel:
+    """
+    Small bag-of-words linear classifier (multinomial logistic regression)
+
+    Weights are a JSON file: {"bias": {intent: w}, "weights": {intent: {feature: w}}},
+    written by train_intent_model.py. Scoring a message is a dict lookup per
+    feature per intent, so it costs microseconds.
+    """
+    def __init__(self, bias, weights):
+        self.bias = bias
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["bias"], data["weights"])
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"bias": self.bias, "weights": self.weights}, f)
+
+    def probabilities(self, text):
+        """Get {intent: probability} for a message"""
+        features = tokenize(text)
+        scores = {
+            intent: self.bias.get(intent, 0.0) + sum(weights.get(feature, 0.0) for feature in features)
+            for intent, weights in self.weights.items()
+        }
+        top = max(scores.values())
+        exps = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exps.values())
+        return {intent: value / total for intent, value in exps.items()}
+
+    def predict(self, text):
+        """Get (intent, probability) for the most likely intent"""
+        probabilities = self.probabilities(text)
+        intent = max(probabilities, key=probabilities.get)
+        return intent, probabilities[intent]
+
+    @classmethod
+    def train(cls, examples, epochs=30, learning_rate=0.5, l2=0.0001):
+        """
+        Train on (text, intent) pairs with stochastic gradient descent
+        Include an intent such as "none" for messages that should go to OpenAI
+        """
+        intents = sorted({intent for _, intent in examples})
+        model = cls({intent: 0.0 for intent in intents}, {intent: {} for intent in intents})
+        for epoch in range(epochs):
+            rate = learning_rate / (1 + epoch)
+            for text, label in examples:
+                features = tokenize(text)
+                probabilities = model.probabilities(text)
+                for intent in intents:
+                    gradient = probabilities[intent] - (1.0 if intent == label else 0.0)
+                    model.bias[intent] -= rate * gradient
+                    weights = model.weights[intent]
+                    for feature in features:
+                        weight = weights.get(feature, 0.0)
+                        weights[feature] = weight - rate * (gradient + l2 * weight)
+        # Drop near-zero weights to keep the file small
+        for intent in intents:
+            model.weights[intent] = {
+                feature: round(weight, 4) for feature, weight in model.weights[intent].items() if abs(weight) >= 0.001
+            }
+        return model
+
+class IntentRouter:
+    """
+    Maps free text onto a conversation flow without calling OpenAI
+
+    Compiled phrase patterns score each intent; the best one wins if it clears
+    min_score and isn't tied with an unrelated intent (siblings that tie fall
+    back to their shared parent, e.g. "buy or rent" starts the Find Home menu).
+    When the patterns find nothing clear, an optional LinearIntentModel is
+    asked and used above its probability threshold. Home type, budget and
+    city found in the message pre-fill the flow's answers.
+    """
+    def __init__(self, definitions=INTENT_DEFINITIONS, model=None, model_threshold=0.8, min_score=1.0, max_words=40):
+        self.definitions = definitions
+        self.model = model
+        self.model_threshold = model_threshold
+        self.min_score = min_score
+        self.max_words = max_words
+        self.patterns = [
+            (name, re.compile(pattern, re.IGNORECASE), weight)
+            for name, definition in definitions.items()
+            for pattern, weight in definition["patterns"]
+        ]
+        self.counters = {"messages": 0, "routed": 0, "pattern_hits": 0, "model_hits": 0, "ambiguous": 0}
+        self.intent_counts = {}
+        self._lock = threading.Lock()
+
+    def route(self, text):
+        """Get the Intent for a message, or None if it has no clear intent"""
+        intent = self._classify(text or "")
+        with self._lock:
+            self.counters["messages"] += 1
+            if intent:
+                self.counters["routed"] += 1
+                self.counters[f"{intent.source}_hits"] += 1
+                self.intent_counts[intent.name] = self.intent_counts.get(intent.name, 0) + 1
+        return intent
+
+    def _classify(self, text):
+        if not text.strip() or len(text.split()) > self.max_words:
+            # Long messages are usually questions that need a real answer
+            return None
+
+        scores = {}
+        for name, pattern, weight in self.patterns:
+            if pattern.search(text):
+                scores[name] = scores.get(name, 0.0) + weight
+
+        min_score = self.min_score * (2 if QUESTION_PATTERN.search(text) else 1)
+        name = self._pick(scores, min_score)
+        if name:
+            return self._intent(name, text, max(scores.values()), "pattern")
+
+        if self.model:
+            name, probability = self.model.predict(text)
+            if name in self.definitions and probability >= self.model_threshold:
+                return self._intent(name, text, round(probability, 3), "model")
+        return None
+
+    def _pick(self, scores, min_score):
+        """Choose the best-scoring intent, or None if it is too weak or ambiguous"""
+        if not scores:
+            return None
+        # A specific intent absorbs the score of its parent ("find a house to buy")
+        for name in list(scores):
+            parent = self.definitions[name].get("parent")
+            if parent in scores:
+                scores[name] += scores[parent]
+
+        best = max(scores.values())
+        if best < min_score:
+            return None
+        top = [name for name, score in scores.items() if score == best]
+        if len(top) == 1:
+            return top[0]
+
+        parents = {self.definitions[name].get("parent") for name in top}
+        if len(parents) == 1 and None not in parents:
+            return parents.pop()
+        with self._lock:
+            self.counters["ambiguous"] += 1
+        return None
+
+    def _intent(self, name, text, score, source):
+        definition = self.definitions[name]
+        answers = dict(definition.get("answers", {}))
+        for slot, value in extract_slots(text).items():
+            for key in definition.get("slots", {}).get(slot, []):
+                answers[key] = value
+        return Intent(name, definition["flow"], answers, score, source)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["intents"] = dict(self.intent_counts)
+        stats["hit_rate"] = round(stats["routed"] / stats["messages"], 3) if stats["messages"] else 0
+        return stats
+
+def create_intent_router():
+    """
+    Create the intent router configured by INTENT_ROUTER, INTENT_MODEL_PATH and
+    INTENT_MODEL_THRESHOLD, or None if it is turned off
+    """
+    if os.getenv("INTENT_ROUTER", "true").lower() != "true":
+        return None
+
+    model = None
+    model_path = os.getenv("INTENT_MODEL_PATH", "")
+    if model_path:
+        try:
+            model = LinearIntentModel.load(model_path)
+        except Exception as e:
+            print(f"Error loading intent model from {model_path}: {e}")
+
+    return IntentRouter(model=model, model_threshold=float(os.getenv("INTENT_MODEL_THRESHOLD", "0.8")))
@@ -0,0 +1,43 @@
+import threading
+from collections import deque
+
+class LatencyStats:
+    """
+    Thread-safe latency recorder keeping totals and a window of recent samples
+    """
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Record one duration in seconds"""
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """Get a percentile (0-100) of the recent samples in seconds"""
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * pct / 100))
+        return samples[index]
+
+    def snapshot(self):
+        """Get the stats in milliseconds"""
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0,
+                "max_ms": round(self.max * 1000, 1),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+            }
@@ -1,7 +1,15 @@
 import os
 import time
+import secrets
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import openai
+import openai.error
 from dotenv import load_dotenv
+from bounded_store import BoundedStore
+from metrics import LatencyStats
+from response_cache import cache_key, create_response_cache, settings_fingerprint
+from similarity_cache import create_similarity_cache
 
 # Load environment variables
 load_dotenv()
@@ -9,9 +17,193 @@ load_dotenv()
 # OpenAI Configuration
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Messenger rejects text messages longer than this
+MESSENGER_MAX_LENGTH = 2000
+
+# Estimated token budget for the stored history sent with each request (system prompt excluded)
+HISTORY_TOKEN_BUDGET = int(os.getenv("OPENAI_HISTORY_TOKEN_BUDGET", "1500"))
+
+# Models by tier: simple messages ("thanks!", "what are your fees?") go to the fast
+# tier, longer or more involved ones to the premium tier
+MODEL_TIERS = {
+    "fast": {
+        "model": os.getenv("OPENAI_FAST_MODEL", "gpt-3.5-turbo"),
+        "max_tokens": int(os.getenv("OPENAI_FAST_MAX_TOKENS", "300")),
+        "temperature": 0.7
+    },
+    "premium": {
+        "model": os.getenv("OPENAI_PREMIUM_MODEL", "gpt-4"),
+        "max_tokens": int(os.getenv("OPENAI_PREMIUM_MAX_TOKENS", "1000")),
+        "temperature": 0.7
+    }
+}
+
+# Messages scoring at least this go to the premium tier (see OpenAIHelper.score_message)
+TIER_THRESHOLD = float(os.getenv("OPENAI_TIER_THRESHOLD", "1.0"))
+
+# Set OPENAI_MODEL_TIERING=false to send everything to the premium tier
+MODEL_TIERING = os.getenv("OPENAI_MODEL_TIERING", "true").lower() == "true"
+
+# Seconds allowed for answering one message; slower answers are abandoned for a fallback reply
+DEADLINE = float(os.getenv("OPENAI_DEADLINE", "20"))
+
+# Hedging: if a request is slower than this percentile of its tier's recent latency,
+# send a second one and use whichever answers first
+HEDGE_REQUESTS = os.getenv("OPENAI_HEDGE", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 20
+
+# Replies when OpenAI can't answer in time, offering the flow that fits the message first
+FALLBACK_QUICK_REPLIES = ["Find Home", "Get Help", "Save Money"]
+FALLBACK_TOPICS = [
+    ("Save Money", ["mortgage", "loan", "refinanc", "save", "saving", "cost", "insurance", "tax", "utilit", "bill"],
+     "Sorry, that's taking me longer than usual. Meanwhile, I can show you ways to save on your mortgage, utilities, insurance and taxes."),
+    ("Get Help", ["repair", "fix", "leak", "broken", "maintenance", "legal", "lawyer", "landlord", "lease", "evict"],
+     "Sorry, that's taking me longer than usual. Meanwhile, our team can help with repairs, legal questions and more."),
+    ("Find Home", ["home", "house", "apartment", "condo", "buy", "rent", "move", "moving", "listing", "bedroom"],
+     "Sorry, that's taking me longer than usual. Meanwhile, tell me what you're looking for and I'll start your home search.")
+]
+FALLBACK_TEXT = "Sorry, that's taking me longer than usual. Meanwhile, here's what I can help you with right away:"
+
+# Failures that get the fallback reply; any other error gets ERROR_TEXT
+TIMEOUT_ERRORS = (TimeoutError, openai.error.Timeout)
+ERROR_TEXT = "I'm sorry, but I encountered an error processing your request."
+
+# Real estate keywords; messages with them get Swift Showings context and count as more complex
+REAL_ESTATE_KEYWORDS = [
+    "home", "house", "property", "real estate", "realtor", "agent", 
+    "buy", "purchase", "rent", "apartment", "condo", "listing",
+    "mortgage", "loan", "closing", "offer", "bid", "price", "cost",
+    "fee", "bedroom", "bathroom", "square foot", "sqft", "neighborhood",
+    "location", "address", "tour", "showing", "open house", "sell"
+]
+
+def estimate_tokens(message):
+    """Roughly estimate the tokens a chat message uses (~4 characters per token)"""
+    return len(message["content"]) // 4 + 4
+
+def new_session_id():
+    """Generate a compact session ID: start time in hex plus random bits (e.g. "6712f0c4a93b7e21")"""
+    return f"{int(time.time()):x}{secrets.token_hex(4)}"
+
+class Conversation(list):
+    """
+    A user's message history, tagged with the ID of the session it belongs to
+
+    A new session (and ID) starts whenever the history is created, including
+    after the previous one expired or was evicted.
+    """
+    def __init__(self, messages=()):
+        super().__init__(messages)
+        self.session_id = new_session_id()
+
+# Platform tags the model may use to split its answer (see _process_response)
+PLATFORM_TAGS = ["#facebook", "#instagram", "#twitter", "#linkedin"]
+
+def streamable_length(text):
+    """
+    How much of a partly streamed answer can be sent before knowing how it is
+    tagged, as (tagged, length): everything before the first platform tag, less
+    a trailing "#..." that could still turn into one
+    """
+    lowered = text.lower()
+    found = [lowered.find(tag) for tag in PLATFORM_TAGS if tag in lowered]
+    if found:
+        return True, min(found)
+    start = lowered.rfind("#")
+    if start >= 0 and any(tag.startswith(lowered[start:]) for tag in PLATFORM_TAGS):
+        return False, start
+    return False, len(text)
+
+class StreamChunker:
+    """
+    Split streamed completion text into Messenger-sized chunks at paragraph or
+    sentence boundaries, so each chunk can be sent as soon as it is complete
+
+    The first chunk is cut early so the user sees something quickly; later
+    chunks are longer to avoid flooding the chat with short messages.
+    """
+    SENTENCE_ENDS = (". ", "! ", "? ", ".\n", "!\n", "?\n")
+
+    def __init__(self, first_length=80, min_length=600, max_length=MESSENGER_MAX_LENGTH):
+        self.first_length = first_length
+        self.min_length = min_length
+        self.max_length = max_length
+        self.sent_first = False
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add streamed text and return any chunks that are ready to send"""
+        self.buffer += text
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                return chunks
+            chunk, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:].lstrip()
+            if chunk:
+                chunks.append(chunk)
+                self.sent_first = True
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        chunks = []
+        while len(self.buffer) > self.max_length:
+            cut = self._find_cut()
+            chunks.append(self.buffer[:cut].strip())
+            self.buffer = self.buffer[cut:].lstrip()
+        if self.buffer.strip():
+            chunks.append(self.buffer.strip())
+        self.buffer = ""
+        return chunks
+
+    def _find_cut(self):
+        """Find where the next chunk ends, or None if it isn't complete yet"""
+        window = self.buffer[:self.max_length]
+        min_length = self.min_length if self.sent_first else self.first_length
+
+        # Prefer paragraph breaks, then sentence ends
+        paragraph = window.rfind("\n\n")
+        if paragraph >= min_length:
+            return paragraph + 2
+        sentence = max(window.rfind(end) for end in self.SENTENCE_ENDS)
+        if sentence + 1 >= min_length:
+            return sentence + 2
+
+        # Too long without a boundary: cut at the last space before the limit
+        if len(self.buffer) > self.max_length:
+            space = window.rfind(" ")
+            return space + 1 if space > 0 else self.max_length
+        return None
+
 class OpenAIHelper:
-    def __init__(self):
-        self.conversations = {}  # Store conversation history by user_id
+    def __init__(self, history_token_budget=HISTORY_TOKEN_BUDGET):
+        # Store conversation history by user_id, evicting idle and least recent users
+        self.conversations = BoundedStore(
+            max_entries=int(os.getenv("OPENAI_HISTORY_MAX_USERS", "5000")),
+            idle_ttl=float(os.getenv("OPENAI_HISTORY_IDLE_TTL", "86400"))
+        )
+        self.history_token_budget = history_token_budget
+        
+        # Chat completion settings by tier, and usage of each tier for /metrics
+        self.model_tiers = MODEL_TIERS
+        self.tier_threshold = TIER_THRESHOLD
+        self.model_tiering = MODEL_TIERING
+        self.tier_usage = {
+            tier: {
+                "requests": 0, "errors": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "latency": LatencyStats()
+            }
+            for tier in self.model_tiers
+        }
+        self._usage_lock = threading.Lock()
+        
+        # Time budget per message, and the threads running hedged requests (started on first use)
+        self.deadline = DEADLINE
+        self.hedge_requests = HEDGE_REQUESTS
+        self.hedge_percentile = HEDGE_PERCENTILE
+        self._hedge_pool = None
+        self._hedge_pool_lock = threading.Lock()
         
         # Define the system message with Swift Showings context
         self.system_message = """You are a helpful assistant for Swift Showings, a real estate service that connects home buyers directly with sellers to save on agent fees. 
@@ -29,14 +221,29 @@ Be friendly, professional, and helpful at all times.
 
 If you need to include different content for social media platforms, use hashtags like #facebook or #instagram followed by platform-specific content.
 """
+        
+        # Answers to repeated first messages ("what are your fees?"), reused while
+        # the system prompt and model settings stay the same
+        self.response_cache = create_response_cache()
+        self.cache_fingerprint = settings_fingerprint(
+            self.system_message,
+            {"tiers": self.model_tiers, "threshold": self.tier_threshold, "tiering": self.model_tiering}
+        )
+        
+        # Answers to reworded versions of earlier first messages (in memory, so
+        # entries never outlive the prompt and settings they were made with)
+        self.similar_cache = create_similarity_cache()
     
     def get_or_create_conversation(self, user_id):
         """Get existing conversation for user or create a new one"""
-        if user_id not in self.conversations:
-            self.conversations[user_id] = [
-                {"role": "system", "content": self.system_message}
-            ]
-        return self.conversations[user_id]
+        return self.conversations.get_or_create(
+            user_id,
+            lambda: Conversation([{"role": "system", "content": self.system_message}])
+        )
+    
+    def get_session_id(self, user_id):
+        """Get the ID of the user's current conversation session, for logging"""
+        return self.get_or_create_conversation(user_id).session_id
     
     def add_message_to_conversation(self, user_id, message_content):
         """Add a new user message to the conversation"""
@@ -44,41 +251,328 @@ If you need to include different content for social media platforms, use hashtag
         conversation.append({"role": "user", "content": message_content})
         return conversation
     
-    def process_message(self, user_id, message_content):
-        """Process a message using the OpenAI Chat Completion API"""
+    def _add_assistant_message(self, user_id, message_content):
+        """Add the assistant's reply to the stored conversation"""
+        conversation = self.get_or_create_conversation(user_id)
+        conversation.append({"role": "assistant", "content": message_content})
+        self._trim_conversation(conversation)
+        return conversation
+    
+    def _trim_conversation(self, conversation):
+        """
+        Drop the oldest turns (in place) until the history fits the token budget
+        The system message and the newest message are always kept
+        """
+        total = sum(estimate_tokens(message) for message in conversation[1:])
+        drop = 0
+        while total > self.history_token_budget and len(conversation) - drop > 2:
+            total -= estimate_tokens(conversation[1 + drop])
+            drop += 1
+        if drop:
+            del conversation[1:1 + drop]
+        return conversation
+    
+    def _prepare_conversation(self, user_id, message_content):
+        """Add the user's message to their history and return the messages to send"""
+        # Store the message as typed and keep the stored history within budget
+        conversation = self.add_message_to_conversation(user_id, message_content)
+        self._trim_conversation(conversation)
+        
         # Add Swift Showings context to the message if it appears to be a real estate query
+        # (only in the rendered prompt, never in the stored history)
         enhanced_message = self._enhance_message_with_context(message_content)
+        return conversation[:-1] + [{"role": "user", "content": enhanced_message}]
+    
+    def _caches(self):
+        return [cache for cache in (self.response_cache, self.similar_cache) if cache]
+    
+    def _cacheable(self, user_id):
+        """
+        Check whether the answer to the user's next message can come from (and go into) the caches
+        Only a session's first message is cached, since later answers depend on the history
+        """
+        caches = self._caches()
+        if not caches:
+            return False
+        if len(self.get_or_create_conversation(user_id)) > 1:
+            for cache in caches:
+                cache.bypass()
+            return False
+        return True
+    
+    def _reply_from_cache(self, user_id, message_content):
+        """
+        Get a cached answer to the same message, or else to a near-identical one,
+        adding the turn to the user's history as if it came from the API
+        """
+        assistant_message = None
+        if self.response_cache:
+            assistant_message = self.response_cache.get(cache_key(message_content, self.cache_fingerprint))
+        if assistant_message is None and self.similar_cache:
+            assistant_message = self.similar_cache.get(message_content)
+        if assistant_message is None:
+            return None
+        self.add_message_to_conversation(user_id, message_content)
+        self._add_assistant_message(user_id, assistant_message)
+        return assistant_message
+    
+    def _cache_answer(self, message_content, assistant_message, latency):
+        """Cache the API's answer to a first message"""
+        if self.response_cache:
+            self.response_cache.put(cache_key(message_content, self.cache_fingerprint), assistant_message, latency)
+        if self.similar_cache:
+            self.similar_cache.put(message_content, assistant_message, latency)
+    
+    def process_message(self, user_id, message_content):
+        """Process a message using the OpenAI Chat Completion API"""
+        cacheable = self._cacheable(user_id)
+        cached = self._reply_from_cache(user_id, message_content) if cacheable else None
+        if cached is not None:
+            return self._process_response(cached)
         
-        # Get the conversation history and add the new message
-        conversation = self.add_message_to_conversation(user_id, enhanced_message)
-        
-        # Keep conversation size manageable (limit to last 10 messages)
-        if len(conversation) > 11:  # system message + 10 exchange messages
-            # Always keep the system message at position 0
-            system_message = conversation[0]
-            conversation = [system_message] + conversation[-10:]
+        start = time.time()
+        conversation = self._prepare_conversation(user_id, message_content)
+        tier = self.choose_tier(conversation, message_content)
         
         try:
-            # Call the OpenAI Chat Completion API
-            response = openai.ChatCompletion.create(
-                model="gpt-4",  
-                messages=conversation,
-                max_tokens=1000,
-                temperature=0.7
-            )
+            # Call the OpenAI Chat Completion API within the time budget
+            response = self._complete(tier, conversation, start + self.deadline)
+            latency = time.time() - start
             
             # Extract the assistant's response
             assistant_message = response.choices[0].message['content']
+            self._record_usage(tier, latency, conversation, assistant_message, getattr(response, "usage", None))
+            if cacheable:
+                self._cache_answer(message_content, assistant_message, latency)
             
             # Add the assistant's response to the conversation history
-            conversation.append({"role": "assistant", "content": assistant_message})
+            self._add_assistant_message(user_id, assistant_message)
             
             # Process the response for platform-specific content
             return self._process_response(assistant_message)
             
         except Exception as e:
             print(f"Error calling OpenAI API: {e}")
-            return {"text": "I'm sorry, but I encountered an error processing your request."}
+            self._record_error(tier, e)
+            return self._failure_response(tier, e, message_content)
+    
+    def stream_message(self, user_id, message_content, on_chunk):
+        """
+        Process a message with a streamed completion
+        
+        on_chunk(text) is called for each paragraph/sentence-bounded chunk as soon
+        as it is ready. Returns the same dict as process_message, with "streamed"
+        set when at least one chunk was delivered. A cached answer is returned
+        whole, without calling on_chunk. If the stream fails or the deadline
+        passes mid-stream, the part received so far is sent and kept as the answer.
+        
+        Text is only streamed while the answer has no platform tag; once one
+        shows up the rest is held back and the Facebook part is sent at the end,
+        as process_message would (text before the tag may already have gone out).
+        """
+        cacheable = self._cacheable(user_id)
+        cached = self._reply_from_cache(user_id, message_content) if cacheable else None
+        if cached is not None:
+            return self._process_response(cached)
+        
+        start = time.time()
+        deadline = start + self.deadline
+        conversation = self._prepare_conversation(user_id, message_content)
+        tier = self.choose_tier(conversation, message_content)
+        chunker = StreamChunker()
+        assistant_message = ""
+        tagged = False
+        fed = 0  # characters of the answer handed to the chunker
+        streamed = False
+        
+        try:
+            response = openai.ChatCompletion.create(
+                messages=conversation, stream=True, request_timeout=self._remaining(deadline), **self.model_tiers[tier]
+            )
+            
+            for event in response:
+                if time.time() > deadline:
+                    raise TimeoutError(f"No complete answer within {self.deadline}s")
+                text = event.choices[0].delta.get("content")
+                if not text:
+                    continue
+                assistant_message += text
+                if tagged:
+                    continue
+                tagged, length = streamable_length(assistant_message)
+                for chunk in chunker.feed(assistant_message[fed:length]):
+                    on_chunk(chunk)
+                    streamed = True
+                fed = length
+            
+            # Streams don't report usage, so tokens are estimated
+            latency = time.time() - start
+            self._record_usage(tier, latency, conversation, assistant_message)
+            if cacheable:
+                self._cache_answer(message_content, assistant_message, latency)
+        except Exception as e:
+            print(f"Error streaming from OpenAI API: {e}")
+            self._record_error(tier, e)
+            if not assistant_message:
+                return self._failure_response(tier, e, message_content)
+        
+        self._add_assistant_message(user_id, assistant_message)
+        result = self._process_response(assistant_message)
+        facebook_content = result["facebook_content"]
+        
+        if tagged:
+            # The tag decides what Facebook gets; text held in the chunker is dropped
+            tail = StreamChunker()
+            remaining = tail.feed(facebook_content) + tail.flush()
+        else:
+            remaining = chunker.feed(assistant_message[fed:]) + chunker.flush()
+            # Also deliver anything formatting added after the streamed text (e.g. the branding line)
+            if facebook_content.startswith(assistant_message.strip()):
+                extra = facebook_content[len(assistant_message.strip()):].strip()
+                if extra:
+                    remaining.append(extra)
+        for chunk in remaining:
+            on_chunk(chunk)
+            streamed = True
+        
+        result["streamed"] = streamed
+        return result
+    
+    def score_message(self, conversation, message_content):
+        """
+        Score how involved a message is from its length, real estate keywords and
+        how deep into the conversation it comes
+        e.g. "thanks!" scores 0.07 and "What are your fees?" 0.77 on a first turn
+        """
+        message_lower = message_content.lower()
+        words = len(message_content.split())
+        keywords = sum(1 for keyword in REAL_ESTATE_KEYWORDS if keyword in message_lower)
+        depth = sum(1 for message in conversation if message["role"] == "user") - 1
+        return words / 15 + keywords * 0.5 + min(depth, 10) * 0.1
+    
+    def choose_tier(self, conversation, message_content):
+        """Pick the model tier for a message: premium at or above the threshold, otherwise fast"""
+        if not self.model_tiering:
+            return "premium"
+        if self.score_message(conversation, message_content) >= self.tier_threshold:
+            return "premium"
+        return "fast"
+    
+    def _record_usage(self, tier, latency, conversation, assistant_message, usage=None):
+        """Record a tier's request latency and tokens (estimated if the API didn't report usage)"""
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens") or sum(estimate_tokens(message) for message in conversation)
+        completion_tokens = usage.get("completion_tokens") or estimate_tokens({"content": assistant_message})
+        self.tier_usage[tier]["latency"].record(latency)
+        with self._usage_lock:
+            self.tier_usage[tier]["requests"] += 1
+            self.tier_usage[tier]["prompt_tokens"] += prompt_tokens
+            self.tier_usage[tier]["completion_tokens"] += completion_tokens
+    
+    def _record_error(self, tier, error):
+        """Count a failed request as a timeout or, for anything else, an error"""
+        self._count(tier, "timeouts" if isinstance(error, TIMEOUT_ERRORS) else "errors")
+    
+    def _failure_response(self, tier, error, message_content):
+        """Reply for a failed request: the fallback if it timed out, otherwise an apology"""
+        if isinstance(error, TIMEOUT_ERRORS):
+            return self.fallback_response(tier, message_content)
+        return {"text": ERROR_TEXT, "instagram_content": ERROR_TEXT, "facebook_content": ERROR_TEXT}
+    
+    def _count(self, tier, name):
+        with self._usage_lock:
+            self.tier_usage[tier][name] += 1
+    
+    def _remaining(self, deadline):
+        """Seconds left before the deadline, used as the request's hard timeout"""
+        return max(0.1, deadline - time.time())
+    
+    def _hedge_delay(self, tier):
+        """Seconds to wait before hedging a request, or None if it shouldn't be hedged"""
+        if not self.hedge_requests:
+            return None
+        latency = self.tier_usage[tier]["latency"]
+        if latency.count < HEDGE_MIN_SAMPLES:
+            # Not enough history to know what "slow" is yet
+            return None
+        return latency.percentile(self.hedge_percentile)
+    
+    def _get_hedge_pool(self):
+        """Threads for hedged requests, created on first use (after gunicorn forks)"""
+        with self._hedge_pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("OPENAI_HEDGE_WORKERS", "8")),
+                    thread_name_prefix="openai-hedge"
+                )
+            return self._hedge_pool
+    
+    def _complete(self, tier, conversation, deadline):
+        """
+        Get a chat completion before the deadline (a time.time() value)
+        
+        Each request's hard timeout is the time left. With hedging on, a request
+        slower than the tier's usual latency gets a twin, and the first answer wins.
+        Raises TimeoutError if no answer arrives in time.
+        """
+        def request():
+            return openai.ChatCompletion.create(
+                messages=conversation, request_timeout=self._remaining(deadline), **self.model_tiers[tier]
+            )
+        
+        hedge_delay = self._hedge_delay(tier)
+        if hedge_delay is None:
+            return request()
+        
+        pool = self._get_hedge_pool()
+        first = pool.submit(request)
+        pending = {first}
+        done, _ = wait(pending, timeout=min(hedge_delay, deadline - time.time()))
+        if not done and time.time() < deadline:
+            self._count(tier, "hedged")
+            pending.add(pool.submit(request))
+        
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.time()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"No answer within {self.deadline}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        self._count(tier, "hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def fallback_response(self, tier, message_content):
+        """
+        Reply for when OpenAI can't answer in time: offer the flows, starting
+        with the one that fits the message
+        """
+        self._count(tier, "fallbacks")
+        message_lower = message_content.lower()
+        text = FALLBACK_TEXT
+        quick_replies = list(FALLBACK_QUICK_REPLIES)
+        for topic, keywords, topic_text in FALLBACK_TOPICS:
+            if any(keyword in message_lower for keyword in keywords):
+                text = topic_text
+                quick_replies.remove(topic)
+                quick_replies.insert(0, topic)
+                break
+        return {"text": text, "instagram_content": text, "facebook_content": text, "quick_replies": quick_replies}
+    
+    def tier_stats(self):
+        """Get requests, tokens and latency for each model tier"""
+        with self._usage_lock:
+            stats = {
+                tier: {key: value for key, value in usage.items() if key != "latency"}
+                for tier, usage in self.tier_usage.items()
+            }
+        for tier, usage in self.tier_usage.items():
+            stats[tier]["model"] = self.model_tiers[tier]["model"]
+            stats[tier]["latency"] = usage["latency"].snapshot()
+        return stats
     
     def _process_response(self, response_text):
         """Process the response to extract platform-specific content"""
@@ -121,11 +615,8 @@ If you need to include different content for social media platforms, use hashtag
         if not content:
             return content
             
-        # List of tags to clean
-        tags = ["#facebook", "#instagram", "#twitter", "#linkedin"]
-        
         # Remove each tag
-        for tag in tags:
+        for tag in PLATFORM_TAGS:
             if tag in content.lower():
                 # Split on the tag and take everything after it
                 parts = content.lower().split(tag)
@@ -153,18 +644,9 @@ If you need to include different content for social media platforms, use hashtag
     
     def _enhance_message_with_context(self, message):
         """Add Swift Showings context to the message if appropriate"""
-        # List of real estate related keywords
-        real_estate_keywords = [
-            "home", "house", "property", "real estate", "realtor", "agent", 
-            "buy", "purchase", "rent", "apartment", "condo", "listing",
-            "mortgage", "loan", "closing", "offer", "bid", "price", "cost",
-            "fee", "bedroom", "bathroom", "square foot", "sqft", "neighborhood",
-            "location", "address", "tour", "showing", "open house", "sell"
-        ]
-        
         # Check if message contains real estate keywords
         message_lower = message.lower()
-        contains_real_estate_term = any(keyword in message_lower for keyword in real_estate_keywords)
+        contains_real_estate_term = any(keyword in message_lower for keyword in REAL_ESTATE_KEYWORDS)
         
         # If it contains real estate keywords, add context
         if contains_real_estate_term and len(message) > 10:
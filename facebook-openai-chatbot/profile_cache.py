@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import LatencyStats
+
+class ProfileCache:
+    """
+    Cache of Graph API user profiles in front of FacebookHandler.get_user_profile
+
+    - TTL + LRU eviction in memory
+    - Failed lookups are cached for a shorter negative TTL
+    - Concurrent misses for the same user share a single Graph API call
+    - Optional SQLite tier so a restarted worker keeps its profiles
+    """
+    def __init__(self, fetch, ttl=86400, negative_ttl=300, max_entries=5000, disk_path=None):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # user_id -> (profile, expires_at)
+        self.inflight = {}  # user_id -> threading.Event for the running fetch
+        self.counters = {"hits": 0, "disk_hits": 0, "negative_hits": 0, "misses": 0, "errors": 0}
+        self.fetch_latency = LatencyStats()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.disk_path = disk_path
+
+        if disk_path:
+            conn = self._connect()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    user_id TEXT PRIMARY KEY,
+                    profile TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def get(self, user_id):
+        """Get a user's profile, fetching it from the Graph API on a miss"""
+        while True:
+            with self._lock:
+                profile = self._get_cached(user_id)
+                if profile is not None:
+                    return profile
+
+                waiter = self.inflight.get(user_id)
+                if waiter is None:
+                    # This thread becomes the one fetching the profile
+                    self.inflight[user_id] = threading.Event()
+                    self.counters["misses"] += 1
+                    break
+
+            # Another thread is already fetching this profile
+            waiter.wait(10)
+
+        try:
+            profile = self._load_from_disk(user_id)
+            if profile is not None:
+                with self._lock:
+                    self.counters["disk_hits"] += 1
+                    self._store(user_id, profile, self.ttl)
+                return profile
+
+            profile, ttl = self._fetch(user_id)
+            with self._lock:
+                self._store(user_id, profile, ttl)
+            if ttl == self.ttl:
+                self._save_to_disk(user_id, profile)
+            return profile
+        finally:
+            with self._lock:
+                self.inflight.pop(user_id).set()
+
+    def stats(self):
+        """Get hit/miss counters and fetch latency"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+        stats["fetch_latency"] = self.fetch_latency.snapshot()
+        return stats
+
+    def _get_cached(self, user_id):
+        """Look up a live in-memory entry (caller holds the lock)"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+
+        profile, expires_at = entry
+        if expires_at <= time.time():
+            del self.entries[user_id]
+            return None
+
+        self.entries.move_to_end(user_id)
+        if profile:
+            self.counters["hits"] += 1
+        else:
+            self.counters["negative_hits"] += 1
+        return profile
+
+    def _store(self, user_id, profile, ttl):
+        """Add an entry and evict the least recently used (caller holds the lock)"""
+        self.entries[user_id] = (profile, time.time() + ttl)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _fetch(self, user_id):
+        """Fetch a profile from the Graph API, returning (profile, ttl)"""
+        start = time.time()
+        try:
+            profile = self.fetch(user_id)
+        except Exception as e:
+            print(f"Error fetching user profile: {e}")
+            profile = None
+        finally:
+            self.fetch_latency.record(time.time() - start)
+
+        if not isinstance(profile, dict) or "error" in profile:
+            # Negative cache: an empty profile means "unknown user name"
+            with self._lock:
+                self.counters["errors"] += 1
+            return {}, self.negative_ttl
+        return profile, self.ttl
+
+    def _connect(self):
+        """Get this thread's connection to the disk tier"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _load_from_disk(self, user_id):
+        if not self.disk_path:
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT profile FROM profiles WHERE user_id = ? AND expires_at > ?",
+                (user_id, time.time())
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            print(f"Error reading profile cache: {e}")
+            return None
+
+    def _save_to_disk(self, user_id, profile):
+        if not self.disk_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO profiles (user_id, profile, expires_at) VALUES (?, ?, ?)",
+                    (user_id, json.dumps(profile), time.time() + self.ttl)
+                )
+        except Exception as e:
+            print(f"Error writing profile cache: {e}")
+
+def create_profile_cache(fetch):
+    """Create a profile cache configured by the PROFILE_CACHE_* environment variables"""
+    return ProfileCache(
+        fetch,
+        ttl=float(os.getenv("PROFILE_CACHE_TTL", "86400")),
+        negative_ttl=float(os.getenv("PROFILE_CACHE_NEGATIVE_TTL", "300")),
+        max_entries=int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "5000")),
+        disk_path=os.getenv("PROFILE_CACHE_DB_PATH") or None
+    )
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_message(text):
+    """Normalize a message for exact matching: lowercase, no punctuation, single spaces"""
+    return " ".join(re.sub(r"[^\w$%\s]", " ", (text or "").lower()).split())
+
+def settings_fingerprint(system_message, settings):
+    """Hash the system prompt and model settings, so changing either starts a fresh cache"""
+    payload = json.dumps({"system": system_message, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def cache_key(message, fingerprint):
+    """Key for a message answered under the given settings"""
+    return hashlib.sha256(f"{fingerprint}:{normalize_message(message)}".encode()).hexdigest()
+
+class ResponseCache:
+    """
+    Cache of OpenAI answers to first messages, keyed on the normalized text
+
+    - TTL + LRU eviction in memory
+    - Optional SQLite tier shared by every worker on the host
+    - Each entry remembers how long the API call took, so hits report the
+      latency they saved
+
+    Only answers that don't depend on earlier turns may be cached; the caller
+    decides that and counts skipped lookups with bypass().
+    """
+    def __init__(self, ttl=86400, max_entries=1000, disk_path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (response, latency, expires_at)
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+        self.saved_seconds = 0.0
+        self.last_prune = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.disk_path = disk_path
+
+        if disk_path:
+            conn = self._connect()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def get(self, key):
+        """Get a cached response, or None"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] <= time.time():
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                self.saved_seconds += entry[1]
+                return entry[0]
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            response, latency, expires_at = entry
+            self.counters["disk_hits"] += 1
+            self.saved_seconds += latency
+            self._store(key, response, latency, expires_at)
+        return response
+
+    def put(self, key, response, latency):
+        """Cache a response that took `latency` seconds to generate"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self.counters["stores"] += 1
+            self._store(key, response, latency, expires_at)
+        self._save_to_disk(key, response, latency, expires_at)
+
+    def bypass(self):
+        """Count a message that skipped the cache"""
+        with self._lock:
+            self.counters["bypassed"] += 1
+
+    def stats(self):
+        """Get hit/miss counters and the API time saved by hits"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+            saved_seconds = self.saved_seconds
+        stats["saved_seconds"] = round(saved_seconds, 1)
+        hits = stats["hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0
+        stats["avg_saved_ms"] = round(saved_seconds / hits * 1000, 1) if hits else 0
+        return stats
+
+    def _store(self, key, response, latency, expires_at):
+        """Add an entry and evict the least recently used (caller holds the lock)"""
+        self.entries[key] = (response, latency, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _connect(self):
+        """Get this thread's connection to the disk tier"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _load_from_disk(self, key):
+        if not self.disk_path:
+            return None
+        try:
+            return self._connect().execute(
+                "SELECT response, latency, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            return None
+
+    def _save_to_disk(self, key, response, latency, expires_at):
+        if not self.disk_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, latency, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, response, latency, expires_at)
+                )
+                now = time.time()
+                if now - self.last_prune > 3600:
+                    self.last_prune = now
+                    conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+
+def create_response_cache():
+    """
+    Create the OpenAI response cache configured by the OPENAI_CACHE_* environment
+    variables, or None if OPENAI_CACHE is turned off
+    """
+    if os.getenv("OPENAI_CACHE", "true").lower() != "true":
+        return None
+    return ResponseCache(
+        ttl=float(os.getenv("OPENAI_CACHE_TTL", "86400")),
+        max_entries=int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", "1000")),
+        disk_path=os.getenv("OPENAI_CACHE_DB_PATH") or None
+    )
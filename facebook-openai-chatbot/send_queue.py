@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from collections import deque
+from metrics import LatencyStats
+
+# Graph API error codes that mean the page is being rate limited
+THROTTLING_ERROR_CODES = {4, 17, 32, 613, 80006}
+
+class TokenBucket:
+    """
+    Token bucket with AIMD rate adaptation
+
+    Throttling responses halve the refill rate and pause the bucket with an
+    exponentially growing backoff; successful sends recover the rate slowly.
+    """
+    def __init__(self, rate, burst, min_backoff=1, max_backoff=60):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.paused_until = 0
+        self.updated = time.time()
+
+    def take(self, now):
+        """
+        Take a token if one is available
+        Returns 0 on success, otherwise the seconds to wait before trying again
+        """
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def throttled(self, now):
+        """Back off after a throttling response"""
+        self.rate = max(self.max_rate / 32, self.rate / 2)
+        self.tokens = 0
+        self.paused_until = now + self.backoff
+        self.backoff = min(self.max_backoff, self.backoff * 2)
+
+    def succeeded(self):
+        """Recover after a successful send"""
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+        self.backoff = max(self.min_backoff, self.backoff / 2)
+
+class SendQueue:
+    """
+    Outbound Send API queue with a token bucket per page access token
+
+    Messages for one recipient are sent strictly in order (at most one in
+    flight per recipient); different recipients are sent in parallel by a
+    small pool of worker threads.
+    """
+    def __init__(self, rate=20, burst=40, max_pending=5000, num_workers=4, max_attempts=5):
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+
+        self.buckets = {}  # page access token -> TokenBucket
+        self.recipients = {}  # recipient_id -> deque of pending sends
+        self.ready = deque()  # recipients with pending sends and nothing in flight
+        self.in_flight = set()
+        self.pending = 0
+        self.workers = []
+        self._cond = threading.Condition()
+
+        self.counters = {"sent": 0, "errors": 0, "dropped": 0, "throttled": 0}
+        self.wait_time = LatencyStats()
+
+    def enqueue(self, page_token, recipient_id, send):
+        """
+        Queue a send; `send` is called with no arguments and returns the Graph response dict
+        Returns False if the queue is full and the send was dropped
+        """
+        with self._cond:
+            if not self.workers:
+                self._start()
+
+            if self.pending >= self.max_pending:
+                self.counters["dropped"] += 1
+                print(f"Send queue is full, dropping message to {recipient_id}")
+                return False
+
+            item = {"token": page_token, "send": send, "queued_at": time.time(), "attempts": 0}
+            sends = self.recipients.get(recipient_id)
+            if sends is None:
+                sends = self.recipients[recipient_id] = deque()
+            sends.append(item)
+            self.pending += 1
+
+            if recipient_id not in self.in_flight and len(sends) == 1:
+                self.ready.append(recipient_id)
+                self._cond.notify()
+        return True
+
+    def stats(self):
+        """Get send counters, queue depth and queue wait time"""
+        with self._cond:
+            stats = dict(self.counters)
+            stats["pending"] = self.pending
+            stats["rates"] = [round(bucket.rate, 2) for bucket in self.buckets.values()]
+        stats["queue_wait"] = self.wait_time.snapshot()
+        return stats
+
+    def stop(self, timeout=10):
+        """Wait for pending sends to drain, then stop the workers"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self.pending and time.time() < deadline:
+                self._cond.wait(0.1)
+            workers, self.workers = self.workers, []
+            self._cond.notify_all()
+        for worker in workers:
+            worker.join(max(0, deadline - time.time()))
+
+    def _start(self):
+        """Start the worker threads (caller holds the lock)"""
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._run_worker, name=f"send-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _run_worker(self):
+        while True:
+            with self._cond:
+                while not self.ready:
+                    if not self.workers:
+                        return
+                    self._cond.wait()
+                recipient_id = self.ready.popleft()
+                self.in_flight.add(recipient_id)
+                item = self.recipients[recipient_id][0]
+                bucket = self.buckets.get(item["token"])
+                if bucket is None:
+                    bucket = self.buckets[item["token"]] = TokenBucket(self.rate, self.burst)
+
+            self._wait_for_token(bucket)
+            self.wait_time.record(time.time() - item["queued_at"])
+            item["attempts"] += 1
+
+            try:
+                result = item["send"]()
+            except Exception as e:
+                result = {"error": {"message": str(e)}}
+
+            error = result.get("error") if isinstance(result, dict) else None
+            throttled = bool(error) and error.get("code") in THROTTLING_ERROR_CODES
+
+            with self._cond:
+                sends = self.recipients[recipient_id]
+                if throttled:
+                    self.counters["throttled"] += 1
+                    bucket.throttled(time.time())
+                # A throttled send stays at the head of the recipient's queue to be retried
+                if not throttled or item["attempts"] >= self.max_attempts:
+                    sends.popleft()
+                    self.pending -= 1
+                    if throttled:
+                        self.counters["dropped"] += 1
+                        print(f"Dropping message to {recipient_id} after {item['attempts']} throttled attempts")
+                    elif error:
+                        self.counters["errors"] += 1
+                    else:
+                        self.counters["sent"] += 1
+                        bucket.succeeded()
+
+                self.in_flight.discard(recipient_id)
+                if sends:
+                    self.ready.append(recipient_id)
+                else:
+                    del self.recipients[recipient_id]
+                self._cond.notify_all()
+
+    def _wait_for_token(self, bucket):
+        while True:
+            with self._cond:
+                delay = bucket.take(time.time())
+            if not delay:
+                return
+            time.sleep(min(delay, 1))
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+def get_default_send_queue():
+    """
+    Get the process-wide send queue configured by the SEND_* environment variables
+    Returns None unless SEND_QUEUE=true
+    """
+    global _default_queue
+    if os.getenv("SEND_QUEUE", "false").lower() != "true":
+        return None
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = SendQueue(
+                rate=float(os.getenv("SEND_RATE_PER_SECOND", "20")),
+                burst=float(os.getenv("SEND_BURST", "40")),
+                max_pending=int(os.getenv("SEND_QUEUE_SIZE", "5000")),
+                num_workers=int(os.getenv("SEND_WORKERS", "4"))
+            )
+        return _default_queue
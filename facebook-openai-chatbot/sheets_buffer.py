@@ -0,0 +1,182 @@
+import threading
+import time
+from metrics import LatencyStats
+
+class SheetsWriteBuffer:
+    """
+    Buffered Google Sheets writer
+
+    Rows are collected per worksheet and written with a single append_rows call
+    by a background thread once a worksheet has batch_size rows waiting or
+    flush_interval seconds have passed. Failed batches are put back and retried
+    on the next flush.
+
+    With a SheetsQuotaScheduler, lead worksheets are written first, each
+    batch waits for room under the write quota, and batches grow as the
+    quota fills.
+    """
+    def __init__(self, resolve_worksheet, batch_size=50, flush_interval=5, max_pending=10000, on_error=None, scheduler=None):
+        self.resolve_worksheet = resolve_worksheet  # title -> gspread worksheet
+        self.on_error = on_error  # called with (title, exception) when a write fails
+        self.scheduler = scheduler  # optional SheetsQuotaScheduler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.buffers = {}  # worksheet title -> list of rows
+        self.stats_by_sheet = {}  # worksheet title -> counters
+        self._flusher = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+    def add(self, title, row):
+        """Queue a row for the given worksheet"""
+        with self._cond:
+            rows = self.buffers.setdefault(title, [])
+            rows.append(row)
+            if len(rows) > self.max_pending:
+                # Sheets has been failing for a while; drop the oldest rows
+                del rows[0]
+                self._sheet_stats(title)["dropped"] += 1
+            if len(rows) >= self._batch_size():
+                self._cond.notify()
+        self._start_flusher()
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Write every buffered row now
+        Returns False if any worksheet failed to write or the timeout (seconds)
+        ran out first; unwritten rows stay buffered
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        if not self._flush_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        try:
+            with self._cond:
+                batches, self.buffers = self.buffers, {}
+
+            ok = True
+            titles = list(batches)
+            if self.scheduler:
+                titles.sort(key=self.scheduler.priority)
+            for title in titles:
+                if not batches[title]:
+                    continue
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    with self._cond:
+                        self.buffers[title] = batches[title] + self.buffers.get(title, [])
+                    ok = False
+                elif not self._write_batch(title, batches[title], remaining):
+                    ok = False
+            return ok
+        finally:
+            self._flush_lock.release()
+
+    def stop(self, timeout=10):
+        """
+        Flush what's left and stop the background thread (used at shutdown)
+        Flushing stops after `timeout` seconds; the rest is lost with the process
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.flush(timeout)
+
+    def pending(self):
+        with self._cond:
+            return sum(len(rows) for rows in self.buffers.values())
+
+    def stats(self):
+        """Get per-worksheet batch size and flush latency metrics"""
+        with self._cond:
+            stats = {}
+            for title, sheet_stats in self.stats_by_sheet.items():
+                stats[title] = {
+                    "pending": len(self.buffers.get(title, [])),
+                    "flushes": sheet_stats["flushes"],
+                    "rows": sheet_stats["rows"],
+                    "errors": sheet_stats["errors"],
+                    "dropped": sheet_stats["dropped"],
+                    "deferred": sheet_stats["deferred"],
+                    "last_batch_size": sheet_stats["last_batch_size"],
+                    "avg_batch_size": round(sheet_stats["rows"] / sheet_stats["flushes"], 1) if sheet_stats["flushes"] else 0,
+                    "flush_latency": sheet_stats["latency"].snapshot()
+                }
+            return stats
+
+    def _write_batch(self, title, rows, timeout=None):
+        if self.scheduler and not self.scheduler.acquire("write", self.scheduler.priority(title), timeout):
+            with self._cond:
+                self._sheet_stats(title)["deferred"] += 1
+                self.buffers[title] = rows + self.buffers.get(title, [])
+            return False
+
+        start = time.time()
+        try:
+            self.resolve_worksheet(title).append_rows(rows)
+        except Exception as e:
+            print(f"Error writing {len(rows)} rows to {title}: {e}")
+            if self.scheduler:
+                self.scheduler.failed(e)
+            if self.on_error:
+                self.on_error(title, e)
+            with self._cond:
+                self._sheet_stats(title)["errors"] += 1
+                # Put the rows back in front of anything queued since
+                self.buffers[title] = rows + self.buffers.get(title, [])
+            return False
+
+        if self.scheduler:
+            self.scheduler.succeeded()
+
+        with self._cond:
+            sheet_stats = self._sheet_stats(title)
+            sheet_stats["flushes"] += 1
+            sheet_stats["rows"] += len(rows)
+            sheet_stats["last_batch_size"] = len(rows)
+        sheet_stats["latency"].record(time.time() - start)
+        return True
+
+    def _batch_size(self):
+        """Rows that trigger a write, larger when the write quota is under pressure"""
+        if self.scheduler:
+            return self.scheduler.batch_size()
+        return self.batch_size
+
+    def _sheet_stats(self, title):
+        """Get the counters for a worksheet (caller holds the lock)"""
+        if title not in self.stats_by_sheet:
+            self.stats_by_sheet[title] = {
+                "flushes": 0, "rows": 0, "errors": 0, "dropped": 0, "deferred": 0,
+                "last_batch_size": 0, "latency": LatencyStats()
+            }
+        return self.stats_by_sheet[title]
+
+    def _start_flusher(self):
+        # Started lazily so the thread is created after gunicorn forks
+        if self._flusher is not None:
+            return
+        with self._cond:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="sheets-flusher", daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        healthy = True
+        while True:
+            with self._cond:
+                deadline = time.time() + self.flush_interval
+                while not self._stopped and time.time() < deadline:
+                    # After a failed flush, wait the full interval before retrying
+                    if healthy and any(len(rows) >= self._batch_size() for rows in self.buffers.values()):
+                        break
+                    self._cond.wait(deadline - time.time())
+                if self._stopped:
+                    return
+            try:
+                healthy = self.flush()
+            except Exception as e:
+                print(f"Error flushing Google Sheets buffer: {e}")
+                healthy = False
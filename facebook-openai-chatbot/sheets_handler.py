@@ -1,83 +1,271 @@
 import os
+import json
 import time
-from datetime import datetime
+import atexit
+import threading
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from dotenv import load_dotenv
+from sheets_buffer import SheetsWriteBuffer
+from sheets_spool import SheetsSpool
+from conversation_index import ConversationIndex
+from conversation_shards import ShardCatalog, monthly_shard, shard_range, is_shard_of
+from sheets_quota import SheetsQuotaScheduler
 
 # Load environment variables
 load_dotenv()
 
+# Google Sheets rejects cells longer than this
+MAX_CELL_LENGTH = 50000
+
+# Headers for every worksheet the bot writes to, used when a worksheet is created
+WORKSHEET_HEADERS = {
+    "Conversations": [
+        "Timestamp", "User ID", "User Name", "Message",
+        "Response", "Platform", "Thread ID"
+    ],
+    "Home Preferences": [
+        "Timestamp", "User ID", "User Name", "Type",
+        "Property Type", "Budget", "Location",
+        "Financing/Roommate", "Notes"
+    ],
+    "Help Requests": [
+        "Timestamp", "User ID", "User Name", "Type",
+        "Help Category", "Details", "Status", "Follow-up", "Notes"
+    ],
+    "Money Requests": [
+        "Timestamp", "User ID", "User Name", "Type",
+        "Savings Category", "Details", "Status", "Follow-up", "Notes"
+    ]
+}
+
+# Catalog of the monthly Conversations worksheets and the time range each covers
+SHARD_CATALOG_TITLE = "Conversation Shards"
+SHARD_CATALOG_HEADERS = ["Worksheet", "Start", "End"]
+
+def is_conversation_worksheet(title):
+    """Check whether a worksheet holds conversation logs (rather than leads)"""
+    return title == "Conversations" or is_shard_of(title, "Conversations")
+
+def worksheet_headers(title):
+    """Get the headers for a worksheet, including monthly shards (e.g. Conversations 2026-10)"""
+    if is_shard_of(title, "Conversations"):
+        return WORKSHEET_HEADERS["Conversations"]
+    if title == SHARD_CATALOG_TITLE:
+        return SHARD_CATALOG_HEADERS
+    return WORKSHEET_HEADERS.get(title)
+
+def is_missing_worksheet_error(error):
+    """Check whether an API error means the worksheet was deleted or renamed"""
+    if isinstance(error, gspread.exceptions.WorksheetNotFound):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code == 404 or "Unable to parse range" in str(error)
+    return False
+
+def to_cell(value):
+    """Convert a value to something Google Sheets accepts in a single cell"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if not isinstance(value, str):
+        value = json.dumps(value, default=str)
+    return value[:MAX_CELL_LENGTH]
+
 class GoogleSheetsHandler:
     def __init__(self):
         # Get configuration from environment variables
-        credentials_file = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE")
+        self.credentials_file = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE")
         self.sheet_id = os.getenv("GOOGLE_SHEETS_ID")
         
         # Verify credentials are available
-        if not credentials_file or not os.path.exists(credentials_file):
-            raise Exception(f"Google Sheets credentials file not found: {credentials_file}")
+        if not self.credentials_file or not os.path.exists(self.credentials_file):
+            raise Exception(f"Google Sheets credentials file not found: {self.credentials_file}")
         
         if not self.sheet_id:
             raise Exception("GOOGLE_SHEETS_ID environment variable is not set")
         
-        # Set up credentials
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        credentials = ServiceAccountCredentials.from_json_keyfile_name(credentials_file, scope)
+        # The client, spreadsheet and worksheets are opened on first use so that
+        # importing the app doesn't wait on Google API calls
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._lock = threading.RLock()
         
-        # Create client
-        self.client = gspread.authorize(credentials)
+        # Opt in with CONVERSATION_SHARDING=monthly to start a new Conversations worksheet every month
+        self.conversation_sharding = os.getenv("CONVERSATION_SHARDING", "none").lower() == "monthly"
+        self.shard_catalog = ShardCatalog()
         
-        # Open the spreadsheet
-        self.spreadsheet = self.client.open_by_key(self.sheet_id)
+        # Per-user row index for conversation history lookups, per worksheet
+        self.conversation_indexes = {}
         
-        # Initialize sheets
-        self._init_conversation_sheet()
-        self._init_home_preferences_sheet()
-        self._init_help_requests_sheet()
+        # Pace requests against the Sheets API's per-minute quotas, putting leads before logs
+        self.quota = SheetsQuotaScheduler(
+            read_quota=int(os.getenv("SHEETS_READ_QUOTA", "60")),
+            write_quota=int(os.getenv("SHEETS_WRITE_QUOTA", "60")),
+            min_batch_size=int(os.getenv("SHEETS_BATCH_SIZE", "50")),
+            max_batch_size=int(os.getenv("SHEETS_MAX_BATCH_SIZE", "500")),
+            reserve=float(os.getenv("SHEETS_LOG_RESERVE", "0.2")),
+            low_priority=is_conversation_worksheet
+        )
+        # Unbuffered writes run on the request thread, so they only wait this long for quota
+        self.write_wait = float(os.getenv("SHEETS_WRITE_WAIT", "2"))
+        
+        # Batch writes in the background instead of one append_row per save
+        self.write_buffer = None
+        if os.getenv("SHEETS_BUFFERED_WRITES", "true").lower() == "true":
+            batch_size = int(os.getenv("SHEETS_BATCH_SIZE", "50"))
+            flush_interval = float(os.getenv("SHEETS_FLUSH_INTERVAL", "5"))
+            spool_path = os.getenv("SHEETS_SPOOL_PATH", "sheets_spool.db")
+            
+            if spool_path:
+                # Durable local spool: rows survive Sheets outages and restarts
+                self.write_buffer = SheetsSpool(
+                    spool_path,
+                    self._resolve_worksheet,
+                    batch_size=batch_size,
+                    flush_interval=flush_interval,
+                    on_error=self._on_worksheet_error,
+                    scheduler=self.quota
+                )
+            else:
+                self.write_buffer = SheetsWriteBuffer(
+                    self._resolve_worksheet,
+                    batch_size=batch_size,
+                    flush_interval=flush_interval,
+                    on_error=self._on_worksheet_error,
+                    scheduler=self.quota
+                )
+            atexit.register(self.write_buffer.stop)
     
-    def _init_conversation_sheet(self):
-        """Initialize or get the conversation worksheet"""
-        try:
-            self.conversation_sheet = self.spreadsheet.worksheet("Conversations")
-        except gspread.exceptions.WorksheetNotFound:
-            # Create sheet with headers
-            self.conversation_sheet = self.spreadsheet.add_worksheet(
-                title="Conversations", rows="1000", cols="7"
-            )
-            self.conversation_sheet.append_row([
-                "Timestamp", "User ID", "User Name", "Message", 
-                "Response", "Platform", "Thread ID"
-            ])
+    @property
+    def client(self):
+        """Authorized gspread client, created on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+                    credentials = ServiceAccountCredentials.from_json_keyfile_name(self.credentials_file, scope)
+                    self._client = gspread.authorize(credentials)
+        return self._client
     
-    def _init_home_preferences_sheet(self):
-        """Initialize or get the home preferences worksheet"""
-        try:
-            self.home_preferences_sheet = self.spreadsheet.worksheet("Home Preferences")
-        except gspread.exceptions.WorksheetNotFound:
-            # Create sheet with headers
-            self.home_preferences_sheet = self.spreadsheet.add_worksheet(
-                title="Home Preferences", rows="1000", cols="9"
-            )
-            self.home_preferences_sheet.append_row([
-                "Timestamp", "User ID", "User Name", "Type", 
-                "Property Type", "Budget", "Location", 
-                "Financing/Roommate", "Notes"
-            ])
+    @property
+    def spreadsheet(self):
+        """The spreadsheet, opened on first use"""
+        if self._spreadsheet is None:
+            with self._lock:
+                if self._spreadsheet is None:
+                    self._spreadsheet = self.client.open_by_key(self.sheet_id)
+        return self._spreadsheet
+    
+    @property
+    def conversation_sheet(self):
+        """The worksheet conversations are currently written to"""
+        return self._resolve_worksheet(self._conversation_title())
+    
+    @property
+    def home_preferences_sheet(self):
+        return self._get_or_create_worksheet("Home Preferences")
+    
+    @property
+    def help_requests_sheet(self):
+        return self._get_or_create_worksheet("Help Requests")
+    
+    def _resolve_worksheet(self, title):
+        """Get the worksheet rows for the given title are written to"""
+        worksheet = self._get_or_create_worksheet(title)
+        if is_shard_of(title, "Conversations"):
+            self._record_shard(title)
+        return worksheet
+    
+    def _conversation_title(self, when=None):
+        """Get the title of the Conversations worksheet for a timestamp (default now)"""
+        if not self.conversation_sharding:
+            return "Conversations"
+        return monthly_shard("Conversations", when)[0]
+    
+    def _load_shard_catalog(self):
+        """Read the shard catalog worksheet on first use"""
+        if self.shard_catalog.loaded:
+            return self.shard_catalog
+        
+        with self._lock:
+            if self.shard_catalog.loaded:
+                return self.shard_catalog
+            
+            worksheet = self._get_or_create_worksheet(SHARD_CATALOG_TITLE)
+            self.quota.record("read")
+            rows = worksheet.get_values()[1:]
+            if not rows and self._get_or_create_worksheet("Conversations", create=False):
+                # First rollover: the original worksheet keeps everything up to now
+                legacy_row = ["Conversations", "", monthly_shard("Conversations")[1]]
+                self.quota.record("write")
+                worksheet.append_row(legacy_row)
+                rows = [legacy_row]
+            self.shard_catalog.load(rows)
+            return self.shard_catalog
+    
+    def _record_shard(self, title):
+        """Add a Conversations shard to the catalog if it isn't there yet"""
+        if title in self._load_shard_catalog():
+            return
+        
+        with self._lock:
+            if title in self.shard_catalog:
+                return
+            start, end = shard_range(title)
+            self.quota.record("write")
+            self._get_or_create_worksheet(SHARD_CATALOG_TITLE).append_row([title, start, end])
+            self.shard_catalog.add(title, start, end)
+    
+    def _conversation_index(self, title):
+        with self._lock:
+            index = self.conversation_indexes.get(title)
+            if index is None:
+                index = self.conversation_indexes[title] = ConversationIndex()
+            return index
+    
+    def _on_worksheet_error(self, title, error):
+        """Drop a cached worksheet handle when an API call shows it no longer exists"""
+        if is_missing_worksheet_error(error):
+            self.invalidate_worksheet(title)
+    
+    def invalidate_worksheet(self, title):
+        """Forget a cached worksheet handle so it is looked up (or recreated) on next use"""
+        with self._lock:
+            self._worksheets.pop(title, None)
+        if title in self.conversation_indexes:
+            self.conversation_indexes[title].reset()
+        if title == SHARD_CATALOG_TITLE:
+            self.shard_catalog.reset()
     
-    def _init_help_requests_sheet(self):
-        """Initialize or get the help requests worksheet"""
+    def _append(self, title, row_data):
+        """Append a row to a worksheet, through the write buffer when it is enabled"""
+        # A row Sheets rejects would otherwise be retried forever
+        row_data = [to_cell(value) for value in row_data]
+        
+        if self.write_buffer:
+            return self.write_buffer.add(title, row_data)
+        
+        # Conversation logs are refused outright while the quota is kept for leads
+        if not self.quota.acquire("write", self.quota.priority(title), timeout=self.write_wait):
+            raise Exception(f"Google Sheets write quota exhausted, dropping row for {title}")
+        
         try:
-            self.help_requests_sheet = self.spreadsheet.worksheet("Help Requests")
-        except gspread.exceptions.WorksheetNotFound:
-            # Create sheet with headers
-            self.help_requests_sheet = self.spreadsheet.add_worksheet(
-                title="Help Requests", rows="1000", cols="9"
-            )
-            self.help_requests_sheet.append_row([
-                "Timestamp", "User ID", "User Name", "Type", 
-                "Category", "Details", "Status", "Follow-up", "Notes"
-            ])
+            self._resolve_worksheet(title).append_row(row_data)
+        except Exception as e:
+            self.quota.failed(e)
+            if not is_missing_worksheet_error(e):
+                raise
+            # The cached worksheet was deleted or renamed: look it up again and retry once
+            self.invalidate_worksheet(title)
+            self._resolve_worksheet(title).append_row(row_data)
+        return True
+    
+    def flush(self):
+        """Write any buffered rows to Google Sheets now"""
+        if self.write_buffer:
+            return self.write_buffer.flush()
+        return True
     
     def save_conversation(self, user_id, user_name, message, response, platform, thread_id=None):
         """
@@ -86,12 +274,10 @@ class GoogleSheetsHandler:
         try:
             now = time.strftime("%Y-%m-%d %H:%M:%S")
             
-            # Append the conversation
-            self.conversation_sheet.append_row([
+            # Append the conversation to this month's worksheet
+            return self._append(self._conversation_title(), [
                 now, user_id, user_name, message, response, platform, thread_id or ""
             ])
-            
-            return True
         except Exception as e:
             print(f"Error saving conversation to Google Sheets: {e}")
             return False
@@ -105,8 +291,7 @@ class GoogleSheetsHandler:
         """
         try:
             # Append the preferences
-            self.home_preferences_sheet.append_row(row_data)
-            return True
+            return self._append("Home Preferences", row_data)
         except Exception as e:
             print(f"Error saving home preferences to Google Sheets: {e}")
             return False
@@ -116,15 +301,8 @@ class GoogleSheetsHandler:
         Save a help request to the Help Requests worksheet
         """
         try:
-            # Get Help Requests worksheet, create if doesn't exist
-            help_worksheet = self._get_or_create_worksheet("Help Requests", [
-                "Timestamp", "User ID", "User Name", "Type",
-                "Help Category", "Details", "Status", "Follow-up", "Notes"
-            ])
-            
-            # Append data
-            help_worksheet.append_row(row_data)
-            return True
+            # Append data (the worksheet is created if it doesn't exist)
+            return self._append("Help Requests", row_data)
         except Exception as e:
             print(f"Error saving help request to Google Sheets: {e}")
             return False
@@ -134,60 +312,122 @@ class GoogleSheetsHandler:
         Save a money-saving request to the Money Requests worksheet
         """
         try:
-            # Get Money Requests worksheet, create if doesn't exist
-            money_worksheet = self._get_or_create_worksheet("Money Requests", [
-                "Timestamp", "User ID", "User Name", "Type",
-                "Savings Category", "Details", "Status", "Follow-up", "Notes"
-            ])
-            
-            # Append data
-            money_worksheet.append_row(row_data)
-            return True
+            # Append data (the worksheet is created if it doesn't exist)
+            return self._append("Money Requests", row_data)
         except Exception as e:
             print(f"Error saving money request to Google Sheets: {e}")
             return False
     
-    def _get_or_create_worksheet(self, worksheet_name, headers=None):
+    def _get_or_create_worksheet(self, worksheet_name, headers=None, create=True):
         """
         Get or create a worksheet in the Google Sheet
+        Handles are cached by title until invalidate_worksheet() is called
+        With create=False, returns None if the worksheet doesn't exist
         """
-        try:
-            # Try to get the worksheet
-            worksheet = self.spreadsheet.worksheet(worksheet_name)
+        worksheet = self._worksheets.get(worksheet_name)
+        if worksheet is not None:
             return worksheet
-        except gspread.exceptions.WorksheetNotFound:
-            # Create the worksheet if it doesn't exist
-            worksheet = self.spreadsheet.add_worksheet(title=worksheet_name, rows=1000, cols=20)
+        
+        with self._lock:
+            worksheet = self._worksheets.get(worksheet_name)
+            if worksheet is not None:
+                return worksheet
             
-            # Add headers if provided
-            if headers:
-                worksheet.append_row(headers)
+            headers = headers or worksheet_headers(worksheet_name)
+            try:
+                # Try to get the worksheet
+                self.quota.record("read")
+                worksheet = self.spreadsheet.worksheet(worksheet_name)
+            except gspread.exceptions.WorksheetNotFound:
+                if not create:
+                    return None
                 
+                # Create the worksheet if it doesn't exist
+                self.quota.record("write", 2 if headers else 1)
+                worksheet = self.spreadsheet.add_worksheet(
+                    title=worksheet_name, rows=1000, cols=len(headers) if headers else 20
+                )
+                
+                # Add headers if provided
+                if headers:
+                    worksheet.append_row(headers)
+            
+            self._worksheets[worksheet_name] = worksheet
             return worksheet
     
-    def get_conversation_history(self, user_id, limit=10):
+    def get_conversation_history(self, user_id, limit=10, since=None):
         """
-        Get conversation history for a specific user
+        Get conversation history for a specific user, newest first
+        Only the monthly worksheets covering rows newer than `since` (a
+        "%Y-%m-%d %H:%M:%S" timestamp) are read, newest first, stopping once
+        `limit` rows are found
         """
         try:
-            all_records = self.conversation_sheet.get_all_records()
+            # History is optional context, so don't spend quota the writers need
+            if not self.quota.has_headroom("read"):
+                print("Skipping conversation history lookup: Google Sheets read quota exhausted")
+                return []
             
-            # Filter for the specific user
-            user_records = [
-                record for record in all_records 
-                if record.get("User ID") == user_id
-            ]
+            if self.conversation_sharding:
+                titles = self._load_shard_catalog().shards(since)
+                # Another process may have started this month's worksheet
+                current_title = self._conversation_title()
+                if current_title not in titles:
+                    titles.insert(0, current_title)
+            else:
+                titles = ["Conversations"]
             
-            # Sort by timestamp (newest first)
-            user_records.sort(
-                key=lambda x: datetime.strptime(x.get("Timestamp"), "%Y-%m-%d %H:%M:%S"), 
-                reverse=True
-            )
+            records = []
+            for title in titles:
+                if len(records) >= limit:
+                    break
+                records += self._get_shard_history(title, user_id, limit - len(records))
             
-            # Limit the number of records
-            limited_records = user_records[:limit]
-            
-            return limited_records
+            return records
         except Exception as e:
             print(f"Error getting conversation history: {e}")
             return []
+    
+    def _get_shard_history(self, title, user_id, limit):
+        """Get a user's newest rows from one Conversations worksheet"""
+        try:
+            worksheet = self._get_or_create_worksheet(title, create=False)
+            if worksheet is None:
+                return []
+            
+            # Index any rows appended since the last lookup, then find this user's newest rows
+            index = self._conversation_index(title)
+            self.quota.record("read", 2)
+            index.sync(worksheet)
+            row_numbers = index.latest_rows(user_id, limit)
+            if not row_numbers:
+                return []
+            
+            # Fetch just those rows (newest first)
+            headers = WORKSHEET_HEADERS["Conversations"]
+            last_column = chr(ord("A") + len(headers) - 1)
+            value_ranges = worksheet.batch_get([
+                f"A{row}:{last_column}{row}" for row in row_numbers
+            ])
+            
+            records = []
+            for value_range in value_ranges:
+                row = list(value_range[0]) if value_range else []
+                row += [""] * (len(headers) - len(row))
+                records.append(dict(zip(headers, row)))
+            
+            return records
+        except Exception as e:
+            self._on_worksheet_error(title, e)
+            raise
+
+_shared_handler = None
+_shared_lock = threading.Lock()
+
+def get_sheets_handler():
+    """Get the process-wide GoogleSheetsHandler, creating it on first use"""
+    global _shared_handler
+    with _shared_lock:
+        if _shared_handler is None:
+            _shared_handler = GoogleSheetsHandler()
+        return _shared_handler
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import deque
+import gspread
+from metrics import LatencyStats
+
+# Lead rows (Home Preferences, Help Requests, Money Requests) go before conversation logs
+PRIORITY_LEAD = 0
+PRIORITY_LOG = 1
+
+def is_quota_error(error):
+    """Check whether an API error means a Sheets quota was exceeded"""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code == 429 or "RESOURCE_EXHAUSTED" in str(error)
+    return False
+
+class SheetsQuotaScheduler:
+    """
+    Paces Google Sheets requests against per-minute read and write quotas
+
+    Requests are counted in a sliding window per kind ("read" / "write").
+    Writers call acquire() before each request, which waits for room under
+    the quota. Low-priority writes (conversation logs) are refused while the
+    remaining headroom is below `reserve`, so lead rows get what's left;
+    refused rows stay queued and go out once pressure drops.
+
+    As the write window fills, batch_size() grows from min_batch_size towards
+    max_batch_size so the same rows take fewer requests. A quota error pauses
+    the kind with an exponentially growing backoff.
+    """
+    def __init__(self, read_quota=60, write_quota=60, window=60, min_batch_size=50,
+                 max_batch_size=500, reserve=0.2, low_priority=None):
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self.window = window
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max(min_batch_size, max_batch_size)
+        self.reserve = reserve
+        self.low_priority = low_priority  # worksheet title -> True for low-priority rows
+        self.requests = {kind: deque() for kind in self.quotas}  # kind -> request timestamps
+        self.paused_until = {kind: 0 for kind in self.quotas}
+        self.backoff = {kind: 1 for kind in self.quotas}
+        self.counters = {"deferred": 0, "refused": 0, "throttled": 0}
+        self.wait_time = LatencyStats()
+        self._cond = threading.Condition()
+
+    def priority(self, title):
+        """Get the priority of rows written to a worksheet"""
+        if self.low_priority and self.low_priority(title):
+            return PRIORITY_LOG
+        return PRIORITY_LEAD
+
+    def acquire(self, kind, priority=PRIORITY_LEAD, timeout=None):
+        """
+        Wait for room under the quota and count one request
+        Returns False if a low-priority request should be deferred, or no room
+        opened up within `timeout` seconds (default: one window)
+        """
+        timeout = self.window if timeout is None else timeout
+        start = time.time()
+        with self._cond:
+            while True:
+                now = time.time()
+                headroom = self._headroom(kind, now)
+                if priority == PRIORITY_LOG and headroom <= self.reserve:
+                    self.counters["deferred"] += 1
+                    return False
+
+                requests = self.requests[kind]
+                if now >= self.paused_until[kind] and len(requests) < self.quotas[kind]:
+                    requests.append(now)
+                    self.wait_time.record(now - start)
+                    return True
+
+                # Wait for the pause to end or the oldest request to leave the window
+                delay = max(self.paused_until[kind] - now, 0)
+                if requests and len(requests) >= self.quotas[kind]:
+                    delay = max(delay, requests[0] + self.window - now)
+                if now + delay - start > timeout:
+                    self.counters["refused"] += 1
+                    return False
+                self._cond.wait(max(delay, 0.01))
+
+    def record(self, kind, count=1):
+        """Count requests made without waiting (e.g. reads on the request path)"""
+        with self._cond:
+            now = time.time()
+            self._expire(kind, now)
+            self.requests[kind].extend([now] * count)
+
+    def has_headroom(self, kind):
+        """Check whether a request can be made right now without exceeding the quota"""
+        with self._cond:
+            now = time.time()
+            return now >= self.paused_until[kind] and self._headroom(kind, now) > 0
+
+    def batch_size(self):
+        """Get the number of rows to write per request, growing as the write quota fills"""
+        with self._cond:
+            pressure = 1 - self._headroom("write", time.time())
+        return int(self.min_batch_size + (self.max_batch_size - self.min_batch_size) * pressure)
+
+    def failed(self, error, kind="write"):
+        """Back off after a quota error; other errors are ignored"""
+        if not is_quota_error(error):
+            return
+        with self._cond:
+            self.counters["throttled"] += 1
+            self.paused_until[kind] = time.time() + self.backoff[kind]
+            self.backoff[kind] = min(self.window, self.backoff[kind] * 2)
+
+    def succeeded(self, kind="write"):
+        """Recover the backoff after a successful request"""
+        with self._cond:
+            self.backoff[kind] = max(1, self.backoff[kind] / 2)
+
+    def stats(self):
+        """Get quota usage and headroom per kind, plus deferral counters"""
+        with self._cond:
+            now = time.time()
+            stats = dict(self.counters)
+            for kind, quota in self.quotas.items():
+                self._expire(kind, now)
+                stats[kind] = {
+                    "quota_per_window": quota,
+                    "used": len(self.requests[kind]),
+                    "headroom": round(self._headroom(kind, now), 2),
+                    "paused_for": round(max(0, self.paused_until[kind] - now), 1)
+                }
+        stats["batch_size"] = self.batch_size()
+        stats["wait"] = self.wait_time.snapshot()
+        return stats
+
+    def _headroom(self, kind, now):
+        """Fraction of the quota still unused in the current window (caller holds the lock)"""
+        self._expire(kind, now)
+        quota = self.quotas[kind]
+        return max(0, quota - len(self.requests[kind])) / quota
+
+    def _expire(self, kind, now):
+        """Drop requests that have left the window (caller holds the lock)"""
+        requests = self.requests[kind]
+        while requests and requests[0] <= now - self.window:
+            requests.popleft()
@@ -0,0 +1,387 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from metrics import LatencyStats
+
+class SheetsSpool:
+    """
+    Durable write-ahead spool for Google Sheets rows
+
+    Rows are committed to a local SQLite file (WAL mode) before anything talks
+    to Google, so saving never waits on Sheets and an outage or restart never
+    loses a row. A background syncer drains the spool per worksheet in batches.
+
+    Each batch is recorded before it is sent. If a send fails or the process
+    dies mid-send the batch stays "sending", and before it is retried the tail
+    of the worksheet is checked so a batch that did land is not written twice.
+
+    Only one process at a time drains a spool file (a short lease in the
+    database), so all gunicorn workers on a host can share one spool.
+    Implements the same add/flush/stop/stats interface as SheetsWriteBuffer.
+
+    With a SheetsQuotaScheduler, lead worksheets are drained first, each
+    batch waits for room under the write quota, and batches grow as the
+    quota fills. The wait is kept under half the lease, and the lease is
+    renewed just before each send, so a batch can't be claimed by another
+    process while this one is about to write it.
+    """
+    def __init__(self, db_path, resolve_worksheet, batch_size=50, flush_interval=5, lease_ttl=30, on_error=None, scheduler=None):
+        self.db_path = db_path
+        self.resolve_worksheet = resolve_worksheet  # title -> gspread worksheet
+        self.on_error = on_error  # called with (title, exception) when a sync fails
+        self.scheduler = scheduler  # optional SheetsQuotaScheduler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lease_ttl = lease_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.stats_by_sheet = {}
+        self._local = threading.local()
+        self._syncer = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS spool_rows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                worksheet TEXT NOT NULL,
+                row TEXT NOT NULL,
+                batch_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS spool_rows_pending ON spool_rows (worksheet, batch_id, id);
+            CREATE TABLE IF NOT EXISTS spool_batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                worksheet TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                synced_at REAL,
+                updated_range TEXT
+            );
+            CREATE TABLE IF NOT EXISTS spool_lease (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        conn.commit()
+
+        # Resume draining whatever a previous process left behind
+        if self.pending():
+            self._start_syncer()
+
+    def _connect(self):
+        """Get this thread's connection to the spool"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, title, row):
+        """Append a row to the spool; it is written to Google Sheets in the background"""
+        self._connect().execute(
+            "INSERT INTO spool_rows (worksheet, row) VALUES (?, ?)",
+            (title, json.dumps(row))
+        )
+        with self._cond:
+            self._cond.notify()
+        self._start_syncer()
+        return True
+
+    def pending(self):
+        """Number of rows not yet confirmed in Google Sheets"""
+        return self._connect().execute("SELECT COUNT(*) FROM spool_rows").fetchone()[0]
+
+    def flush(self, timeout=None):
+        """
+        Drain the spool to Google Sheets now
+        Returns False if any worksheet failed to sync or the timeout (seconds)
+        ran out first, and None if another process holds the drain lease.
+        A flush without a timeout (the syncer's) gives way to stop() between batches.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        if not self._flush_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        try:
+            if not self._acquire_lease():
+                # Another process is draining this spool
+                return None
+
+            ok = True
+            titles = [r[0] for r in self._connect().execute("SELECT DISTINCT worksheet FROM spool_rows")]
+            if self.scheduler:
+                titles.sort(key=self.scheduler.priority)
+            for title in titles:
+                while True:
+                    if deadline is None and self._stopped:
+                        return False
+                    if not self._acquire_lease():
+                        # The lease lapsed and another process took over
+                        return None
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        ok = False
+                        break
+                    synced = self._sync_next_batch(title, remaining)
+                    if synced is None:
+                        break
+                    if not synced:
+                        ok = False
+                        break
+
+            self._prune()
+            return ok
+        finally:
+            self._flush_lock.release()
+
+    def stop(self, timeout=10):
+        """
+        Sync what's left and stop the background thread (used at shutdown)
+        Draining stops after `timeout` seconds; the rest stays spooled for the
+        next process to send
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.flush(timeout)
+        self._release_lease()
+
+    def stats(self):
+        """Get per-worksheet sync metrics"""
+        pending = dict(self._connect().execute(
+            "SELECT worksheet, COUNT(*) FROM spool_rows GROUP BY worksheet"
+        ).fetchall())
+        with self._cond:
+            stats = {}
+            for title in set(pending) | set(self.stats_by_sheet):
+                sheet_stats = self._sheet_stats(title)
+                stats[title] = {
+                    "pending": pending.get(title, 0),
+                    "flushes": sheet_stats["flushes"],
+                    "rows": sheet_stats["rows"],
+                    "errors": sheet_stats["errors"],
+                    "recovered": sheet_stats["recovered"],
+                    "deferred": sheet_stats["deferred"],
+                    "last_batch_size": sheet_stats["last_batch_size"],
+                    "avg_batch_size": round(sheet_stats["rows"] / sheet_stats["flushes"], 1) if sheet_stats["flushes"] else 0,
+                    "flush_latency": sheet_stats["latency"].snapshot()
+                }
+            return stats
+
+    def _sync_next_batch(self, title, timeout=None):
+        """
+        Send the next batch for a worksheet
+        Returns True when it is synced, False on failure, when the quota
+        scheduler defers it (or has no room within `timeout` seconds) or when
+        the drain lease was lost meanwhile, None when nothing is pending
+        """
+        batch_id, attempts, rows = self._claim_batch(title)
+        if batch_id is None:
+            return None
+
+        # Never wait for quota long enough for the lease to lapse
+        wait = self.lease_ttl / 2 if timeout is None else min(timeout, self.lease_ttl / 2)
+        if self.scheduler and not self.scheduler.acquire("write", self.scheduler.priority(title), wait):
+            # Left claimed; it is picked up again on the next flush
+            with self._cond:
+                self._sheet_stats(title)["deferred"] += 1
+            return False
+
+        # Renew the lease right before sending; if another process took it
+        # over, the batch is theirs to send
+        if not self._acquire_lease():
+            return False
+
+        start = time.time()
+        try:
+            worksheet = self.resolve_worksheet(title)
+
+            # A previous attempt may have landed before the error or crash
+            if attempts and self._batch_landed(worksheet, rows):
+                self._mark_synced(batch_id, None)
+                with self._cond:
+                    self._sheet_stats(title)["recovered"] += 1
+                return True
+
+            self._connect().execute(
+                "UPDATE spool_batches SET attempts = attempts + 1 WHERE id = ?", (batch_id,)
+            )
+            response = worksheet.append_rows(rows)
+        except Exception as e:
+            print(f"Error syncing {len(rows)} rows to {title}: {e}")
+            if self.scheduler:
+                self.scheduler.failed(e)
+            if self.on_error:
+                self.on_error(title, e)
+            with self._cond:
+                self._sheet_stats(title)["errors"] += 1
+            return False
+
+        if self.scheduler:
+            self.scheduler.succeeded()
+
+        updated_range = None
+        if isinstance(response, dict):
+            updated_range = response.get("updates", {}).get("updatedRange")
+        self._mark_synced(batch_id, updated_range)
+
+        with self._cond:
+            sheet_stats = self._sheet_stats(title)
+            sheet_stats["flushes"] += 1
+            sheet_stats["rows"] += len(rows)
+            sheet_stats["last_batch_size"] = len(rows)
+        sheet_stats["latency"].record(time.time() - start)
+        return True
+
+    def _claim_batch(self, title):
+        """
+        Get the worksheet's unfinished batch, or group the oldest pending rows into a new one
+        Returns (batch_id, attempts, rows)
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            batch = conn.execute(
+                "SELECT id, attempts FROM spool_batches WHERE worksheet = ? AND state = 'sending' ORDER BY id LIMIT 1",
+                (title,)
+            ).fetchone()
+
+            if batch is None:
+                ids = [r[0] for r in conn.execute(
+                    "SELECT id FROM spool_rows WHERE worksheet = ? AND batch_id IS NULL ORDER BY id LIMIT ?",
+                    (title, self._batch_size())
+                )]
+                if not ids:
+                    conn.execute("COMMIT")
+                    return None, 0, []
+                cursor = conn.execute(
+                    "INSERT INTO spool_batches (worksheet, state, created_at) VALUES (?, 'sending', ?)",
+                    (title, time.time())
+                )
+                batch = (cursor.lastrowid, 0)
+                conn.execute(
+                    f"UPDATE spool_rows SET batch_id = ? WHERE id IN ({','.join('?' * len(ids))})",
+                    [batch[0]] + ids
+                )
+
+            rows = [json.loads(r[0]) for r in conn.execute(
+                "SELECT row FROM spool_rows WHERE batch_id = ? ORDER BY id", (batch[0],)
+            )]
+            conn.execute("COMMIT")
+            return batch[0], batch[1], rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _mark_synced(self, batch_id, updated_range):
+        """Record a batch as written and drop its rows from the spool"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM spool_rows WHERE batch_id = ?", (batch_id,))
+        conn.execute(
+            "UPDATE spool_batches SET state = 'synced', synced_at = ?, updated_range = ? WHERE id = ?",
+            (time.time(), updated_range, batch_id)
+        )
+        conn.execute("COMMIT")
+
+    def _batch_landed(self, worksheet, rows):
+        """Check whether the batch's rows are already at the end of the worksheet"""
+        if self.scheduler:
+            self.scheduler.record("read", 2)
+        last_row = len(worksheet.col_values(1))
+        if last_row < len(rows):
+            return False
+
+        # Look a little further back in case other rows were appended after ours
+        first_row = max(1, last_row - 2 * len(rows) + 1)
+        tail = [self._normalize(r) for r in worksheet.get_values(f"{first_row}:{last_row}")]
+        expected = [self._normalize(r) for r in rows]
+        return any(
+            tail[i:i + len(expected)] == expected
+            for i in range(len(tail) - len(expected) + 1)
+        )
+
+    def _normalize(self, row):
+        """Compare cells as strings, ignoring trailing blanks"""
+        values = ["" if value is None else str(value) for value in row]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def _acquire_lease(self):
+        """Take or renew the drain lease; returns False if another live process holds it"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        lease = conn.execute("SELECT owner, expires_at FROM spool_lease WHERE name = 'drain'").fetchone()
+        if lease and lease[0] != self.owner and lease[1] > now:
+            conn.execute("COMMIT")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO spool_lease (name, owner, expires_at) VALUES ('drain', ?, ?)",
+            (self.owner, now + self.lease_ttl)
+        )
+        conn.execute("COMMIT")
+        return True
+
+    def _release_lease(self):
+        self._connect().execute(
+            "DELETE FROM spool_lease WHERE name = 'drain' AND owner = ?", (self.owner,)
+        )
+
+    def _prune(self):
+        """Forget synced batch markers after a week"""
+        self._connect().execute(
+            "DELETE FROM spool_batches WHERE state = 'synced' AND synced_at < ?",
+            (time.time() - 7 * 86400,)
+        )
+
+    def _batch_size(self):
+        """Rows per batch, larger when the write quota is under pressure"""
+        if self.scheduler:
+            return self.scheduler.batch_size()
+        return self.batch_size
+
+    def _sheet_stats(self, title):
+        """Get the counters for a worksheet (caller holds the lock)"""
+        if title not in self.stats_by_sheet:
+            self.stats_by_sheet[title] = {
+                "flushes": 0, "rows": 0, "errors": 0, "recovered": 0, "deferred": 0,
+                "last_batch_size": 0, "latency": LatencyStats()
+            }
+        return self.stats_by_sheet[title]
+
+    def _start_syncer(self):
+        # Started lazily so the thread is created after gunicorn forks
+        if self._syncer is not None:
+            return
+        with self._cond:
+            if self._syncer is None:
+                self._syncer = threading.Thread(target=self._run_syncer, name="sheets-syncer", daemon=True)
+                self._syncer.start()
+
+    def _run_syncer(self):
+        healthy = True
+        while True:
+            deadline = time.time() + self.flush_interval
+            with self._cond:
+                while not self._stopped and time.time() < deadline:
+                    # After a failed sync, wait the full interval before retrying
+                    if healthy and self.pending() >= self._batch_size():
+                        break
+                    self._cond.wait(deadline - time.time())
+                if self._stopped:
+                    return
+            try:
+                # When another process holds the lease (None), also wait the full interval
+                healthy = self.flush() is True
+            except Exception as e:
+                print(f"Error syncing Google Sheets spool: {e}")
+                healthy = False
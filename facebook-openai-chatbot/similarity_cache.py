@@ -0,0 +1,171 @@
+import os
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from response_cache import normalize_message
+
+# Mersenne prime for the universal hash family h(x) = (a * x + b) mod p
+MERSENNE_PRIME = (1 << 61) - 1
+
+def shingles(text):
+    """
+    Features of a message for MinHash: its words plus character 4-grams of
+    each word, so small typos and word order changes keep most features
+    """
+    words = normalize_message(text).split()
+    features = set(words)
+    for word in words:
+        padded = f" {word} "
+        features.update(padded[i:i + 4] for i in range(max(1, len(padded) - 3)))
+    return features
+
+class MinHasher:
+    """MinHash signatures: the fraction of equal positions estimates Jaccard similarity"""
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, features):
+        hashes = [zlib.crc32(feature.encode()) for feature in features] or [0]
+        return tuple(
+            min((a * value + b) % MERSENNE_PRIME for value in hashes)
+            for a, b in self.params
+        )
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+class SimilarityCache:
+    """
+    Cache of OpenAI answers that also matches reworded questions
+
+    Each question's MinHash signature is split into `bands` bands of `rows`
+    values; questions sharing any band land in the same LSH bucket and are
+    compared, so a lookup only looks at likely matches, never the whole
+    cache. The closest candidate is used if its estimated similarity is at
+    least `threshold`. With 16 bands of 4 rows, pairs at 0.8 similarity
+    share a band over 99.9% of the time, pairs at 0.4 about 34%.
+
+    Memory is bounded by max_entries (least recently used questions are
+    evicted along with their buckets) and entries expire after ttl.
+    """
+    def __init__(self, threshold=0.8, bands=16, rows=4, max_entries=2000, ttl=86400):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hasher = MinHasher(num_perm=bands * rows)
+        self.entries = OrderedDict()  # entry_id -> (signature, question, response, latency, expires_at)
+        self.buckets = {}  # (band, band values) -> set of entry_ids
+        self.next_id = 0
+        self.counters = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "candidates": 0}
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        return self.hasher.signature(shingles(text))
+
+    def match(self, text):
+        """
+        Get (similarity, question, response, latency) for the closest cached
+        question at or above the threshold, or None. Doesn't count as a lookup.
+        """
+        return self._match(self.signature(text))
+
+    def get(self, text):
+        """Get the cached answer to a question close enough to this one, or None"""
+        signature = self.signature(text)
+        found = self._match(signature)
+        with self._lock:
+            if found is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self.saved_seconds += found[3]
+        return found[2]
+
+    def put(self, text, response, latency):
+        """Cache the answer to a question that took `latency` seconds to generate"""
+        signature = self.signature(text)
+        with self._lock:
+            self.counters["stores"] += 1
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (signature, text, response, latency, time.time() + self.ttl)
+            for band_key in self._band_keys(signature):
+                self.buckets.setdefault(band_key, set()).add(entry_id)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def bypass(self):
+        """Count a message that skipped the cache"""
+        with self._lock:
+            self.counters["bypassed"] += 1
+
+    def stats(self):
+        """Get hit/miss counters and the API time saved by hits"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+            stats["buckets"] = len(self.buckets)
+            saved_seconds = self.saved_seconds
+        stats["saved_seconds"] = round(saved_seconds, 1)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0
+        stats["avg_saved_ms"] = round(saved_seconds / stats["hits"] * 1000, 1) if stats["hits"] else 0
+        return stats
+
+    def _match(self, signature):
+        now = time.time()
+        best = None
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates.update(self.buckets.get(band_key, ()))
+            self.counters["candidates"] += len(candidates)
+
+            for entry_id in candidates:
+                entry_signature, question, response, latency, expires_at = self.entries[entry_id]
+                if expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                score = similarity(signature, entry_signature)
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, entry_id, question, response, latency)
+
+            if best is None:
+                return None
+            self.entries.move_to_end(best[1])
+        return best[0], best[2], best[3], best[4]
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def _remove(self, entry_id):
+        """Drop an entry and its bucket memberships (caller holds the lock)"""
+        signature = self.entries.pop(entry_id)[0]
+        for band_key in self._band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self.buckets[band_key]
+
+def create_similarity_cache():
+    """
+    Create the near-duplicate answer cache configured by the OPENAI_SIMILAR_*
+    environment variables, or None if OPENAI_SIMILAR_CACHE is off (the default)
+    """
+    if os.getenv("OPENAI_SIMILAR_CACHE", "false").lower() != "true":
+        return None
+    return SimilarityCache(
+        threshold=float(os.getenv("OPENAI_SIMILAR_THRESHOLD", "0.8")),
+        max_entries=int(os.getenv("OPENAI_SIMILAR_MAX_ENTRIES", "2000")),
+        ttl=float(os.getenv("OPENAI_CACHE_TTL", "86400"))
+    )
@@ -0,0 +1,276 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from bounded_store import BoundedStore
+
+class StateStore:
+    """
+    Per-user conversation flow state with atomic read-modify-write
+
+    A transaction locks the user, loads their state, and saves it back when
+    the block finishes without an error and the state changed. Transactions
+    are reentrant per thread, so flow handlers that call each other share one.
+    States are objects made by `factory(user_id)` with a JSON-serializable
+    `state_data` dict.
+
+    Subclasses implement _acquire/_release (cross-process locking), _load,
+    _save and _discard.
+    """
+    def __init__(self, factory, num_locks=64):
+        self.factory = factory
+        self.counters = {"transactions": 0, "saves": 0, "conflicts": 0, "lock_waits": 0}
+        self._locks = [threading.RLock() for _ in range(num_locks)]
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self, user_id):
+        """Lock the user's state for a read-modify-write and yield it"""
+        open_states = self._open_states()
+        if user_id in open_states:
+            yield open_states[user_id][0]
+            return
+
+        with self._locks[zlib.crc32(str(user_id).encode()) % len(self._locks)]:
+            self._acquire(user_id)
+            try:
+                state, version = self._load(user_id)
+                before = json.dumps(state.state_data, sort_keys=True, default=str)
+                open_states[user_id] = (state, version)
+                try:
+                    yield state
+                except BaseException:
+                    self._discard(user_id)
+                    raise
+                finally:
+                    del open_states[user_id]
+
+                self._count("transactions")
+                if json.dumps(state.state_data, sort_keys=True, default=str) != before:
+                    self._save(user_id, state, version)
+            finally:
+                self._release(user_id)
+
+    def get(self, user_id):
+        """
+        Get the user's state: the transaction's copy if one is open in this
+        thread, otherwise a read-only snapshot
+        """
+        open_state = self._open_states().get(user_id)
+        if open_state is not None:
+            return open_state[0]
+        return self._load(user_id)[0]
+
+    def stats(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def _open_states(self):
+        """Transactions open in this thread: user_id -> (state, version)"""
+        if not hasattr(self._local, "states"):
+            self._local.states = {}
+        return self._local.states
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def _acquire(self, user_id):
+        pass
+
+    def _release(self, user_id):
+        pass
+
+    def _load(self, user_id):
+        """Get (state, version) for a user"""
+        raise NotImplementedError
+
+    def _save(self, user_id, state, version):
+        """Store a state that was loaded at `version`"""
+        raise NotImplementedError
+
+    def _discard(self, user_id):
+        """Forget any cached copy after a failed transaction"""
+        pass
+
+class MemoryStateStore(StateStore):
+    """
+    In-process state store (one process only)
+
+    States are kept and changed in place in a BoundedStore, so a failed
+    transaction's changes are not rolled back.
+    """
+    def __init__(self, factory, max_entries=10000, idle_ttl=86400):
+        super().__init__(factory)
+        self.states = BoundedStore(max_entries=max_entries, idle_ttl=idle_ttl)
+
+    def _load(self, user_id):
+        return self.states.get_or_create(user_id, lambda: self.factory(user_id)), 0
+
+    def _save(self, user_id, state, version):
+        self._count("saves")
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(self.states.stats())
+        return stats
+
+class SQLiteStateStore(StateStore):
+    """
+    State store in a SQLite file shared by every worker process on the host
+
+    Each user has a lock row (a short lease, so a crashed worker can't block
+    the user for long) held for the whole transaction, and a versioned state
+    row written with a compare-and-set on the version. Hot states are cached
+    in-process and reused while the stored version still matches, so a
+    transaction costs two small indexed queries plus the write when the
+    state changed. States idle for longer than idle_ttl start over.
+    """
+    def __init__(self, db_path, factory, max_entries=10000, idle_ttl=86400, lock_ttl=10):
+        super().__init__(factory)
+        self.db_path = db_path
+        self.idle_ttl = idle_ttl
+        self.lock_ttl = lock_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self.cache = BoundedStore(max_entries=max_entries, idle_ttl=idle_ttl)  # user_id -> (version, state)
+        self.cache_hits = 0
+        self.last_prune = 0
+        self._db = threading.local()
+
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS flow_states (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS flow_states_updated ON flow_states (updated_at);
+            CREATE TABLE IF NOT EXISTS flow_locks (
+                user_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def _connect(self):
+        """Get this thread's connection to the database"""
+        conn = getattr(self._db, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._db.conn = conn
+        return conn
+
+    def _acquire(self, user_id):
+        """Take the user's lock row, waiting while another worker holds it"""
+        conn = self._connect()
+        deadline = time.time() + self.lock_ttl
+        waited = False
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            lock = conn.execute(
+                "SELECT owner, expires_at FROM flow_locks WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+            # After lock_ttl, assume the holder died and take over
+            if lock is None or lock[0] == self.owner or lock[1] <= now or now >= deadline:
+                conn.execute(
+                    "INSERT OR REPLACE INTO flow_locks (user_id, owner, expires_at) VALUES (?, ?, ?)",
+                    (str(user_id), self.owner, now + self.lock_ttl)
+                )
+                conn.execute("COMMIT")
+                return
+            conn.execute("COMMIT")
+            if not waited:
+                waited = True
+                self._count("lock_waits")
+            time.sleep(0.01)
+
+    def _release(self, user_id):
+        self._connect().execute(
+            "DELETE FROM flow_locks WHERE user_id = ? AND owner = ?", (str(user_id), self.owner)
+        )
+
+    def _load(self, user_id):
+        row = self._connect().execute(
+            "SELECT version, updated_at FROM flow_states WHERE user_id = ?", (str(user_id),)
+        ).fetchone()
+        if row is None:
+            return self.factory(user_id), 0
+
+        version, updated_at = row
+        if updated_at <= time.time() - self.idle_ttl:
+            # Idle too long: start over (the version still guards the write)
+            return self.factory(user_id), version
+
+        cached = self.cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            with self._counter_lock:
+                self.cache_hits += 1
+            return cached[1], version
+
+        data = self._connect().execute(
+            "SELECT data FROM flow_states WHERE user_id = ?", (str(user_id),)
+        ).fetchone()[0]
+        state = self.factory(user_id)
+        state.state_data = json.loads(data)
+        self.cache[user_id] = (version, state)
+        return state, version
+
+    def _save(self, user_id, state, version):
+        now = time.time()
+        cursor = self._connect().execute(
+            """
+            INSERT INTO flow_states (user_id, version, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                version = excluded.version, data = excluded.data, updated_at = excluded.updated_at
+            WHERE flow_states.version = ?
+            """,
+            (str(user_id), version + 1, json.dumps(state.state_data, default=str), now, version)
+        )
+        if cursor.rowcount == 0:
+            # Another worker wrote in between (only possible after a lock lease expired)
+            self._count("conflicts")
+            self.cache.pop(user_id)
+            print(f"Conflicting conversation state update for {user_id}, keeping the stored version")
+            return
+        self._count("saves")
+        self.cache[user_id] = (version + 1, state)
+
+        if now - self.last_prune > 3600:
+            self.last_prune = now
+            self._connect().execute("DELETE FROM flow_states WHERE updated_at < ?", (now - self.idle_ttl,))
+
+    def _discard(self, user_id):
+        self.cache.pop(user_id)
+
+    def stats(self):
+        stats = super().stats()
+        with self._counter_lock:
+            stats["cache_hits"] = self.cache_hits
+        stats["cache"] = self.cache.stats()
+        return stats
+
+def create_state_store(factory):
+    """
+    Create the flow state store configured by STATE_BACKEND
+    "memory" (default) keeps state in this process; "sqlite" shares it
+    between all worker processes on the host
+    """
+    max_entries = int(os.getenv("FLOW_STATE_MAX_USERS", "10000"))
+    idle_ttl = float(os.getenv("FLOW_STATE_IDLE_TTL", "86400"))
+    if os.getenv("STATE_BACKEND", "memory").lower() == "sqlite":
+        return SQLiteStateStore(
+            os.getenv("STATE_DB_PATH", "conversation_state.db"),
+            factory,
+            max_entries=max_entries,
+            idle_ttl=idle_ttl
+        )
+    return MemoryStateStore(factory, max_entries=max_entries, idle_ttl=idle_ttl)
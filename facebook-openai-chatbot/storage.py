@@ -0,0 +1,180 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from sheets_handler import WORKSHEET_HEADERS, get_sheets_handler, to_cell
+
+# Load environment variables
+load_dotenv()
+
+def column_name(header):
+    """Turn a worksheet header into a SQL column name ("Financing/Roommate" -> "financing_roommate")"""
+    return re.sub(r"[^a-z0-9]+", "_", header.lower()).strip("_")
+
+def table_name(title):
+    """Turn a worksheet title into a SQL table name ("Home Preferences" -> "home_preferences")"""
+    return column_name(title)
+
+class SQLiteStorage:
+    """
+    Local SQLite storage with the same interface as GoogleSheetsHandler
+
+    Each worksheet gets a table with one column per header and an index on
+    (user_id, id), so saves are a local insert and history lookups are an
+    index range scan. The database runs in WAL mode so readers never block
+    the writer.
+
+    If a mirror is given (normally the GoogleSheetsHandler, whose writes are
+    already spooled and synced in the background), every saved row is also
+    passed to it so the sales team keeps seeing the data in Sheets.
+    """
+    def __init__(self, db_path="storage.db", mirror=None):
+        self.db_path = db_path
+        self.mirror = mirror
+        self._local = threading.local()
+
+        conn = self._connect()
+        for title, headers in WORKSHEET_HEADERS.items():
+            table = table_name(title)
+            columns = ", ".join(f"{column_name(header)} TEXT" for header in headers)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_user ON {table} (user_id, id)")
+
+    @property
+    def write_buffer(self):
+        """The mirror's background writer, so /metrics can report on it"""
+        return self.mirror.write_buffer if self.mirror else None
+
+    @property
+    def quota(self):
+        """The mirror's Sheets quota scheduler, so /metrics can report on it"""
+        return self.mirror.quota if self.mirror else None
+
+    def _connect(self):
+        """Get this thread's connection to the database"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, title, row_data):
+        """Insert a row into the worksheet's table"""
+        headers = WORKSHEET_HEADERS[title]
+        values = [to_cell(value) for value in row_data][:len(headers)]
+        values += [""] * (len(headers) - len(values))
+        values = [None if value is None else str(value) for value in values]
+
+        columns = ", ".join(column_name(header) for header in headers)
+        placeholders = ", ".join("?" * len(headers))
+        self._connect().execute(
+            f"INSERT INTO {table_name(title)} ({columns}) VALUES ({placeholders})", values
+        )
+
+    def _save(self, title, row_data, mirror_save):
+        """Insert a row locally, then hand it to the mirror"""
+        self._insert(title, row_data)
+        if self.mirror:
+            try:
+                mirror_save(row_data)
+            except Exception as e:
+                print(f"Error mirroring {title} row to Google Sheets: {e}")
+        return True
+
+    def save_conversation(self, user_id, user_name, message, response, platform, thread_id=None):
+        """
+        Save a conversation
+        """
+        try:
+            now = time.strftime("%Y-%m-%d %H:%M:%S")
+            row_data = [now, user_id, user_name, message, response, platform, thread_id or ""]
+            return self._save("Conversations", row_data, lambda row: self.mirror.save_conversation(
+                user_id, user_name, message, response, platform, thread_id
+            ))
+        except Exception as e:
+            print(f"Error saving conversation: {e}")
+            return False
+
+    def save_home_preferences(self, row_data):
+        """
+        Save home preferences
+        """
+        try:
+            return self._save("Home Preferences", row_data, lambda row: self.mirror.save_home_preferences(row))
+        except Exception as e:
+            print(f"Error saving home preferences: {e}")
+            return False
+
+    def save_help_request(self, row_data):
+        """
+        Save a help request
+        """
+        try:
+            return self._save("Help Requests", row_data, lambda row: self.mirror.save_help_request(row))
+        except Exception as e:
+            print(f"Error saving help request: {e}")
+            return False
+
+    def save_money_request(self, row_data):
+        """
+        Save a money-saving request
+        """
+        try:
+            return self._save("Money Requests", row_data, lambda row: self.mirror.save_money_request(row))
+        except Exception as e:
+            print(f"Error saving money request: {e}")
+            return False
+
+    def get_conversation_history(self, user_id, limit=10, since=None):
+        """
+        Get conversation history for a specific user, newest first
+        Only rows newer than `since` (a "%Y-%m-%d %H:%M:%S" timestamp) are returned
+        """
+        try:
+            headers = WORKSHEET_HEADERS["Conversations"]
+            columns = ", ".join(column_name(header) for header in headers)
+            rows = self._connect().execute(
+                f"SELECT {columns} FROM conversations WHERE user_id = ? AND timestamp > ? ORDER BY id DESC LIMIT ?",
+                (str(user_id), since or "", limit)
+            ).fetchall()
+            return [dict(zip(headers, row)) for row in rows]
+        except Exception as e:
+            print(f"Error getting conversation history: {e}")
+            return []
+
+    def flush(self):
+        """Write any rows the mirror is still holding to Google Sheets now"""
+        if self.mirror:
+            return self.mirror.flush()
+        return True
+
+_shared_storage = None
+_shared_lock = threading.Lock()
+
+def create_storage():
+    """
+    Create the storage backend selected by STORAGE_BACKEND
+    "sheets" (default) uses Google Sheets directly; "sqlite" uses a local
+    database, mirrored to Google Sheets unless STORAGE_SHEETS_MIRROR=false
+    """
+    backend = os.getenv("STORAGE_BACKEND", "sheets").lower()
+    if backend == "sqlite":
+        mirror = None
+        if os.getenv("STORAGE_SHEETS_MIRROR", "true").lower() == "true":
+            mirror = get_sheets_handler()
+        return SQLiteStorage(os.getenv("STORAGE_DB_PATH", "storage.db"), mirror=mirror)
+    if backend != "sheets":
+        print(f"Unknown STORAGE_BACKEND '{backend}', using Google Sheets")
+    return get_sheets_handler()
+
+def get_storage():
+    """Get the process-wide storage backend, creating it on first use"""
+    global _shared_storage
+    with _shared_lock:
+        if _shared_storage is None:
+            _shared_storage = create_storage()
+        return _shared_storage
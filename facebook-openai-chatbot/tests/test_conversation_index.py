@@ -0,0 +1,78 @@
+from conversation_index import ConversationIndex
+
+class FakeWorksheet:
+    """Conversations worksheet that only answers get_values("A{n}:B")"""
+    def __init__(self, rows):
+        self.rows = [["Timestamp", "User ID"]] + rows
+        self.ranges = []
+
+    def get_values(self, range_name):
+        self.ranges.append(range_name)
+        start = int(range_name[1:range_name.index(":")])
+        return [row[:2] for row in self.rows[start - 1:]]
+
+def test_sync_only_reads_new_rows():
+    worksheet = FakeWorksheet([
+        ["2024-01-01 10:00:00", "user-1"],
+        ["2024-01-01 10:01:00", "user-2"],
+        ["2024-01-01 10:02:00", "user-1"]
+    ])
+    index = ConversationIndex()
+    assert index.sync(worksheet) == 3
+    assert index.latest_rows("user-1", 10) == [4, 2]
+
+    worksheet.rows += [["2024-01-01 10:03:00", "user-2"], ["2024-01-01 10:04:00", "user-1"]]
+    assert index.sync(worksheet) == 2
+    # The last indexed row is re-read to check it's unchanged, nothing before it
+    assert worksheet.ranges == ["A2:B", "A4:B"]
+    assert index.latest_rows("user-1", 10) == [6, 4, 2]
+    assert index.latest_rows("user-1", 2) == [6, 4]
+    assert index.latest_rows("user-2", 10) == [5, 3]
+
+    assert index.sync(worksheet) == 0
+    assert worksheet.ranges[-1] == "A6:B"
+
+def test_rows_without_a_user_are_skipped():
+    worksheet = FakeWorksheet([["2024-01-01 10:00:00", "user-1"], ["", ""], ["2024-01-01 10:02:00", 12345]])
+    index = ConversationIndex()
+    index.sync(worksheet)
+    assert index.latest_rows("12345", 10) == [4]
+    assert index.latest_rows("user-1", 10) == [2]
+
+def test_index_is_rebuilt_when_the_last_indexed_row_changes():
+    worksheet = FakeWorksheet([
+        ["2024-01-01 10:00:00", "user-1"],
+        ["2024-01-01 10:01:00", "user-2"]
+    ])
+    index = ConversationIndex()
+    index.sync(worksheet)
+
+    # Someone sorted the sheet by user, so the rows moved underneath the index
+    worksheet.rows = [worksheet.rows[0], ["2024-01-01 10:01:00", "user-2"], ["2024-01-01 10:00:00", "user-1"]]
+    assert index.sync(worksheet) == 2
+    assert worksheet.ranges == ["A2:B", "A3:B", "A2:B"]
+    assert index.latest_rows("user-1", 10) == [3]
+    assert index.latest_rows("user-2", 10) == [2]
+
+def test_index_is_rebuilt_when_rows_are_deleted():
+    worksheet = FakeWorksheet([
+        ["2024-01-01 10:00:00", "user-1"],
+        ["2024-01-01 10:01:00", "user-2"]
+    ])
+    index = ConversationIndex()
+    index.sync(worksheet)
+
+    del worksheet.rows[1:]
+    worksheet.rows.append(["2024-01-02 09:00:00", "user-3"])
+    assert index.sync(worksheet) == 1
+    assert index.latest_rows("user-1", 10) == []
+    assert index.latest_rows("user-3", 10) == [2]
+
+def test_reset_forgets_everything():
+    worksheet = FakeWorksheet([["2024-01-01 10:00:00", "user-1"]])
+    index = ConversationIndex()
+    index.sync(worksheet)
+    index.reset()
+    assert index.latest_rows("user-1", 10) == []
+    assert index.sync(worksheet) == 1
+    assert worksheet.ranges == ["A2:B", "A2:B"]
@@ -0,0 +1,24 @@
+import pytest
+from dedupe_store import DedupeStore, SQLiteDedupeStore, event_key
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteDedupeStore(str(tmp_path / "dedupe.db"))
+    return DedupeStore()
+
+def test_second_delivery_is_a_duplicate(store):
+    assert not store.seen("mid:1")
+    assert store.seen("mid:1")
+    assert store.stats()["duplicates"] == 1
+
+def test_forgotten_key_is_processed_again(store):
+    assert not store.seen("mid:1")
+    store.forget("mid:1")
+    assert not store.seen("mid:1")
+    store.forget("mid:unknown")
+
+def test_event_key():
+    assert event_key({"sender": {"id": "1"}, "message": {"mid": "m.1"}}) == "mid:m.1"
+    assert event_key({"sender": {"id": "1"}, "postback": {"payload": "X"}, "timestamp": 5}) == "postback:1:5"
+    assert event_key({"sender": {"id": "1"}, "read": {}}) is None
@@ -0,0 +1,27 @@
+import threading
+import time
+from event_dispatcher import EventDispatcher
+
+def event(sender_id):
+    return {"sender": {"id": sender_id}}
+
+def test_stop_drains_the_lanes():
+    handled = []
+    dispatcher = EventDispatcher(lambda e: handled.append(e["sender"]["id"]), num_workers=2, max_queue_size=10)
+    for i in range(5):
+        assert dispatcher.dispatch(event(str(i)))
+    dispatcher.stop(timeout=5)
+    assert sorted(handled) == ["0", "1", "2", "3", "4"]
+
+def test_stop_gives_up_on_a_full_lane():
+    release = threading.Event()
+    dispatcher = EventDispatcher(lambda e: release.wait(5), num_workers=1, max_queue_size=1, put_timeout=0.1)
+    assert dispatcher.dispatch(event("1"))
+    time.sleep(0.1)  # the worker is now stuck on the first event
+    assert dispatcher.dispatch(event("1"))
+    assert not dispatcher.dispatch(event("1"))
+
+    start = time.time()
+    dispatcher.stop(timeout=0.3)
+    assert time.time() - start < 1
+    release.set()
@@ -0,0 +1,55 @@
+import json
+import os
+import pytest
+from conversation_manager import ConversationManager
+
+# Every branch of every flow, with the replies and saved rows the hand-written
+# handlers gave before flows were compiled (timestamps replaced by "<now>")
+TRANSCRIPTS_PATH = os.path.join(os.path.dirname(__file__), "flow_transcripts.json")
+with open(TRANSCRIPTS_PATH) as f:
+    TRANSCRIPTS = json.load(f)
+
+class RecordingStorage:
+    """Storage that keeps the rows each flow saves instead of writing them to Sheets"""
+    def __init__(self):
+        self.rows = []
+
+    def save_home_preferences(self, row_data):
+        self.rows.append(["save_home_preferences", row_data])
+        return True
+
+    def save_help_request(self, row_data):
+        self.rows.append(["save_help_request", row_data])
+        return True
+
+    def save_money_request(self, row_data):
+        self.rows.append(["save_money_request", row_data])
+        return True
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv("STATE_BACKEND", "memory")
+    return ConversationManager(RecordingStorage())
+
+@pytest.mark.parametrize("name", list(TRANSCRIPTS))
+def test_flow_matches_the_legacy_handlers(manager, name):
+    transcript = TRANSCRIPTS[name]
+    replies = [getattr(manager, transcript["start"])("user-1")]
+    for message in transcript["messages"]:
+        replies.append(manager.process_message("user-1", "Test User", message))
+
+    assert [list(reply) if reply else reply for reply in replies] == transcript["replies"]
+    rows = [[sink, ["<now>"] + row[1:]] for sink, row in manager.sheets_handler.rows]
+    assert rows == transcript["rows"]
+
+def test_no_reply_outside_a_flow(manager):
+    assert manager.process_message("user-1", "Test User", "hello") is None
+
+def test_intent_flow_skips_prefilled_questions(manager):
+    text, quick_replies = manager.start_intent_flow(
+        "user-1", "Test User", "find_home_rent", {"property_type": "Apartment", "location": "Austin"}
+    )
+    assert text == "What's your monthly budget?"
+    manager.process_message("user-1", "Test User", "$1000-$1500")
+    manager.process_message("user-1", "Test User", "No")
+    assert manager.sheets_handler.rows[0][1][3:8] == ["Rent", "Apartment", "$1000-$1500", "Austin", "No"]
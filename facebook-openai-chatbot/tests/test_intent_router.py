@@ -0,0 +1,90 @@
+import pytest
+from intent_router import IntentRouter, extract_slots
+
+ROUTED = [
+    ("I want to rent a 2 bedroom apartment in Austin under $1500", "find_home_rent"),
+    ("Looking to buy a house in Denver, CO for $400k", "find_home_buy"),
+    ("first-time home buyer here", "find_home_buy"),
+    ("find a home", "find_home"),
+    ("I want to sell my house", "help_real_estate_selling"),
+    ("My sink is leaking", "help_maintenance"),
+    ("The toilet is clogged", "help_maintenance"),
+    ("My heater is broken", "help_maintenance"),
+    ("I need a plumber", "help_maintenance"),
+    ("I need help with repairs", "help_maintenance"),
+    ("I need a lawyer", "help_legal"),
+    ("Talk to an agent", "get_help"),
+    ("I want to refinance", "savings_mortgage"),
+    ("Lower my mortgage payment", "savings_mortgage"),
+    ("Save money on utility bills", "savings_utility"),
+    ("Looking for tax deductions", "savings_tax"),
+    ("Help me lower my property taxes", "savings_tax"),
+    ("How can I save on my taxes and get deductions", "savings_tax"),
+    ("Lower my home insurance", "savings_insurance"),
+    ("I need an insurance quote for my condo", "savings_insurance"),
+    ("Cut my costs", "save_money"),
+    # Car insurance isn't home insurance: the general Save Money menu
+    ("save money on my car insurance", "save_money"),
+    ("Lower my bills", "save_money")
+]
+
+NOT_ROUTED = [
+    # A single common word isn't enough to start a flow
+    "My landlord wont fix anything, can I break my lease",
+    "Moving to Denver soon, lease is broken",
+    "I need to pay taxes on my house sale",
+    "Paid off my mortgage, need movers",
+    "The roof of the building looks nice",
+    # General questions need two signals
+    "What is a mortgage?",
+    "How can I save on taxes?",
+    "",
+    "thanks!"
+]
+
+@pytest.mark.parametrize("text,intent", ROUTED)
+def test_clear_intents_are_routed(text, intent):
+    routed = IntentRouter().route(text)
+    assert routed is not None and routed.name == intent
+
+@pytest.mark.parametrize("text", NOT_ROUTED)
+def test_unclear_messages_go_to_openai(text):
+    assert IntentRouter().route(text) is None
+
+def test_route_fills_answers_from_slots():
+    intent = IntentRouter().route("I want to rent a 2 bedroom apartment in Austin under $1500")
+    assert intent.flow == "find_home_rent"
+    assert intent.answers == {"property_type": "Apartment", "budget": "$1500", "location": "Austin"}
+
+def test_capitalized_verb_is_not_taken_for_the_location():
+    intent = IntentRouter().route("I want to Buy a house")
+    assert intent.flow == "find_home_buy"
+    assert intent.answers == {"home_type": "House"}
+
+def test_specific_intent_keeps_its_implied_answers():
+    intent = IntentRouter().route("My sink is leaking")
+    assert intent.answers == {"help_category": "Maintenance & Repairs"}
+
+def test_stats_count_routed_messages():
+    router = IntentRouter()
+    router.route("I need a plumber")
+    router.route("thanks!")
+    stats = router.stats()
+    assert (stats["messages"], stats["routed"], stats["hit_rate"]) == (2, 1, 0.5)
+    assert stats["intents"] == {"help_maintenance": 1}
+
+@pytest.mark.parametrize("text,slots", [
+    ("2 bedroom apartment in Austin under $1500/month", {"home_type": "Apartment", "budget": "$1500/month", "city": "Austin"}),
+    ("townhouses near Round Rock, TX between $300k to 350k", {"home_type": "Townhome", "budget": "$300k to 350k", "city": "Round Rock, TX"}),
+    ("budget 450K", {"budget": "450K"}),
+    ("I want a condo", {"home_type": "Condo"}),
+    ("moving to Denver", {"city": "Denver"}),
+    ("Looking to Rent an apartment in Austin", {"home_type": "Apartment", "city": "Austin"}),
+    # Place names must be capitalized, and capitalized verbs or dates aren't places
+    ("moving to new york", {}),
+    ("I want to Buy a house", {"home_type": "House"}),
+    ("moving in March", {}),
+    ("I have 3 kids", {})
+])
+def test_extract_slots(text, slots):
+    assert extract_slots(text) == slots
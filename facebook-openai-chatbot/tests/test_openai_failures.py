@@ -0,0 +1,38 @@
+import openai
+from openai_helper import ERROR_TEXT, FALLBACK_QUICK_REPLIES, OpenAIHelper
+
+def failing(error):
+    def create(**kwargs):
+        raise error
+    return create
+
+def make_helper(monkeypatch, error):
+    monkeypatch.setenv("OPENAI_CACHE", "false")
+    monkeypatch.setattr(openai.ChatCompletion, "create", failing(error))
+    helper = OpenAIHelper()
+    helper.model_tiering = False
+    return helper
+
+def test_timeout_gets_the_fallback_reply(monkeypatch):
+    helper = make_helper(monkeypatch, openai.error.Timeout("read timed out"))
+    response = helper.process_message("user-1", "hello")
+    assert response["quick_replies"] == FALLBACK_QUICK_REPLIES
+    usage = helper.tier_stats()["premium"]
+    assert (usage["timeouts"], usage["errors"], usage["fallbacks"]) == (1, 0, 1)
+
+def test_missed_deadline_gets_the_fallback_reply(monkeypatch):
+    helper = make_helper(monkeypatch, TimeoutError("No answer within 20s"))
+    assert "quick_replies" in helper.stream_message("user-1", "hello", lambda chunk: None)
+
+def test_other_errors_get_an_apology(monkeypatch):
+    helper = make_helper(monkeypatch, openai.error.AuthenticationError("bad key"))
+    response = helper.process_message("user-1", "hello")
+    assert response["facebook_content"] == ERROR_TEXT
+    assert "quick_replies" not in response
+    usage = helper.tier_stats()["premium"]
+    assert (usage["timeouts"], usage["errors"], usage["fallbacks"]) == (0, 1, 0)
+
+def test_stream_errors_get_an_apology(monkeypatch):
+    helper = make_helper(monkeypatch, openai.error.APIConnectionError("reset"))
+    response = helper.stream_message("user-1", "hello", lambda chunk: None)
+    assert response["text"] == ERROR_TEXT
@@ -0,0 +1,107 @@
+import threading
+import time
+from send_queue import SendQueue, TokenBucket
+
+THROTTLED = {"error": {"code": 613, "message": "Calls to this api have exceeded the rate limit"}}
+
+def make_queue(**kwargs):
+    queue = SendQueue(**kwargs)
+    # Short backoffs so throttled retries don't slow the tests down
+    queue.buckets["token"] = TokenBucket(queue.rate, queue.burst, min_backoff=0.01, max_backoff=0.05)
+    return queue
+
+def test_sends_to_one_recipient_stay_in_order():
+    queue = make_queue(num_workers=4)
+    sent = []
+    in_flight = []
+    lock = threading.Lock()
+
+    def send(recipient, n):
+        def call():
+            with lock:
+                in_flight.append(recipient)
+                assert in_flight.count(recipient) == 1
+            time.sleep(0.002)
+            with lock:
+                in_flight.remove(recipient)
+                sent.append((recipient, n))
+            return {"message_id": n}
+        return call
+
+    for n in range(20):
+        for recipient in ("a", "b", "c"):
+            assert queue.enqueue("token", recipient, send(recipient, n))
+    queue.stop(timeout=5)
+
+    for recipient in ("a", "b", "c"):
+        assert [n for r, n in sent if r == recipient] == list(range(20))
+    assert queue.stats()["sent"] == 60
+
+def test_throttled_send_is_retried_before_later_ones():
+    queue = make_queue()
+    calls = []
+    responses = {"first": [THROTTLED, {"message_id": "1"}], "second": [{"message_id": "2"}]}
+
+    def send(name):
+        def call():
+            calls.append(name)
+            return responses[name].pop(0)
+        return call
+
+    queue.enqueue("token", "a", send("first"))
+    queue.enqueue("token", "a", send("second"))
+    queue.stop(timeout=5)
+
+    assert calls == ["first", "first", "second"]
+    stats = queue.stats()
+    assert (stats["sent"], stats["throttled"], stats["dropped"], stats["errors"]) == (2, 1, 0, 0)
+
+def test_send_is_dropped_after_max_attempts():
+    queue = make_queue(max_attempts=3)
+    calls = []
+    queue.enqueue("token", "a", lambda: calls.append("stuck") or THROTTLED)
+    queue.enqueue("token", "a", lambda: calls.append("next") or {"message_id": "2"})
+    queue.stop(timeout=5)
+
+    assert calls == ["stuck", "stuck", "stuck", "next"]
+    stats = queue.stats()
+    assert (stats["sent"], stats["throttled"], stats["dropped"], stats["pending"]) == (1, 3, 1, 0)
+
+def test_other_errors_are_not_retried():
+    queue = make_queue()
+    calls = []
+    queue.enqueue("token", "a", lambda: calls.append(1) or {"error": {"code": 100, "message": "Invalid parameter"}})
+    queue.stop(timeout=5)
+    assert calls == [1]
+    assert queue.stats()["errors"] == 1
+
+def test_queue_refuses_sends_when_full():
+    queue = make_queue(max_pending=1)
+    release = threading.Event()
+    assert queue.enqueue("token", "a", lambda: release.wait(5) and {"message_id": "1"})
+    assert not queue.enqueue("token", "b", lambda: {"message_id": "2"})
+    assert queue.stats()["dropped"] == 1
+    release.set()
+    queue.stop(timeout=5)
+
+def test_bucket_halves_on_throttling_and_recovers_additively():
+    bucket = TokenBucket(rate=20, burst=40, min_backoff=1, max_backoff=4)
+    now = time.time()
+    bucket.throttled(now)
+    assert bucket.rate == 10
+    assert bucket.take(now) == 1  # paused for the backoff
+    bucket.throttled(now)
+    bucket.throttled(now)
+    assert bucket.rate == 2.5
+    assert bucket.backoff == 4  # capped at max_backoff
+
+    for _ in range(5):
+        bucket.throttled(now)
+    assert bucket.rate == 20 / 32  # never below 1/32 of the configured rate
+
+    bucket.succeeded()
+    assert bucket.rate == 20 / 32 + 1
+    assert bucket.backoff == 2
+    for _ in range(40):
+        bucket.succeeded()
+    assert bucket.rate == 20
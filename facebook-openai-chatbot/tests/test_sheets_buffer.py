@@ -0,0 +1,45 @@
+import time
+from sheets_buffer import SheetsWriteBuffer
+from sheets_quota import SheetsQuotaScheduler
+
+class FakeWorksheet:
+    def __init__(self):
+        self.rows = []
+
+    def append_rows(self, rows):
+        self.rows.extend(rows)
+        return {}
+
+def make_buffer(**kwargs):
+    worksheets = {}
+    buffer = SheetsWriteBuffer(lambda title: worksheets.setdefault(title, FakeWorksheet()), **kwargs)
+    return buffer, worksheets
+
+def test_flush_writes_one_batch_per_worksheet():
+    buffer, worksheets = make_buffer()
+    # Buffered directly so no background flusher races the flush below
+    buffer.buffers = {"Home Preferences": [[1], [2]], "Help Requests": [[3]]}
+    assert buffer.flush() is True
+    assert worksheets["Home Preferences"].rows == [[1], [2]]
+    assert worksheets["Help Requests"].rows == [[3]]
+    assert buffer.pending() == 0
+
+def test_stop_gives_up_after_the_timeout():
+    scheduler = SheetsQuotaScheduler(write_quota=1, min_batch_size=1, max_batch_size=1)
+    scheduler.record("write")
+    buffer, worksheets = make_buffer(scheduler=scheduler)
+    buffer.buffers = {"Home Preferences": [[1]], "Help Requests": [[2]], "Money Requests": [[3]]}
+
+    # Each lead worksheet used to wait a full quota window
+    start = time.time()
+    buffer.stop(timeout=0.3)
+    assert time.time() - start < 1
+    assert worksheets == {}
+    assert buffer.pending() == 3
+
+def test_flush_timeout_covers_waiting_for_the_flush_lock():
+    buffer, _ = make_buffer()
+    buffer._flush_lock.acquire()
+    start = time.time()
+    assert buffer.flush(timeout=0.2) is False
+    assert time.time() - start < 1
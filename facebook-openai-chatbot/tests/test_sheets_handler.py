@@ -0,0 +1,43 @@
+import time
+import pytest
+from sheets_handler import GoogleSheetsHandler
+
+class FakeWorksheet:
+    def __init__(self):
+        self.rows = []
+
+    def append_row(self, row):
+        self.rows.append(row)
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    credentials = tmp_path / "credentials.json"
+    credentials.write_text("{}")
+    monkeypatch.setenv("GOOGLE_SHEETS_CREDENTIALS_FILE", str(credentials))
+    monkeypatch.setenv("GOOGLE_SHEETS_ID", "sheet")
+    monkeypatch.setenv("SHEETS_BUFFERED_WRITES", "false")
+    monkeypatch.setenv("CONVERSATION_SHARDING", "none")
+    monkeypatch.setenv("SHEETS_WRITE_QUOTA", "10")
+    monkeypatch.setenv("SHEETS_WRITE_WAIT", "0.2")
+    handler = GoogleSheetsHandler()
+    for title in ("Conversations", "Home Preferences"):
+        handler._worksheets[title] = FakeWorksheet()
+    return handler
+
+def test_unbuffered_write_gives_up_quickly_when_the_quota_is_used(handler):
+    handler.quota.record("write", 10)
+    start = time.time()
+    assert handler.save_home_preferences(["now", "user-1"]) is False
+    assert time.time() - start < 1
+    assert handler._worksheets["Home Preferences"].rows == []
+
+def test_unbuffered_logs_leave_the_reserve_to_leads(handler):
+    handler.quota.record("write", 9)
+    assert handler.save_conversation("user-1", "Test User", "hi", "hello", "facebook") is False
+    assert handler.quota.counters["deferred"] == 1
+    assert handler.save_home_preferences(["now", "user-1"]) is True
+    assert handler._worksheets["Home Preferences"].rows == [["now", "user-1"]]
+
+def test_conversations_are_not_sharded_by_default(handler, monkeypatch):
+    monkeypatch.delenv("CONVERSATION_SHARDING")
+    assert GoogleSheetsHandler()._conversation_title() == "Conversations"
@@ -0,0 +1,114 @@
+import time
+from sheets_quota import SheetsQuotaScheduler
+from sheets_spool import SheetsSpool
+
+class FakeWorksheet:
+    def __init__(self):
+        self.rows = []
+
+    def append_rows(self, rows):
+        self.rows.extend(rows)
+        return {}
+
+def make_spool(tmp_path, **kwargs):
+    worksheet = FakeWorksheet()
+    spool = SheetsSpool(str(tmp_path / "spool.db"), lambda title: worksheet, **kwargs)
+    return spool, worksheet
+
+def test_flush_returns_none_without_the_lease(tmp_path):
+    owner, _ = make_spool(tmp_path)
+    assert owner._acquire_lease()
+
+    other, worksheet = make_spool(tmp_path)
+    other.owner = "other-host:1"
+    other._connect().execute("INSERT INTO spool_rows (worksheet, row) VALUES ('Conversations', '[1]')")
+
+    assert other.flush() is None
+    assert worksheet.rows == []
+    assert other.pending() == 1
+
+def test_syncer_waits_while_another_process_drains(tmp_path):
+    owner, _ = make_spool(tmp_path)
+    assert owner._acquire_lease()
+
+    other, _ = make_spool(tmp_path, batch_size=1, flush_interval=0.5)
+    other.owner = "other-host:1"
+    calls = []
+    flush = other.flush
+    other.flush = lambda *args: calls.append(1) or flush(*args)
+
+    for i in range(5):
+        other.add("Conversations", [i])
+    time.sleep(0.8)
+    # One flush per interval, not a busy loop over a backlog it can't drain
+    assert 1 <= len(calls) <= 3
+
+def test_stop_gives_up_after_the_timeout(tmp_path):
+    scheduler = SheetsQuotaScheduler(write_quota=1, min_batch_size=1, max_batch_size=1)
+    scheduler.record("write")
+    spool, worksheet = make_spool(tmp_path, scheduler=scheduler)
+    spool._connect().execute("INSERT INTO spool_rows (worksheet, row) VALUES ('Home Preferences', '[1]')")
+
+    start = time.time()
+    spool.stop(timeout=0.3)
+    assert time.time() - start < 2
+    # Still spooled for the next process
+    assert spool.pending() == 1
+    assert worksheet.rows == []
+
+def test_quota_wait_never_outlasts_the_lease(tmp_path):
+    scheduler = SheetsQuotaScheduler(write_quota=1, min_batch_size=1, max_batch_size=1)
+    scheduler.record("write")
+    first, worksheet = make_spool(tmp_path, lease_ttl=1, scheduler=scheduler)
+    # Inserted directly so no background syncer races the flushes below
+    first._connect().execute("INSERT INTO spool_rows (worksheet, row) VALUES ('Home Preferences', '[\"lead-1\"]')")
+
+    start = time.time()
+    assert first.flush() is False
+    assert time.time() - start < 1
+    assert worksheet.rows == []
+
+    # Once the lease lapses another process sends the batch, exactly once
+    time.sleep(1)
+    second, _ = make_spool(tmp_path, lease_ttl=1)
+    second.resolve_worksheet = first.resolve_worksheet
+    second.owner = "other-host:1"
+    assert second.flush() is True
+    assert worksheet.rows == [["lead-1"]]
+
+def test_batch_is_not_sent_after_the_lease_is_taken_over(tmp_path):
+    first, worksheet = make_spool(tmp_path, lease_ttl=1)
+    second, _ = make_spool(tmp_path, lease_ttl=1)
+    second.resolve_worksheet = first.resolve_worksheet
+    second.owner = "other-host:1"
+
+    class SlowScheduler(SheetsQuotaScheduler):
+        def acquire(self, kind, priority=0, timeout=None):
+            # The lease lapses while this process waits, and the other one drains
+            time.sleep(1.1)
+            assert second.flush() is True
+            return True
+
+    first.scheduler = SlowScheduler()
+    # Inserted directly so no background syncer races the flushes below
+    first._connect().execute("INSERT INTO spool_rows (worksheet, row) VALUES ('Home Preferences', '[\"lead-1\"]')")
+    assert first.flush() is False
+    assert worksheet.rows == [["lead-1"]]
+
+def test_stop_interrupts_the_syncers_flush(tmp_path):
+    spool, worksheet = make_spool(tmp_path, batch_size=1, flush_interval=0.1)
+    append_rows = worksheet.append_rows
+    def slow_append_rows(rows):
+        time.sleep(0.2)
+        return append_rows(rows)
+    worksheet.append_rows = slow_append_rows
+
+    for i in range(50):
+        spool.add("Home Preferences", [i])
+    time.sleep(0.3)  # the syncer is now working through the backlog
+
+    start = time.time()
+    spool.stop(timeout=0.5)
+    assert time.time() - start < 1.5
+    assert 0 < len(worksheet.rows) < 50
+    assert spool.pending() == 50 - len(worksheet.rows)
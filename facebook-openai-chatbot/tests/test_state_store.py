@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from conversation_manager import ConversationState
+from state_store import MemoryStateStore, SQLiteStateStore
+
+def make_store(tmp_path, **kwargs):
+    return SQLiteStateStore(str(tmp_path / "state.db"), ConversationState, **kwargs)
+
+def test_two_stores_see_each_others_updates(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    with first.transaction("user-1") as state:
+        state.set_flow("find_home_buy", 2)
+    assert second.get("user-1").get_flow() == "find_home_buy"
+
+    with second.transaction("user-1") as state:
+        state.next_step()
+    # The first store's cached copy is stale and reloaded
+    assert first.get("user-1").get_step() == 3
+    assert first.stats()["saves"] == second.stats()["saves"] == 1
+
+def test_unchanged_state_is_not_written(tmp_path):
+    store = make_store(tmp_path)
+    with store.transaction("user-1"):
+        pass
+    assert store.stats()["saves"] == 0
+
+def test_conflicting_write_is_rejected(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    stale, version = first._load("user-1")
+    with second.transaction("user-1") as state:
+        state.set_flow("get_help", 2)
+
+    stale.set_flow("save_money", 2)
+    first._save("user-1", stale, version)
+    assert first.stats()["conflicts"] == 1
+    assert first.get("user-1").get_flow() == "get_help"
+
+def test_failed_transaction_is_discarded(tmp_path):
+    store = make_store(tmp_path)
+    with store.transaction("user-1") as state:
+        state.set_flow("find_home", 2)
+
+    with pytest.raises(RuntimeError):
+        with store.transaction("user-1") as state:
+            # Changes the cached copy in place before failing
+            state.store_answer("budget", "$500k+")
+            raise RuntimeError("handler failed")
+
+    assert store.get("user-1").get_all_data() == {}
+    assert store.stats()["saves"] == 1
+
+def test_stale_lock_is_taken_over_after_lock_ttl(tmp_path):
+    store = make_store(tmp_path, lock_ttl=0.3)
+    store._connect().execute(
+        "INSERT INTO flow_locks (user_id, owner, expires_at) VALUES ('user-1', 'dead-worker', ?)",
+        (time.time() + 0.3,)
+    )
+    start = time.time()
+    with store.transaction("user-1") as state:
+        state.set_flow("get_help", 2)
+    assert 0.2 <= time.time() - start < 2
+    assert store.stats()["lock_waits"] == 1
+    # The lock is released afterwards
+    assert store._connect().execute("SELECT COUNT(*) FROM flow_locks").fetchone()[0] == 0
+
+def test_idle_state_starts_over(tmp_path):
+    store = make_store(tmp_path, idle_ttl=0.2)
+    with store.transaction("user-1") as state:
+        state.set_flow("find_home_rent", 3)
+    time.sleep(0.3)
+    assert store.get("user-1").get_flow() is None
+
+    # The restarted state is saved over the old row
+    with store.transaction("user-1") as state:
+        state.set_flow("get_help", 2)
+    assert make_store(tmp_path).get("user-1").get_flow() == "get_help"
+
+def test_concurrent_transactions_across_stores_lose_no_updates(tmp_path):
+    stores = [make_store(tmp_path), make_store(tmp_path)]
+
+    def increment(store):
+        for _ in range(25):
+            with store.transaction("user-1") as state:
+                state.store_answer("count", state.get_answer("count", 0) + 1)
+
+    threads = [threading.Thread(target=increment, args=(store,)) for store in stores for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert make_store(tmp_path).get("user-1").get_answer("count") == 150
+    assert sum(store.stats()["conflicts"] for store in stores) == 0
+
+def test_memory_store_transactions_are_reentrant():
+    store = MemoryStateStore(ConversationState)
+    with store.transaction("user-1") as outer:
+        with store.transaction("user-1") as inner:
+            assert inner is outer
+            inner.set_flow("save_money", 2)
+    assert store.get("user-1").get_flow() == "save_money"
+    assert store.stats()["transactions"] == 1
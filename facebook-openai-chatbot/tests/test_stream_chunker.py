@@ -0,0 +1,79 @@
+import openai
+from openai_helper import OpenAIHelper, StreamChunker, streamable_length
+
+class FakeEvent:
+    def __init__(self, text):
+        self.choices = [type("Choice", (), {"delta": {"content": text}})()]
+
+def fake_stream(pieces, error=None):
+    """A stand-in for ChatCompletion.create(stream=True) yielding the pieces, then raising error"""
+    def create(**kwargs):
+        for piece in pieces:
+            yield FakeEvent(piece)
+        if error is not None:
+            raise error
+    return create
+
+def make_helper(monkeypatch):
+    monkeypatch.setenv("OPENAI_CACHE", "false")
+    return OpenAIHelper()
+
+def stream(helper, monkeypatch, pieces, error=None):
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake_stream(pieces, error))
+    sent = []
+    result = helper.stream_message("user-1", "hello", sent.append)
+    return result, sent
+
+def test_first_chunk_is_cut_at_the_first_sentence_past_first_length():
+    chunker = StreamChunker(first_length=10, min_length=40, max_length=100)
+    assert chunker.feed("Hi. ") == []
+    assert chunker.feed("This is longer. And then") == ["Hi. This is longer."]
+    assert chunker.buffer == "And then"
+
+def test_later_chunks_prefer_paragraph_breaks():
+    chunker = StreamChunker(first_length=5, min_length=20, max_length=100)
+    chunker.sent_first = True
+    assert chunker.feed("One sentence. Two sentences here.\n\nNext") == ["One sentence. Two sentences here."]
+    assert chunker.flush() == ["Next"]
+
+def test_text_without_boundaries_is_cut_at_a_space_before_max_length():
+    chunker = StreamChunker(first_length=5, min_length=5, max_length=20)
+    chunks = chunker.feed("word " * 10)
+    assert chunks == ["word word word word", "word word word word"]
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert chunker.flush() == ["word word"]
+
+def test_flush_splits_a_long_remainder():
+    chunker = StreamChunker(first_length=5, min_length=5, max_length=12)
+    chunker.buffer = "aaaa bbbb cccc dddd"
+    assert chunker.flush() == ["aaaa bbbb", "cccc dddd"]
+    assert chunker.buffer == ""
+
+def test_streamable_length_stops_at_tags():
+    assert streamable_length("Plain answer") == (False, 12)
+    assert streamable_length("Intro #Facebook post") == (True, 6)
+    assert streamable_length("Almost a tag #face") == (False, 13)
+    assert streamable_length("Price is #1 in town") == (False, 19)
+
+def test_streamed_answer_is_delivered_with_branding(monkeypatch):
+    helper = make_helper(monkeypatch)
+    answer = "Swift Showings can help you find a home. " * 3
+    result, sent = stream(helper, monkeypatch, [answer[:50], answer[50:]])
+    assert result["streamed"]
+    assert " ".join(sent) == answer.strip()
+
+def test_tagged_answer_only_sends_the_facebook_part(monkeypatch):
+    helper = make_helper(monkeypatch)
+    pieces = ["#face", "book Swift Showings has new listings. ", "#insta", "gram New listings!"]
+    result, sent = stream(helper, monkeypatch, pieces)
+    assert sent == ["Swift Showings has new listings."]
+    assert result["facebook_content"] == "Swift Showings has new listings."
+    assert result["instagram_content"] == "New listings!"
+
+def test_tail_is_sent_when_the_stream_fails(monkeypatch):
+    helper = make_helper(monkeypatch)
+    pieces = ["Swift Showings can help. ", "Ask me anything"]
+    result, sent = stream(helper, monkeypatch, pieces, error=openai.error.APIConnectionError("reset"))
+    assert " ".join(sent) == "Swift Showings can help. Ask me anything"
+    assert result["streamed"]
+    assert helper.conversations.get("user-1")[-1]["content"] == "".join(pieces)
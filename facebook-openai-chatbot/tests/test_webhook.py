@@ -0,0 +1,64 @@
+import importlib
+import pytest
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("STORAGE_SHEETS_MIRROR", "false")
+    monkeypatch.setenv("STORAGE_DB_PATH", str(tmp_path / "storage.db"))
+    monkeypatch.setenv("WEBHOOK_ASYNC", "false")
+    monkeypatch.setenv("DEDUPE_BACKEND", "memory")
+    return importlib.import_module("app")
+
+def post_message(client, mid):
+    event = {"sender": {"id": "user-1"}, "message": {"mid": mid, "text": "hi"}}
+    return client.post("/", json={"object": "page", "entry": [{"messaging": [event]}]})
+
+def test_redelivery_is_processed_after_a_failure(app_module, monkeypatch):
+    calls = []
+    def process_event(event):
+        calls.append(event["message"]["mid"])
+        if len(calls) == 1:
+            raise RuntimeError("Graph API down")
+    monkeypatch.setattr(app_module, "process_event", process_event)
+    monkeypatch.setattr(app_module, "dedupe_store", app_module.create_dedupe_store())
+    client = app_module.app.test_client()
+
+    assert post_message(client, "m.1").status_code == 500
+    assert post_message(client, "m.1").status_code == 200
+    assert post_message(client, "m.1").status_code == 200
+    assert calls == ["m.1", "m.1"]
+
+class FullLaneDispatcher:
+    """Dispatcher whose lane for user-1 is full until opened"""
+    def __init__(self):
+        self.full = True
+        self.queued = []
+
+    def dispatch(self, event):
+        if self.full and event["sender"]["id"] == "user-1":
+            return False
+        self.queued.append(event["message"]["mid"])
+        return True
+
+def test_full_lane_events_are_redelivered_in_order(app_module, monkeypatch):
+    dispatcher = FullLaneDispatcher()
+    monkeypatch.setattr(app_module, "ASYNC_WEBHOOKS", True)
+    monkeypatch.setattr(app_module, "event_dispatcher", dispatcher)
+    monkeypatch.setattr(app_module, "dedupe_store", app_module.create_dedupe_store())
+    monkeypatch.setattr(app_module, "process_event", lambda event: pytest.fail("processed inline"))
+    client = app_module.app.test_client()
+    events = [
+        {"sender": {"id": "user-1"}, "message": {"mid": "m.1", "text": "hi"}},
+        {"sender": {"id": "user-2"}, "message": {"mid": "m.2", "text": "hi"}},
+        {"sender": {"id": "user-1"}, "message": {"mid": "m.3", "text": "there"}}
+    ]
+    body = {"object": "page", "entry": [{"messaging": events}]}
+
+    assert client.post("/", json=body).status_code == 503
+    assert dispatcher.queued == ["m.2"]
+
+    # Facebook redelivers the whole callback once the lane has room
+    dispatcher.full = False
+    assert client.post("/", json=body).status_code == 200
+    assert dispatcher.queued == ["m.2", "m.1", "m.3"]
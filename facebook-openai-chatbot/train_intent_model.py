@@ -0,0 +1,57 @@
+import csv
+import os
+import random
+from dotenv import load_dotenv
+from intent_router import INTENT_DEFINITIONS, LinearIntentModel
+
+# Load environment variables
+load_dotenv()
+
+# Labelled examples: a CSV with "text" and "intent" columns. Use intent names from
+# intent_router.INTENT_DEFINITIONS, and "none" for messages that should go to OpenAI.
+EXAMPLES_PATH = os.getenv("INTENT_EXAMPLES", "intent_examples.csv")
+MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "intent_model.json")
+THRESHOLD = float(os.getenv("INTENT_MODEL_THRESHOLD", "0.8"))
+
+def load_examples(path):
+    with open(path, newline="") as f:
+        return [(row["text"], row["intent"]) for row in csv.DictReader(f) if row.get("text") and row.get("intent")]
+
+def evaluate(model, examples):
+    """Accuracy and coverage of the routed examples at the configured threshold"""
+    routed = correct = 0
+    for text, intent in examples:
+        predicted, probability = model.predict(text)
+        if predicted in INTENT_DEFINITIONS and probability >= THRESHOLD:
+            routed += 1
+            correct += predicted == intent
+    return routed, correct
+
+def main():
+    print("Swift Showings Intent Model Training")
+    print("====================================")
+    if not os.path.exists(EXAMPLES_PATH):
+        print(f"No examples found at {EXAMPLES_PATH}. Set INTENT_EXAMPLES to a CSV with text and intent columns.")
+        return
+
+    examples = load_examples(EXAMPLES_PATH)
+    unknown = {intent for _, intent in examples} - set(INTENT_DEFINITIONS) - {"none"}
+    if unknown:
+        print(f"Warning: unknown intents will never be routed: {', '.join(sorted(unknown))}")
+
+    # Hold out a fifth of the examples to check the model before saving it
+    random.Random(42).shuffle(examples)
+    split = max(1, len(examples) // 5)
+    holdout, training = examples[:split], examples[split:]
+    model = LinearIntentModel.train(training)
+
+    routed, correct = evaluate(model, holdout)
+    print(f"Trained on {len(training)} examples, checked on {len(holdout)}")
+    print(f"Routed {routed}/{len(holdout)} held-out messages at threshold {THRESHOLD}, {correct} correctly")
+
+    LinearIntentModel.train(examples).save(MODEL_PATH)
+    print(f"Saved the model trained on all examples to {MODEL_PATH}")
+    print("Set INTENT_MODEL_PATH to this file to use it in the app.")
+
+if __name__ == "__main__":
+    main()